@@ -0,0 +1,147 @@
+# analysis_cache.py (個股分析與圖表的快取函式：Streamlit 畫面與背景預熱工作 warmup.py 共用同一組快取)
+#
+# 使用 bounded_cache：共用 ANALYSIS_CACHE_MAX_MB 的記憶體上限，超過時逐出最久未使用的股票，
+# 避免整天瀏覽數百檔股票後記憶體持續成長；有設定 cache_backend 時結果也寫入跨行程共用快取。
+
+import functools
+
+import plotly.io as pio
+
+import instrumentation
+from bulk_price_loader import stocks_needing_fetch
+from memory_cache import bounded_cache
+from panel_analyzer import analyze_panel, snapshot_results
+from rate_limiter import MAX_CONCURRENCY
+from screening import normalize_stock_codes, run_screen_analysis
+from stock_analyzer import analyze_stock
+from stock_information_plot import plot_stock_major_shareholders, plot_stock_revenue_trend
+
+
+def _fig_to_cache(fig) -> str | None:
+    """Plotly Figure → JSON 字串，供快取保存（營收、大戶圖；技術分析圖改存精簡陣列）"""
+    if fig is None:
+        return None
+    with instrumentation.timed('json_serialize'):
+        return pio.to_json(fig)
+
+
+# 失敗結果不進快取：bounded_cache（與 st.cache_data 相同）不會快取拋出例外的呼叫，
+# 因此在快取函式內把失敗結果包成例外拋出，再由外層取回原本的回傳值。
+# 暫時性錯誤（網路、節流）不會在整個 TTL 期間卡住同一檔股票，下次重跑即重新嘗試。
+class _UncachedResult(Exception):
+    def __init__(self, value) -> None:
+        super().__init__()
+        self.value = value
+
+
+# 資料本身造成的錯誤（無資料、上市天數不足）結果穩定，仍可快取
+_CACHEABLE_ERROR_TYPES = {'no_data', 'insufficient_data'}
+
+
+def _uncached_on_failure(cached_func):
+    """
+    包裝 bounded_cache 函式：取回被 _UncachedResult 帶出的失敗結果，並保留 .prime() 與 .clear()。
+    快取命中/未命中次數由 bounded_cache 在實際查詢處記錄。
+    """
+    @functools.wraps(cached_func)
+    def wrapper(*args, **kwargs):
+        try:
+            return cached_func(*args, **kwargs)
+        except _UncachedResult as e:
+            return e.value
+    wrapper.prime = cached_func.prime
+    wrapper.clear = cached_func.clear
+    return wrapper
+
+
+def _is_cacheable_analysis(result: dict) -> bool:
+    return result.get('status') == 'success' or result.get('error_type') in _CACHEABLE_ERROR_TYPES
+
+
+def _reject_failed_analysis(result: dict) -> dict:
+    if not _is_cacheable_analysis(result):
+        raise _UncachedResult(result)
+    return result
+
+
+def _reject_failed_plot(fig_json, err):
+    if err:
+        raise _UncachedResult((fig_json, err))
+    return fig_json, err
+
+
+@_uncached_on_failure
+@bounded_cache(ttl=3600)
+def cached_analyze_stock(stock_id: str) -> dict:
+    """
+    快取中只保存繪圖用的精簡陣列（chart_data：float32 指標、int32 日期），
+    不保存 Plotly Figure 或其 JSON，顯示時再由 stock_analyzer.build_chart 重建圖表。
+    只在真正要顯示圖表時呼叫；選股表格請用 cached_analyze_indicators。
+    """
+    return _reject_failed_analysis(analyze_stock(stock_id, chart_format='data'))
+
+
+@_uncached_on_failure
+@bounded_cache(ttl=3600)
+def cached_analyze_indicators(stock_id: str) -> dict:
+    """
+    選股表格用的快速路徑：只計算指標快照（k、d、i_value、avg_vol_5），不建立 Plotly 圖表，
+    圖表留待使用者要看時再由 cached_analyze_stock 產生。
+    """
+    return _reject_failed_analysis(analyze_stock(stock_id, with_chart=False))
+
+
+@_uncached_on_failure
+@bounded_cache(ttl=86400)
+def cached_plot_revenue(stock_id: str):
+    # 計時包含抓取營收資料（HTTP 部分另計於 http_fetch）
+    with instrumentation.timed('plot', chart='revenue'):
+        fig, err = plot_stock_revenue_trend(stock_id)
+    return _reject_failed_plot(_fig_to_cache(fig), err)
+
+
+@_uncached_on_failure
+@bounded_cache(ttl=86400)
+def cached_plot_shareholders(stock_id: str):
+    with instrumentation.timed('plot', chart='shareholders'):
+        fig, err = plot_stock_major_shareholders(stock_id)
+    return _reject_failed_plot(_fig_to_cache(fig), err)
+
+
+def analyze_indicators_many(stock_codes, on_progress=None, max_workers: int = MAX_CONCURRENCY) -> dict[str, dict]:
+    """
+    選股表格與預熱共用的批次指標計算（呼叫前先以 bulk_price_loader.prefetch_prices 補齊本地日線）：
+    本地日線已是最新的股票以 panel_analyzer 一次向量化計算，結果寫入 cached_analyze_indicators 的快取；
+    仍需向 FinMind 補抓的股票（或面板計算失敗時的全部股票）照舊逐檔呼叫 cached_analyze_indicators。
+
+    :param on_progress: 同 screening.run_screen_analysis，以 (已完成數, 總數, 股票代碼) 呼叫
+    :return: {股票代碼: analyze_stock(with_chart=False) 格式的結果}
+    """
+    codes = normalize_stock_codes(stock_codes)
+    pending = set(stocks_needing_fetch(codes))
+    results: dict[str, dict] = {}
+
+    local = [c for c in codes if c not in pending]
+    if local:
+        try:
+            results = snapshot_results(analyze_panel(local))
+        except Exception as e:
+            print(f"面板指標計算失敗，改為逐檔分析: {type(e).__name__} - {e}")
+    for stock_id, result in results.items():
+        if _is_cacheable_analysis(result):
+            cached_analyze_indicators.prime(result, stock_id)
+    instrumentation.count('screen_analysis', len(results), engine='panel')
+
+    remaining = [c for c in codes if c not in results]
+    instrumentation.count('screen_analysis', len(remaining), engine='single')
+    panel_done = len(results)
+    if on_progress is not None and panel_done:
+        on_progress(panel_done, len(codes), local[-1])
+
+    def _on_progress(done: int, total: int, stock_code: str) -> None:
+        if on_progress is not None:
+            on_progress(panel_done + done, len(codes), stock_code)
+
+    results.update(run_screen_analysis(remaining, cached_analyze_indicators,
+                                       on_progress=_on_progress, max_workers=max_workers))
+    return {c: results[c] for c in codes}
@@ -0,0 +1,124 @@
+# bench_incremental.py (增量指標更新：TaiwanStockAnalyzer.append_bar vs 每次重新計算全部指標，並檢查兩者結果一致)
+#
+# 用法（在專案根目錄執行）：
+#   python benchmarks/bench_incremental.py           # 300 日歷史，盤中覆寫最後一根 + 新增 20 根
+#   python benchmarks/bench_incremental.py -t 2600 -a 100
+#
+# 檢查兩種情況：
+#   1. 覆寫最後一根「歷史」K 棒（已併入的最後一根改回暫存，flush_incremental 時併入）
+#   2. 盤中模式（intraday=True）新增 K 棒後再覆寫最後一根（走暫存路徑）
+# 計時只包含 append_bar 呼叫本身（K 棒參數事先備妥），分別量測收盤 K 棒與盤中模式
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from stock_analyzer import PRICE_COLUMNS, TaiwanStockAnalyzer  # noqa: E402
+
+
+def make_bars(bars: int, seed: int = 0) -> pd.DataFrame:
+    """隨機漫步的日線；含一段平盤（高低相同）涵蓋 KD 分母為零的情況。"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    high = close * (1 + rng.uniform(0, 0.02, bars))
+    low = close * (1 - rng.uniform(0, 0.02, bars))
+    flat = slice(bars // 2, bars // 2 + 10)
+    high[flat] = low[flat] = close[flat]
+    volume = rng.uniform(1e6, 5e6, bars)
+    index = pd.bdate_range('2015-01-05', periods=bars, name='Date')
+    return pd.DataFrame({'Open': close, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=index)
+
+
+def make_analyzer(price_data: pd.DataFrame) -> TaiwanStockAnalyzer:
+    analyzer = TaiwanStockAnalyzer('2330')
+    analyzer.price_data = price_data.copy()
+    analyzer.calculate_indicators()
+    analyzer.calculate_signals()
+    return analyzer
+
+
+def max_abs_diff(a: dict, b: dict) -> float:
+    worst = 0.0
+    for key in b:
+        x, y = np.asarray(a[key], dtype=float), np.asarray(b[key], dtype=float)
+        if x.shape != y.shape or not np.array_equal(np.isnan(x), np.isnan(y)):
+            return np.inf
+        both = ~np.isnan(x)
+        if both.any():
+            worst = max(worst, float(np.max(np.abs(x[both] - y[both]))))
+    return worst
+
+
+def time_appends(history: pd.DataFrame, bars: list[tuple], intraday: bool) -> float:
+    """每根 K 棒 append_bar 的平均秒數。"""
+    analyzer = make_analyzer(history)
+    analyzer.start_incremental(intraday=intraday)
+    append_bar = analyzer.append_bar
+    start = time.perf_counter()
+    for bar in bars:
+        append_bar(*bar)
+    return (time.perf_counter() - start) / len(bars)
+
+
+def check(title: str, analyzer: TaiwanStockAnalyzer, expected_prices: pd.DataFrame) -> bool:
+    analyzer.flush_incremental()
+    expected = make_analyzer(expected_prices).indicators
+    diff = max_abs_diff(analyzer.indicators, expected)
+    same_prices = np.allclose(analyzer.price_data[PRICE_COLUMNS].values, expected_prices[PRICE_COLUMNS].values)
+    ok = diff < 1e-9 and same_prices
+    print(f"  {title}: 最大誤差 {diff:.1e}，{'一致' if ok else '不一致！'}")
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description='增量指標更新效能比較與正確性檢查')
+    ap.add_argument('-t', '--bars', type=int, default=300, help='歷史 K 棒數（預設 300，與 analyze_stock 相同）')
+    ap.add_argument('-a', '--append', type=int, default=20, help='新增的 K 棒數')
+    args = ap.parse_args()
+
+    data = make_bars(args.bars + args.append)
+    history, new_bars = data.iloc[:args.bars], data.iloc[args.bars:]
+    print(f"歷史 {args.bars} 日，新增 {args.append} 根")
+
+    # 1. 直接覆寫最後一根歷史 K 棒
+    analyzer = make_analyzer(history)
+    analyzer.start_incremental()
+    quote = history.iloc[-1] * [1.0, 1.03, 0.98, 1.02, 1.5]
+    analyzer.append_bar(history.index[-1], *quote[PRICE_COLUMNS])
+    expected = history.copy()
+    expected.iloc[-1] = quote[PRICE_COLUMNS].values
+    ok = check("覆寫最後一根歷史 K 棒", analyzer, expected)
+
+    # 2. 盤中模式新增 K 棒，最後一根再盤中覆寫
+    bars = [(bar_date, *row) for bar_date, row in zip(new_bars.index, new_bars[PRICE_COLUMNS].to_numpy().tolist())]
+    analyzer = make_analyzer(history)
+    analyzer.start_incremental(intraday=True)
+    for bar in bars:
+        analyzer.append_bar(*bar)
+    quote = new_bars.iloc[-1] * [1.0, 1.01, 0.99, 0.995, 1.2]
+    analyzer.append_bar(new_bars.index[-1], *quote[PRICE_COLUMNS])
+    expected = data.copy()
+    expected.iloc[-1] = quote[PRICE_COLUMNS].values
+    ok &= check("新增後盤中覆寫", analyzer, expected)
+
+    incremental_t = time_appends(history, bars, intraday=False)
+    intraday_t = time_appends(history, bars, intraday=True)
+    start = time.perf_counter()
+    for i in range(1, len(new_bars) + 1):
+        make_analyzer(data.iloc[:args.bars + i])
+    full_t = (time.perf_counter() - start) / len(new_bars)
+    print(f"  每根 K 棒：增量 {incremental_t * 1000:.3f} ms（盤中模式 {intraday_t * 1000:.3f} ms），"
+          f"全部重算 {full_t * 1000:.3f} ms（快 {full_t / incremental_t:.1f} 倍）")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# bench_kernels.py (滾動運算核心效能比較：kernels（numba / NumPy）vs 原本的 pandas rolling 與 np.convolve 版本)
+#
+# 用法（在專案根目錄執行）：
+#   python benchmarks/bench_kernels.py               # 單檔 300 日 + 300 日 × 1000 檔面板
+#   python benchmarks/bench_kernels.py -t 600 -s 2000 -n 20
+#
+# 未安裝 numba 時只比較 NumPy 版本；安裝後（pip install numba）會同時列出兩者。
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import kernels  # noqa: E402
+
+
+# --- 原本 TaiwanStockAnalyzer 的實作（保留作為正確性與效能的比較基準，只處理 1-D） ---
+def legacy_wma(prices, period):
+    weights = np.arange(1, period + 1, dtype=float)
+    result = np.full(len(prices), np.nan)
+    conv = np.convolve(prices, weights[::-1], mode='valid')
+    result[period - 1:] = conv / weights.sum()
+    return result
+
+
+def legacy_stochastic(high, low, close, k_period=9, k_slowing=3, d_period=3):
+    high_s, low_s, close_s = pd.Series(high), pd.Series(low), pd.Series(close)
+    min_low = low_s.rolling(window=k_period).min()
+    max_high = high_s.rolling(window=k_period).max()
+    denom = (max_high - min_low).replace(0, np.nan)
+    raw_k = 100 * ((close_s - min_low) / denom)
+    k = raw_k.rolling(window=k_slowing).mean().values
+    d = pd.Series(k).rolling(window=d_period).mean().values
+    return k, d
+
+
+def legacy_sma(data, period):
+    return pd.Series(data).rolling(window=period).mean().values
+
+
+def legacy_indicators(high, low, close) -> dict:
+    """單檔：SMA 5/20/60、KD、WMA 5/10。面板以逐欄呼叫模擬原本逐檔計算的方式。"""
+    k, d = legacy_stochastic(high, low, close)
+    return {
+        'sma5': legacy_sma(close, 5), 'sma20': legacy_sma(close, 20), 'sma60': legacy_sma(close, 60),
+        'k': k, 'd': d, 'wma5': legacy_wma(close, 5), 'wma10': legacy_wma(close, 10),
+    }
+
+
+def kernel_indicators(high, low, close) -> dict:
+    k, d = kernels.stochastic(high, low, close)
+    return {
+        'sma5': kernels.rolling_mean(close, 5), 'sma20': kernels.rolling_mean(close, 20),
+        'sma60': kernels.rolling_mean(close, 60), 'k': k, 'd': d,
+        'wma5': kernels.wma(close, 5), 'wma10': kernels.wma(close, 10),
+    }
+
+
+def legacy_panel(high, low, close) -> dict:
+    columns = [legacy_indicators(high[:, j], low[:, j], close[:, j]) for j in range(close.shape[1])]
+    return {key: np.column_stack([c[key] for c in columns]) for key in columns[0]}
+
+
+def make_prices(bars: int, stocks: int, seed: int = 0):
+    """隨機漫步的高低收；含平盤（高低相同）區段與前段 NaN（上市較晚的股票），涵蓋邊界情況。"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (bars, stocks)), axis=0))
+    high = close * (1 + rng.uniform(0, 0.02, close.shape))
+    low = close * (1 - rng.uniform(0, 0.02, close.shape))
+    flat = slice(bars // 2, bars // 2 + 10)
+    high[flat, :1] = low[flat, :1] = close[flat, :1]
+    late = rng.integers(0, bars // 3, stocks)
+    for j, start in enumerate(late[1:], start=1):
+        high[:start, j] = low[:start, j] = close[:start, j] = np.nan
+    return high, low, close
+
+
+def bench(func, args, repeat: int) -> float:
+    """回傳每次呼叫的平均秒數（先暖機一次，numba 的編譯時間不計入）。"""
+    func(*args)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def max_abs_diff(a: dict, b: dict) -> float:
+    worst = 0.0
+    for key in a:
+        x, y = np.asarray(a[key], dtype=float), np.asarray(b[key], dtype=float)
+        if not np.array_equal(np.isnan(x), np.isnan(y)):
+            return np.inf
+        both = ~np.isnan(x)
+        if both.any():
+            worst = max(worst, float(np.max(np.abs(x[both] - y[both]))))
+    return worst
+
+
+def main():
+    ap = argparse.ArgumentParser(description='滾動運算核心效能比較')
+    ap.add_argument('-t', '--bars', type=int, default=300, help='K 棒數（預設 300，與 analyze_stock 相同）')
+    ap.add_argument('-s', '--stocks', type=int, default=1000, help='面板股票數')
+    ap.add_argument('-n', '--repeat', type=int, default=10)
+    args = ap.parse_args()
+
+    modes = [('NumPy', False)] + ([('numba', True)] if kernels.HAS_NUMBA else [])
+    if not kernels.HAS_NUMBA:
+        print("未安裝 numba（或已設定 DISABLE_NUMBA_KERNELS=1），只量測 NumPy 版本。")
+
+    high, low, close = make_prices(args.bars, args.stocks)
+    cases = [
+        (f"單檔 {args.bars} 日", (high[:, 0], low[:, 0], close[:, 0]), legacy_indicators),
+        (f"面板 {args.bars} 日 × {args.stocks} 檔", (high, low, close), legacy_panel),
+    ]
+    try:
+        for title, data, legacy in cases:
+            expected = legacy(*data)
+            legacy_t = bench(legacy, data, args.repeat)
+            print(f"{title}")
+            print(f"  原本 (pandas/np.convolve): {legacy_t * 1000:9.3f} ms")
+            for name, use_numba in modes:
+                kernels.HAS_NUMBA = use_numba
+                diff = max_abs_diff(expected, kernel_indicators(*data))
+                t = bench(kernel_indicators, data, args.repeat)
+                print(f"  kernels ({name:5}):           {t * 1000:9.3f} ms  (快 {legacy_t / t:5.1f} 倍，最大誤差 {diff:.1e})")
+    finally:
+        kernels.HAS_NUMBA = any(use for _, use in modes)
+
+
+if __name__ == '__main__':
+    main()
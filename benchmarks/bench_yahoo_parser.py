@@ -0,0 +1,161 @@
+# bench_yahoo_parser.py (Yahoo 排行榜解析效能比較：yahoo_parser 串流解析 vs 原本的 BeautifulSoup 版本)
+#
+# 用法（在專案根目錄執行）：
+#   python benchmarks/bench_yahoo_parser.py                    # 使用 fixtures/ 下所有 yahoo_*.html
+#   python benchmarks/bench_yahoo_parser.py page.html -n 50    # 指定 HTML 檔與重複次數
+#   python benchmarks/bench_yahoo_parser.py --regenerate       # 重新產生合成的 fixture
+#
+# 錄製真實頁面：curl -A "Mozilla/5.0" "https://tw.stock.yahoo.com/rank/change-up?exchange=TAI" \
+#                   -o benchmarks/fixtures/yahoo_rank_tai.html
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from yahoo_parser import parse_ranking_html  # noqa: E402
+
+FIXTURE_DIR = Path(__file__).resolve().parent / 'fixtures'
+SYNTHETIC_FIXTURE = FIXTURE_DIR / 'yahoo_rank_synthetic.html'
+
+
+def legacy_parse(html: str) -> list[dict]:
+    """原本 yahoo_scraper 中以 BeautifulSoup 解析的版本（保留作為效能與正確性的比較基準）。"""
+    import pandas as pd
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    rows = soup.find_all('li', class_='List(n)')
+    all_stocks = []
+    for i, row in enumerate(rows):
+        try:
+            sticky_cell = row.find('div', style='position:sticky;min-width:184px')
+            if not sticky_cell: continue
+
+            rank_span = sticky_cell.find('span', class_=re.compile(r'Fz\(24px\)'))
+            name = sticky_cell.find('div', class_='Lh(20px) Fw(600) Fz(16px) Ell').text.strip()
+            symbol = sticky_cell.find('span', class_='Fz(14px) C(#979ba7) Ell').text.strip()
+
+            data_containers = row.find_all('div', class_=lambda x: x and 'Fxg(1)' in x and 'Ta(end)' in x)
+            if len(data_containers) < 8: continue
+
+            rank = pd.to_numeric(rank_span.text.strip(), errors='coerce') if rank_span else i + 1
+            price = pd.to_numeric(data_containers[0].text.strip(), errors='coerce')
+            change_percent = pd.to_numeric(data_containers[2].text.strip().replace('%', ''), errors='coerce')
+            volume = pd.to_numeric(data_containers[6].text.strip().replace(',', ''), errors='coerce')
+
+            all_stocks.append({
+                'Rank': int(rank),
+                'Stock Symbol': symbol,
+                'Stock Name': name,
+                'Price': price,
+                'Change Percent': change_percent,
+                'Volume (Shares)': volume,
+            })
+        except Exception:
+            continue
+    return all_stocks
+
+
+def generate_fixture(rows: int = 100, seed: int = 0) -> str:
+    """產生與 Yahoo 排行榜頁面結構相同的合成 HTML（含頁首、頁尾與大量非表格元素）。"""
+    rnd = random.Random(seed)
+    cell_class = 'Fxg(1) Fxs(1) Fxb(0%) Ta(end) Mend($m-table-cell-space) Mend(0):lc Miw(68px)'
+    filler = ''.join(
+        f'<div class="D(f) Ai(c) Mb(8px)"><a class="Fz(14px) C($c-link-text)" href="/quote/{1000 + i}">'
+        f'<span>相關新聞標題 {i}</span></a><p class="Fz(12px) C(#5b636a)">摘要文字 {i}</p></div>'
+        for i in range(600)
+    )
+    script = '<script>window.App=' + '{"k":"' + 'x' * 20000 + '"}' + ';</script>'
+
+    items = []
+    for rank in range(1, rows + 1):
+        code = rnd.choice([f'{rnd.randint(1101, 9962)}', f'00{rnd.randint(50, 939)}'])
+        price = rnd.uniform(10, 1200)
+        change = rnd.uniform(-10, 10)
+        volume = rnd.randint(1000, 90_000_000)
+        cells = [f'{price:.2f}', f'{price * change / 100:+.2f}', f'{change:+.2f}%', f'{price * 1.05:.2f}',
+                 f'{price * 0.95:.2f}', f'{price * 1.01:.2f}', f'{volume:,}', f'{volume * price / 1e8:.2f}']
+        items.append(
+            '<li class="List(n)"><div class="D(f) W(100%) Ai(c) Bxz(bb) H(52px) Px(16px) Px(12px)--mobile">'
+            '<div class="D(f) Ai(c) Bgc(#fff) table-row:h_Bgc(#e7f3ff) Pend(8px)" style="position:sticky;min-width:184px">'
+            f'<span class="Fz(24px) Fw(600) W(46px) C(#232a31)">{rank}</span>'
+            '<div class="D(f) Fld(c) Ai(fs)">'
+            f'<div class="Lh(20px) Fw(600) Fz(16px) Ell">股票{rank}</div>'
+            f'<div class="D(f) Ai(c)"><span class="Fz(14px) C(#979ba7) Ell">{code}.TW</span></div>'
+            '</div></div>'
+            + ''.join(f'<div class="{cell_class}"><span class="Jc(fe) Fw(600) D(f) Ai(c)">{c}</span></div>' for c in cells)
+            + '</div></li>'
+        )
+    return (
+        '<!DOCTYPE html><html lang="zh-Hant-TW"><head><meta charset="utf-8"><title>漲幅排行 - Yahoo股市</title>'
+        f'{script}</head><body><div id="header">{filler}</div>'
+        f'<div class="table-body"><ul class="M(0) P(0) List(n)">{"".join(items)}</ul></div>'
+        f'<div id="footer">{filler}</div></body></html>'
+    )
+
+
+def _same_rows(a: list[dict], b: list[dict]) -> bool:
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        for key in x:
+            vx, vy = x[key], y[key]
+            if isinstance(vx, str) or isinstance(vy, str):
+                if vx != vy:
+                    return False
+            elif not (vx == vy or (vx != vx and vy != vy)):  # NaN 視為相等
+                return False
+    return True
+
+
+def bench(func, html: str, repeat: int) -> float:
+    """回傳每次解析的平均秒數（先暖機一次）。"""
+    func(html)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(html)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Yahoo 排行榜解析效能比較')
+    ap.add_argument('files', nargs='*', type=Path, help='HTML 檔案（預設為 fixtures/yahoo_*.html）')
+    ap.add_argument('-n', '--repeat', type=int, default=20)
+    ap.add_argument('--regenerate', action='store_true', help='重新產生合成 fixture 後結束')
+    args = ap.parse_args()
+
+    if args.regenerate:
+        FIXTURE_DIR.mkdir(exist_ok=True)
+        SYNTHETIC_FIXTURE.write_text(generate_fixture(), encoding='utf-8')
+        print(f"已寫入 {SYNTHETIC_FIXTURE.relative_to(ROOT)}")
+        return
+
+    files = args.files or sorted(FIXTURE_DIR.glob('yahoo_*.html'))
+    try:
+        import bs4  # noqa: F401
+        has_bs4 = True
+    except ImportError:
+        has_bs4 = False
+        print("未安裝 beautifulsoup4，只量測 yahoo_parser。")
+
+    for path in files:
+        html = path.read_text(encoding='utf-8')
+        rows = parse_ranking_html(html)
+        new_t = bench(parse_ranking_html, html, args.repeat)
+        print(f"{path.name}: {len(html) / 1024:.0f} KB，{len(rows)} 列")
+        print(f"  yahoo_parser : {new_t * 1000:8.2f} ms")
+        if has_bs4:
+            legacy_rows = legacy_parse(html)
+            old_t = bench(legacy_parse, html, args.repeat)
+            print(f"  BeautifulSoup: {old_t * 1000:8.2f} ms  (快 {old_t / new_t:.1f} 倍，"
+                  f"結果{'一致' if _same_rows(rows, legacy_rows) else '不一致！'})")
+
+
+if __name__ == '__main__':
+    main()
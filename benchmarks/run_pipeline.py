@@ -0,0 +1,425 @@
+# run_pipeline.py (爬取 → 分析 → 繪圖 全流程基準測試：以本機 stub server 重播錄製或合成的 HTML / FinMind JSON)
+#
+# 用法（在專案根目錄執行）：
+#   python benchmarks/run_pipeline.py                          # 預設 20 檔股票、每階段重複 5 次
+#   python benchmarks/run_pipeline.py --stocks 50 -n 3 --latency 30
+#   python benchmarks/run_pipeline.py --json result.json       # 另存結果
+#   python benchmarks/run_pipeline.py --baseline result.json   # 與先前結果比較，中位數變慢超過門檻時以狀態碼 1 結束
+#   python benchmarks/run_pipeline.py --record                 # 以真實網站錄製 fixture（需設定 Cookie / Token）
+#
+# fixtures/ 下有錄製檔時優先使用，否則以與真實頁面相同結構的合成資料代替：
+#   goodinfo_my_stock.html、concentration_1day.html、yahoo_*.html、finmind/<股票代碼>.json
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# 模組匯入前先設定：本地價格資料庫放在暫存目錄、FinMind 節流以最高等級計算（只打本機 stub）
+_TMP = tempfile.TemporaryDirectory(prefix='bench_pipeline_')
+os.environ['PRICE_STORE_PATH'] = os.path.join(_TMP.name, 'warm.db')
+os.environ.setdefault('FINMIND_TIER', 'sponsor')
+os.environ.setdefault('FINMIND_API_TOKEN', 'benchmark')
+os.environ.setdefault('GOODINFO_COOKIE_MY_STOCK', 'benchmark')
+
+import twstock  # noqa: E402
+
+import concentration_1day  # noqa: E402
+import price_store  # noqa: E402
+import scraper  # noqa: E402
+import stock_analyzer  # noqa: E402
+import yahoo_scraper  # noqa: E402
+
+FIXTURE_DIR = Path(__file__).resolve().parent / 'fixtures'
+GOODINFO_FIXTURE = FIXTURE_DIR / 'goodinfo_my_stock.html'
+CONCENTRATION_FIXTURE = FIXTURE_DIR / 'concentration_1day.html'
+FINMIND_FIXTURE_DIR = FIXTURE_DIR / 'finmind'
+CONCENTRATION_TABLE_ID = '籌碼集中度排行轉網頁.(排程)_3148'
+
+
+# --- 合成 fixture（結構與真實頁面相同，只有數值為隨機） ---
+def synthetic_goodinfo(stock_ids: list[str], seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    header = ['代號', '名稱', '市場', '股價日期', '成交', '漲跌價', '漲跌幅', '成交張數', '成交額(百萬)', '昨收', '開盤', '最高', '最低']
+    rows = []
+    for i, code in enumerate(stock_ids * 5):
+        if i % 20 == 0:  # Goodinfo 每 20 列重複一次標頭
+            rows.append('<tr>' + ''.join(f'<th>{h}</th>' for h in header) + '</tr>')
+        price = rnd.uniform(10, 900)
+        change = rnd.uniform(-10, 10)
+        cells = [code, f'{_stock_name(code)} 市', '上市', "'10/16", f'{price:.2f}', f'{price * change / 100:+.2f}',
+                 f'{change:+.2f}', f'{rnd.randint(500, 90000):,}', f'{rnd.uniform(1, 9000):,.1f}',
+                 *(f'{price * rnd.uniform(0.95, 1.05):.2f}' for _ in range(4))]
+        rows.append('<tr>' + ''.join(f'<td><nobr>{c}</nobr></td>' for c in cells) + '</tr>')
+    html = ('<html><head><meta charset="utf-8"><title>選股 - Goodinfo! 台灣股市資訊網</title></head><body>'
+            + '<div>' * 30 + f'<table id="tblStockList">{"".join(rows)}</table>' + '</div>' * 30 + '</body></html>')
+    return html.encode('utf-8')
+
+
+def synthetic_concentration(stock_ids: list[str], seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    header = ['編號', '代碼', '股票名稱', '1日集中度', '5日集中度', '10日集中度', '20日集中度', '60日集中度', '120日集中度', '10日均量']
+    rows = ['<tr><td colspan="10">籌碼集中度 1 日排行</td></tr>', '<tr>' + ''.join(f'<td>{h}</td>' for h in header) + '</tr>']
+    for i, code in enumerate(stock_ids * 10, start=1):
+        values = [f'{rnd.uniform(-30, 30):.2f}' for _ in range(6)]
+        rows.append('<tr>' + ''.join(f'<td>{c}</td>' for c in
+                                     [i, code, _stock_name(code), *values, rnd.randint(100, 50000)]) + '</tr>')
+    rows.append('<tr><td colspan="10">資料來源：集保結算所</td></tr>')
+    html = ('<html><head><meta charset="big5"><title>籌碼集中度排行</title></head><body>'
+            f'<table id="{CONCENTRATION_TABLE_ID}">{"".join(rows)}</table></body></html>')
+    return html.encode('big5', errors='replace')
+
+
+def synthetic_finmind_prices(stock_id: str, start: date, end: date) -> list[dict]:
+    """以股票代碼為種子的隨機漫步日線，欄位同 FinMind TaiwanStockPrice。"""
+    rnd = random.Random(int(''.join(ch for ch in stock_id if ch.isdigit()) or 0))
+    price = rnd.uniform(20, 600)
+    rows = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            open_price = price
+            price = max(1.0, price * (1 + rnd.gauss(0, 0.02)))
+            high, low = max(open_price, price) * (1 + rnd.uniform(0, 0.01)), min(open_price, price) * (1 - rnd.uniform(0, 0.01))
+            volume = rnd.randint(100_000, 20_000_000)
+            rows.append({
+                'date': day.isoformat(), 'stock_id': stock_id, 'Trading_Volume': volume,
+                'Trading_money': int(volume * price), 'open': round(open_price, 2), 'max': round(high, 2),
+                'min': round(low, 2), 'close': round(price, 2), 'spread': round(price - open_price, 2),
+                'Trading_turnover': volume // 1000,
+            })
+        day += timedelta(days=1)
+    return rows
+
+
+def _stock_name(code: str) -> str:
+    info = twstock.codes.get(code)
+    return info.name if info else code
+
+
+# --- 本機 stub server ---
+class Fixtures:
+    """各資料來源的回應內容；有錄製檔時使用錄製檔，否則使用合成資料。"""
+
+    def __init__(self, stock_ids: list[str]) -> None:
+        self.goodinfo = GOODINFO_FIXTURE.read_bytes() if GOODINFO_FIXTURE.exists() else synthetic_goodinfo(stock_ids)
+        self.concentration = (CONCENTRATION_FIXTURE.read_bytes() if CONCENTRATION_FIXTURE.exists()
+                              else synthetic_concentration(stock_ids))
+        yahoo_files = sorted(FIXTURE_DIR.glob('yahoo_*.html'), key=lambda p: 'synthetic' in p.name)
+        if not yahoo_files:
+            raise SystemExit("找不到 Yahoo fixture，請先執行 python benchmarks/bench_yahoo_parser.py --regenerate")
+        self.yahoo = yahoo_files[0].read_bytes()
+        self.sources = {
+            'goodinfo': 'recorded' if GOODINFO_FIXTURE.exists() else 'synthetic',
+            'concentration': 'recorded' if CONCENTRATION_FIXTURE.exists() else 'synthetic',
+            'yahoo': yahoo_files[0].name,
+            'finmind': 'recorded' if any(FINMIND_FIXTURE_DIR.glob('*.json')) else 'synthetic',
+        }
+
+    def finmind(self, query: dict) -> bytes:
+        stock_id = query.get('data_id', [''])[0]
+        recorded = FINMIND_FIXTURE_DIR / f'{stock_id}.json'
+        if recorded.exists():
+            return recorded.read_bytes()
+        start = date.fromisoformat(query['start_date'][0])
+        end = date.fromisoformat(query.get('end_date', [date.today().isoformat()])[0])
+        data = synthetic_finmind_prices(stock_id, start, end)
+        return json.dumps({'msg': 'success', 'status': 200, 'data': data}).encode('utf-8')
+
+
+def start_stub_server(fixtures: Fixtures, latency: float) -> ThreadingHTTPServer:
+    """啟動背景執行緒中的 HTTP 伺服器，依路徑回應對應的 fixture；latency 為每個回應額外延遲的秒數。"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path.startswith('/tw/StockListFilter/'):
+                body, content_type = fixtures.goodinfo, 'text/html; charset=utf-8'
+            elif parts.path.startswith('/main/report/'):
+                body, content_type = fixtures.concentration, 'text/html; charset=big5'
+            elif parts.path.startswith('/rank/'):
+                body, content_type = fixtures.yahoo, 'text/html; charset=utf-8'
+            elif parts.path == '/api/v4/data':
+                body, content_type = fixtures.finmind(parse_qs(parts.query)), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            if latency:
+                time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _rebase(url: str, base: str) -> str:
+    """保留原網址的路徑與查詢字串，只把主機換成 stub server。"""
+    parts, target = urlsplit(url), urlsplit(base)
+    return urlunsplit((target.scheme, target.netloc, parts.path, parts.query, ''))
+
+
+def point_modules_at(base: str) -> None:
+    scraper.GOODINFO_MY_STOCK_URL = _rebase(scraper.GOODINFO_MY_STOCK_URL, base)
+    scraper.REQUEST_DELAY = (0.0, 0.0)  # 模擬人類行為的延遲不計入
+    concentration_1day.CONCENTRATION_URL = _rebase(concentration_1day.CONCENTRATION_URL, base)
+    yahoo_scraper.YAHOO_RANK_URL = _rebase(yahoo_scraper.YAHOO_RANK_URL, base)
+    stock_analyzer.FINMIND_API_URL = _rebase(stock_analyzer.FINMIND_API_URL, base)
+
+
+# --- 量測 ---
+def _reset_peak_rss() -> bool:
+    """Linux 可透過 /proc/self/clear_refs 重設 VmHWM，讓每個階段各自量測峰值；其他平台回傳 False。"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024  # macOS 單位為 bytes，Linux 為 KB
+
+
+def run_stage(name: str, func, repeat: int, stocks_per_call: int = 0, setup=None, verbose: bool = False) -> dict:
+    """
+    重複執行 func 並記錄每次耗時；setup 於每次執行前呼叫且不計時。
+    stocks_per_call > 0 時另計算每秒處理的股票數。
+    """
+    per_stage_peak = _reset_peak_rss()
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - start)
+        if result is None or result is False:
+            raise RuntimeError(f"{name} 執行失敗（回傳 {result!r}），請加上 --verbose 檢視輸出。")
+
+    ordered = sorted(timings)
+    stats = {
+        'stage': name,
+        'median_ms': statistics.median(timings) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))] * 1000,
+        'min_ms': ordered[0] * 1000,
+        'peak_rss_mb': _peak_rss_mb(),
+        'peak_rss_scope': 'stage' if per_stage_peak else 'process',
+    }
+    if stocks_per_call:
+        stats['stocks_per_s'] = stocks_per_call / statistics.median(timings)
+    return stats
+
+
+def _analyze_all(stock_ids: list[str]) -> bool:
+    results = [stock_analyzer.analyze_stock(s, with_chart=False) for s in stock_ids]
+    failed = [r for r in results if r['status'] != 'success']
+    if failed:
+        print(f"分析失敗：{failed[0]['message']}")
+        return False
+    return True
+
+
+def _fresh_price_store() -> None:
+    """冷啟動：換一個空的本地價格資料庫，讓每次分析都要向（stub）FinMind 抓取完整區間。"""
+    path = tempfile.mktemp(suffix='.db', dir=_TMP.name)
+    os.environ['PRICE_STORE_PATH'] = path
+    price_store._store = None
+
+
+def _use_warm_store() -> None:
+    os.environ['PRICE_STORE_PATH'] = os.path.join(_TMP.name, 'warm.db')
+    price_store._store = None
+
+
+def _render_all(analyzers: list) -> bool:
+    for analyzer in analyzers:
+        fig = analyzer.create_chart()
+        fig.to_json()  # Streamlit 送往瀏覽器前的序列化
+    return True
+
+
+def _prepared_analyzers(stock_ids: list[str]) -> list:
+    analyzers = []
+    for stock_id in stock_ids:
+        analyzer = stock_analyzer.TaiwanStockAnalyzer(stock_id)
+        analyzer.fetch_data()
+        analyzer.calculate_indicators()
+        analyzer.calculate_signals()
+        analyzers.append(analyzer)
+    return analyzers
+
+
+def run_pipeline(stock_ids: list[str], repeat: int, verbose: bool) -> list[dict]:
+    n = len(stock_ids)
+    stages = [
+        run_stage('scrape_goodinfo', scraper.scrape_goodinfo, repeat, verbose=verbose),
+        run_stage('scrape_yahoo_stock_rankings', lambda: yahoo_scraper.scrape_yahoo_stock_rankings(yahoo_scraper.ranking_url()),
+                  repeat, verbose=verbose),
+        run_stage('fetch_stock_concentration_data', concentration_1day.fetch_stock_concentration_data, repeat, verbose=verbose),
+        run_stage('analyze_stock[cold]', lambda: _analyze_all(stock_ids), repeat, n,
+                  setup=_fresh_price_store, verbose=verbose),
+    ]
+    _use_warm_store()
+    with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+        _analyze_all(stock_ids)  # 填入本地資料庫
+        analyzers = _prepared_analyzers(stock_ids)
+    stages.append(run_stage('analyze_stock[warm]', lambda: _analyze_all(stock_ids), repeat, n, verbose=verbose))
+    stages.append(run_stage('create_chart+to_json', lambda: _render_all(analyzers), repeat, n, verbose=verbose))
+    return stages
+
+
+def _pad(text: str, width: int, right: bool = False) -> str:
+    """依顯示寬度補空白（全形字元佔兩格），讓中文標題與數字欄位對齊。"""
+    shown = sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+    fill = ' ' * max(0, width - shown)
+    return fill + text if right else text + fill
+
+
+def print_report(stages: list[dict], baseline: dict | None, threshold: float) -> list[str]:
+    """
+    印出結果表；有 baseline 時標示變化幅度，回傳超過門檻的階段名稱。
+    analyze_stock[cold] 每次使用空的本地資料庫（含向 FinMind 抓取），[warm] 只讀本地資料庫。
+    """
+    regressions = []
+    widths = (32, 12, 10, 10, 14)
+    titles = ('階段', '中位數 ms', 'p95 ms', '股票/秒', '峰值 RSS MB')
+    print(''.join(_pad(t, w, right=i > 0) for i, (t, w) in enumerate(zip(titles, widths))) + '  與基準比較')
+    for s in stages:
+        per_second = f"{s['stocks_per_s']:.1f}" if 'stocks_per_s' in s else '-'
+        cells = (s['stage'], f"{s['median_ms']:.1f}", f"{s['p95_ms']:.1f}", per_second, f"{s['peak_rss_mb']:.1f}")
+        line = ''.join(_pad(c, w, right=i > 0) for i, (c, w) in enumerate(zip(cells, widths)))
+        base = (baseline or {}).get(s['stage'])
+        if base:
+            change = s['median_ms'] / base['median_ms'] - 1
+            line += f"  {change:+.0%}"
+            if change > threshold:
+                line += '  ⚠️ 變慢'
+                regressions.append(s['stage'])
+        print(line)
+    if stages and stages[0]['peak_rss_scope'] == 'process':
+        print("（此平台無法重設峰值，RSS 為行程啟動以來的峰值）")
+    return regressions
+
+
+# --- 錄製 ---
+def record_fixtures(stock_ids: list[str]) -> None:
+    """以真實網站錄製 fixture（Goodinfo 需 GOODINFO_COOKIE_MY_STOCK，FinMind 建議設定 FINMIND_API_TOKEN）。"""
+    import http_client
+
+    FIXTURE_DIR.mkdir(exist_ok=True)
+    FINMIND_FIXTURE_DIR.mkdir(exist_ok=True)
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'}
+    cookie = os.getenv('GOODINFO_COOKIE_MY_STOCK')
+    pages = [
+        (GOODINFO_FIXTURE, scraper.GOODINFO_MY_STOCK_URL,
+         {**headers, 'Cookie': cookie, 'Referer': 'https://goodinfo.tw/tw/StockListFilter/StockList.asp'}),
+        (CONCENTRATION_FIXTURE, concentration_1day.CONCENTRATION_URL, headers),
+        (FIXTURE_DIR / 'yahoo_rank_tai.html', yahoo_scraper.ranking_url('change-up', 'TAI'), headers),
+    ]
+    for path, url, page_headers in pages:
+        try:
+            response = http_client.get_with_retry(url, headers=page_headers, timeout=25)
+            path.write_bytes(response.content)
+            print(f"已錄製 {path.relative_to(ROOT)}（{len(response.content) / 1024:.0f} KB）")
+        except Exception as e:
+            print(f"錄製 {path.name} 失敗：{e}")
+
+    start = date.today() - timedelta(days=300)
+    for stock_id in stock_ids:
+        try:
+            data = stock_analyzer.request_finmind_data({
+                'dataset': 'TaiwanStockPrice', 'data_id': stock_id,
+                'start_date': start.isoformat(), 'end_date': date.today().isoformat(),
+            })
+            payload = {'msg': 'success', 'status': 200, 'data': data}
+            (FINMIND_FIXTURE_DIR / f'{stock_id}.json').write_text(json.dumps(payload), encoding='utf-8')
+        except Exception as e:
+            print(f"錄製 FinMind {stock_id} 失敗：{e}")
+    print(f"已錄製 {len(stock_ids)} 檔 FinMind 日線至 {FINMIND_FIXTURE_DIR.relative_to(ROOT)}")
+
+
+def default_stock_ids(count: int) -> list[str]:
+    return sorted(code for code, info in twstock.codes.items() if info.type == '股票' and info.market == '上市')[:count]
+
+
+def main():
+    ap = argparse.ArgumentParser(description='爬取 → 分析 → 繪圖 全流程基準測試')
+    ap.add_argument('--stocks', type=int, default=20, help='分析與繪圖階段的股票數')
+    ap.add_argument('-n', '--repeat', type=int, default=5, help='每個階段重複次數')
+    ap.add_argument('--latency', type=float, default=0.0, help='stub server 每個回應額外延遲的毫秒數（模擬網路）')
+    ap.add_argument('--json', type=Path, help='將結果寫入 JSON 檔')
+    ap.add_argument('--baseline', type=Path, help='與先前 --json 輸出的結果比較')
+    ap.add_argument('--threshold', type=float, default=0.2, help='中位數變慢超過此比例視為退步（預設 0.2）')
+    ap.add_argument('--record', action='store_true', help='以真實網站錄製 fixture 後結束')
+    ap.add_argument('--verbose', action='store_true', help='顯示各模組的輸出')
+    args = ap.parse_args()
+
+    stock_ids = default_stock_ids(args.stocks)
+    if args.record:
+        record_fixtures(stock_ids)
+        return
+
+    fixtures = Fixtures(stock_ids)
+    server = start_stub_server(fixtures, args.latency / 1000)
+    point_modules_at(f'http://127.0.0.1:{server.server_port}')
+    print(f"stub server：http://127.0.0.1:{server.server_port}，fixture 來源：{fixtures.sources}")
+    print(f"{len(stock_ids)} 檔股票，每階段 {args.repeat} 次，模擬延遲 {args.latency:.0f} ms\n")
+
+    try:
+        stages = run_pipeline(stock_ids, args.repeat, args.verbose)
+    finally:
+        server.shutdown()
+
+    baseline = None
+    if args.baseline:
+        baseline = {s['stage']: s for s in json.loads(args.baseline.read_text(encoding='utf-8'))['stages']}
+    regressions = print_report(stages, baseline, args.threshold)
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            'stocks': len(stock_ids), 'repeat': args.repeat, 'latency_ms': args.latency,
+            'fixtures': fixtures.sources, 'stages': stages,
+        }, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\n結果已寫入 {args.json}")
+    if regressions:
+        print(f"\n以下階段比基準慢超過 {args.threshold:.0%}：{'、'.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
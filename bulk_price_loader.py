@@ -0,0 +1,123 @@
+# bulk_price_loader.py (整體市場批次下載：以「日期」為單位一次取得所有上市櫃股價，再分送到各股)
+
+from collections import Counter
+from datetime import date, timedelta
+
+import pandas as pd
+
+from price_store import get_price_store, next_synced_through
+from stock_analyzer import normalize_price_data, request_finmind_data
+
+
+def _weekdays(start: date, end: date) -> list[date]:
+    """列出 [start, end] 間的平日；國定假日無法事先得知，查詢時回傳空資料即略過。"""
+    days = []
+    d = start
+    while d <= end:
+        if d.weekday() < 5:
+            days.append(d)
+        d += timedelta(days=1)
+    return days
+
+
+def _bulk_window_start(gaps: dict[str, date], today: date) -> date | None:
+    """
+    由各股的補抓起日挑選批次下載的視窗起日：視窗 [起日, today] 的每個日期各需一次全市場請求，
+    只涵蓋起日不早於視窗起日的股票（其餘股票逐檔抓取至少各需一次請求）。
+    回傳「涵蓋股票數 ≥ 日期數」的最早起日；沒有值得批次下載的視窗時回傳 None。
+    """
+    best = None
+    covered = 0
+    for start, group_size in sorted(Counter(gaps.values()).items(), reverse=True):
+        covered += group_size
+        if covered >= len(_weekdays(start, today)):
+            best = start
+    return best
+
+
+def fetch_market_prices(trade_date: date) -> pd.DataFrame:
+    """
+    以 FinMind 的「只帶日期」TaiwanStockPrice 查詢取得單一交易日所有股票的日線。
+    回傳以 Date 為索引、含 stock_id 欄位的 DataFrame；非交易日回傳空 DataFrame。
+    """
+    print(f"正在從 FinMind API 抓取 {trade_date} 全市場股價...")
+    data_list = request_finmind_data({
+        "dataset": "TaiwanStockPrice",
+        "start_date": trade_date.strftime('%Y-%m-%d'),
+    })
+    data = normalize_price_data(data_list)
+    if 'stock_id' not in data.columns:
+        data['stock_id'] = pd.Series(dtype=str)
+    return data
+
+
+def prefetch_prices(stock_ids: list[str], days: int = 300) -> dict:
+    """
+    以整體市場查詢批次補齊多檔股票的本地日線資料，讓後續 analyze_stock 只需讀本地資料庫。
+
+    - 已有歷史資料的股票只需補上次同步後的缺口；尚無歷史資料的股票需補整段期間（約 days×5/7 個交易日）。
+    - 批次下載的請求數等於視窗內的日期數，因此只選擇「涵蓋的股票數不少於日期數」的最長視窗（見 _bulk_window_start）；
+      缺口比視窗更長的股票（例如很久沒開過的股票）留給 TaiwanStockAnalyzer.fetch_data 逐檔抓取，
+      不會因為一檔股票把所有股票的視窗拉長。
+    整體請求數不超過逐檔抓取所需的次數，為 O(日期數) 而非 O(股票數)。
+    任一日期請求失敗（例如帳號等級不支援全市場查詢）時不寫入任何資料，交由逐檔抓取的路徑處理。
+
+    :return: 統計資訊 {'requests': 請求次數, 'stocks': 本次更新的股票數, 'skipped': 未處理的股票數}
+    """
+    store = get_price_store()
+    today = date.today()
+    start_date = today - timedelta(days=days)
+    stock_ids = list(dict.fromkeys(str(s).strip() for s in stock_ids if str(s).strip()))
+    states = store.get_sync_states(stock_ids)
+
+    warm = {s: state for s, state in states.items() if state.covered_from <= start_date and not state.is_up_to_date()}
+    cold = [s for s in stock_ids if s not in states or states[s].covered_from > start_date]
+
+    gaps: dict[str, date] = {}  # stock_id → 需要補抓的起日
+    for stock_id, state in warm.items():
+        gaps[stock_id] = state.synced_through + timedelta(days=1)
+    for stock_id in cold:
+        gaps[stock_id] = start_date
+    window_start = _bulk_window_start(gaps, today)
+    targets = {s: d for s, d in gaps.items() if window_start is not None and d >= window_start}
+    skipped = len(stock_ids) - len(targets)
+
+    if not targets:
+        return {'requests': 0, 'stocks': 0, 'skipped': skipped}
+
+    dates = _weekdays(window_start, today)
+    print(f"批次下載 {len(targets)} 檔股票的股價，共需 {len(dates)} 次全市場請求...")
+
+    frames = []
+    try:
+        for trade_date in dates:
+            market = fetch_market_prices(trade_date)
+            frames.append(market[market['stock_id'].isin(targets.keys())])
+    except Exception as e:
+        print(f"警告: 全市場股價批次下載失敗，改由逐檔抓取: {type(e).__name__} - {e}")
+        return {'requests': len(frames) + 1, 'stocks': 0, 'skipped': len(stock_ids)}
+
+    combined = pd.concat(frames) if frames else normalize_price_data([]).assign(stock_id=pd.Series(dtype=str))
+    last_bar = combined.index.max().date() if not combined.empty else None
+    synced_through = next_synced_through(today, last_bar)
+
+    per_stock = {stock_id: group.drop(columns='stock_id') for stock_id, group in combined.groupby('stock_id')}
+    empty = normalize_price_data([])
+    store.save_many(
+        {stock_id: per_stock.get(stock_id, empty) for stock_id in targets},
+        {stock_id: states[stock_id].covered_from if stock_id in warm else start_date for stock_id in targets},
+        synced_through,
+    )
+    print(f"批次下載完成：更新 {len(targets)} 檔股票，共 {len(combined)} 筆日線。")
+    return {'requests': len(dates), 'stocks': len(targets), 'skipped': skipped}
+
+
+def stocks_needing_fetch(stock_ids: list[str], days: int = 300) -> list[str]:
+    """
+    本地日線尚未涵蓋分析期間或不是最新的股票（保持輸入順序）；
+    分析這些股票時 TaiwanStockAnalyzer.fetch_data 會逐檔向 FinMind 請求，其餘股票只需讀本地資料庫。
+    """
+    start_date = date.today() - timedelta(days=days)
+    states = get_price_store().get_sync_states(stock_ids)
+    return [s for s in stock_ids
+            if s not in states or states[s].covered_from > start_date or not states[s].is_up_to_date()]
@@ -0,0 +1,183 @@
+# cache_backend.py (跨行程共用的快取後端：多個 Streamlit 副本或重新啟動後共用爬蟲與分析結果)
+#
+# 以環境變數選擇後端：
+#     CACHE_BACKEND=none    只用行程內快取（預設，與原本行為相同）
+#     CACHE_BACKEND=sqlite  共用的 SQLite 檔案，CACHE_URL 為檔案路徑（預設 .cache/shared_cache.sqlite3）
+#     CACHE_BACKEND=redis   本機或內網的 Redis 相容伺服器，CACHE_URL 例如 redis://localhost:6379/0（需安裝 redis 套件）
+# 值為 pickle 位元組，只適合放在受信任的本機磁碟或內網伺服器上。
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+_DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'shared_cache.sqlite3')
+# 鍵的前綴；快取值的格式改變時調整版本號，舊資料自然失效
+KEY_PREFIX = 'twstock:v1'
+# SQLite 後端每寫入這麼多次就清除一次過期資料
+_PURGE_EVERY = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entry (
+    key        TEXT PRIMARY KEY,
+    value      BLOB NOT NULL,
+    expires_at REAL NOT NULL  -- time.time()
+);
+CREATE INDEX IF NOT EXISTS cache_entry_expires ON cache_entry (expires_at);
+"""
+
+
+class SQLiteBackend:
+    """
+    以 SQLite 檔案作為共用快取，同一台機器上的多個行程可同時讀寫（WAL 模式，多讀一寫）。
+    每筆寫入為單一 INSERT OR REPLACE 交易，讀取端不會看到寫到一半的資料。
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or _DEFAULT_SQLITE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # 與 price_store 相同：每次操作各自開連線，SQLite 連線不可跨執行緒共用
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> tuple[bytes, float] | None:
+        """回傳 (值, 剩餘秒數)；不存在或已過期時回傳 None。"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT value, expires_at FROM cache_entry WHERE key = ? AND expires_at > ?',
+                               (key, now)).fetchone()
+        return None if row is None else (row[0], row[1] - now)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache_entry (key, value, expires_at) VALUES (?, ?, ?)',
+                         (key, value, time.time() + ttl))
+            # 多個執行緒共用同一個後端物件，計數需加鎖才不會漏算或重複觸發清除
+            with self._writes_lock:
+                self._writes += 1
+                purge = self._writes % _PURGE_EVERY == 0
+            if purge:
+                conn.execute('DELETE FROM cache_entry WHERE expires_at <= ?', (time.time(),))
+
+    def delete_prefix(self, prefix: str) -> None:
+        # 以範圍查詢代替 LIKE，前綴中的 % 或 _ 不會被當成萬用字元
+        with self._connect() as conn:
+            conn.execute('DELETE FROM cache_entry WHERE key >= ? AND key < ?', (prefix, prefix + '\U0010ffff'))
+
+
+class RedisBackend:
+    """Redis 相容伺服器（Redis、Valkey、KeyDB 等）；SET 搭配 PX 過期時間為單一原子操作。"""
+
+    name = 'redis'
+
+    def __init__(self, url: str) -> None:
+        import redis  # 選用套件，只有設定 CACHE_BACKEND=redis 時才需要
+        self._client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self._client.ping()
+
+    def get(self, key: str) -> tuple[bytes, float] | None:
+        pipe = self._client.pipeline()
+        pipe.get(key)
+        pipe.pttl(key)
+        value, pttl = pipe.execute()
+        if value is None or pttl <= 0:
+            return None
+        return value, pttl / 1000
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    def delete_prefix(self, prefix: str) -> None:
+        keys = list(self._client.scan_iter(match=_escape_glob(prefix) + '*', count=500))
+        for i in range(0, len(keys), 500):
+            self._client.delete(*keys[i:i + 500])
+
+
+def _escape_glob(text: str) -> str:
+    return ''.join('\\' + c if c in '*?[]\\' else c for c in text)
+
+
+class SharedCache:
+    """
+    包裝實際後端：鍵統一加上 KEY_PREFIX，後端發生錯誤時印出警告並當作未命中，
+    共用快取故障不會讓頁面失敗，只是退回各行程各自抓取。
+    """
+
+    def __init__(self, backend) -> None:
+        self.backend = backend
+        self.name = backend.name
+
+    @staticmethod
+    def make_key(namespace: str, args: tuple) -> str:
+        return f"{KEY_PREFIX}:{namespace}:{args!r}"
+
+    def get(self, key: str) -> tuple[bytes, float] | None:
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            print(f"警告: 共用快取 ({self.name}) 讀取失敗，改為重新抓取: {type(e).__name__} - {e}")
+            return None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        try:
+            self.backend.set(key, value, ttl)
+        except Exception as e:
+            print(f"警告: 共用快取 ({self.name}) 寫入失敗: {type(e).__name__} - {e}")
+
+    def clear(self, namespace: str) -> None:
+        try:
+            self.backend.delete_prefix(f"{KEY_PREFIX}:{namespace}:")
+        except Exception as e:
+            print(f"警告: 共用快取 ({self.name}) 清除失敗: {type(e).__name__} - {e}")
+
+
+def _build_shared_cache() -> SharedCache | None:
+    kind = os.getenv('CACHE_BACKEND', 'none').strip().lower()
+    url = os.getenv('CACHE_URL') or None
+    try:
+        if kind in ('', 'none', 'memory'):
+            return None
+        if kind == 'sqlite':
+            backend = SQLiteBackend(url)
+        elif kind == 'redis':
+            backend = RedisBackend(url or 'redis://localhost:6379/0')
+        else:
+            print(f"警告: 不支援的 CACHE_BACKEND '{kind}'，只使用行程內快取。")
+            return None
+    except Exception as e:
+        print(f"警告: 無法啟用共用快取 ({kind})，只使用行程內快取: {type(e).__name__} - {e}")
+        return None
+    print(f"使用共用快取後端：{kind}" + (f" ({getattr(backend, 'path', url)})" if kind == 'sqlite' else ''))
+    return SharedCache(backend)
+
+
+_shared: SharedCache | None = None
+_shared_ready = False
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache | None:
+    """取得行程內共用的 SharedCache（依環境變數延遲建立）；未設定共用後端時回傳 None。"""
+    global _shared, _shared_ready
+    if not _shared_ready:
+        with _shared_lock:
+            if not _shared_ready:
+                _shared = _build_shared_cache()
+                _shared_ready = True
+    return _shared
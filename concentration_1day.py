@@ -1,19 +1,24 @@
 # 1日籌碼集中度.py (已修改欄位顯示)
 
 import requests
+
+import html_table
+import http_client
 import pandas as pd
 from io import StringIO
-from bs4 import BeautifulSoup
+
+# 籌碼集中度 1 日排行頁（基準測試會改指向本機的 stub server）
+CONCENTRATION_URL = 'http://asp.peicheng.com.tw/main/report/dream_report/%E7%B1%8C%E7%A2%BC%E9%9B%86%E4%B8%AD%E5%BA%A61%E6%97%A5%E6%8E%92%E8%A1%8C.htm'
 
 def fetch_stock_concentration_data():
     """
     爬取股票籌碼集中度資料並進行數據清理。
-    此版本使用 BeautifulSoup 增強解析的穩定性。
+    以 html_table 單次串流解析取出指定 id 的表格。
     
     Returns:
         pd.DataFrame or None: 清理後的股票集中度資料，或在發生錯誤時返回 None。
     """
-    url = 'http://asp.peicheng.com.tw/main/report/dream_report/%E7%B1%8C%E7%A2%BC%E9%9B%86%E4%B8%AD%E5%BA%A61%E6%97%A5%E6%8E%92%E8%A1%8C.htm'
+    url = CONCENTRATION_URL
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9',
@@ -22,24 +27,19 @@ def fetch_stock_concentration_data():
     }
 
     try:
-        response = requests.get(url, headers=headers, timeout=20)
-        response.raise_for_status()
+        response = http_client.get_with_retry(url, headers=headers, timeout=20)
         response.encoding = 'big5'
 
-        soup = BeautifulSoup(response.text, 'lxml')
-        target_table = soup.select_one(r'#籌碼集中度排行轉網頁\.\(排程\)_3148')
+        df0 = html_table.read_table(response.text, '籌碼集中度排行轉網頁.(排程)_3148')
 
-        if not target_table:
-            print("錯誤：使用 BeautifulSoup 找不到指定的表格 ID。網站結構可能已變更。")
+        if df0 is None:
+            print("錯誤：找不到指定的表格 ID。網站結構可能已變更。")
             dfs = pd.read_html(StringIO(response.text))
-        else:
-            dfs = pd.read_html(StringIO(str(target_table)), flavor='lxml')
-
-        if not dfs:
-            print("錯誤：pandas 無法從 HTML 中解析出任何表格。")
-            return None
+            if not dfs:
+                print("錯誤：pandas 無法從 HTML 中解析出任何表格。")
+                return None
+            df0 = dfs[0]
 
-        df0 = dfs[0]
         df0.columns = df0.columns.get_level_values(0)
         
         header_row_index = -1
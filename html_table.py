@@ -0,0 +1,196 @@
+# html_table.py (共用的 HTML 表格擷取：以 lxml 串流解析找到指定 id 的表格，直接由儲存格文字建立 DataFrame)
+
+import re
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+import instrumentation
+
+# 每次送進解析器的字元數；找到目標表格的結束標籤後即停止，不再解析頁面其餘部分
+FEED_CHUNK_SIZE = 64 * 1024
+
+# 與 pandas.read_html 相同的空白處理與預設缺值字串
+_RE_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+_NA_STRINGS = {'', 'N/A', 'NA', 'n/a', 'NaN', 'nan', '-NaN', '-nan', '#N/A', 'null', 'NULL', 'None', '<NA>'}
+_RE_THOUSANDS = re.compile(r"[+-]?\d{1,3}(,\d{3})+(\.\d+)?")
+_RE_LEADING_ZERO = re.compile(r"0\d+")
+
+
+def _is_hidden(el) -> bool:
+    return 'display:none' in el.get('style', '').replace(' ', '')
+
+
+def _cell_text(el) -> str:
+    """儲存格文字（略過 display:none 的子元素與 <style>），空白處理同 read_html。"""
+    parts = []
+
+    def walk(node):
+        if node.text:
+            parts.append(node.text)
+        for child in node:
+            if isinstance(child.tag, str) and child.tag != 'style' and not _is_hidden(child):
+                walk(child)
+            if child.tail:
+                parts.append(child.tail)
+
+    walk(el)
+    return _RE_WHITESPACE.sub(' ', ''.join(parts).strip())
+
+
+def find_table(html: str, table_id: str):
+    """
+    以 HTMLPullParser 分段解析 html，回傳 id 為 table_id 的表格；找不到時回傳 None。
+    與 CSS 選擇器 #table_id 相同，id 可以在任何元素上：該元素本身是 <table> 時直接回傳，
+    否則回傳其中的第一個 <table>（同「select_one('#id') → read_html(...)[0]」）。
+    目標元素之前已解析完成的元素會立即清空以節省記憶體，表格結束後的內容則完全不解析。
+    """
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+    container = target = None
+    for offset in range(0, len(html), FEED_CHUNK_SIZE):
+        parser.feed(html[offset:offset + FEED_CHUNK_SIZE])
+        for event, el in parser.read_events():
+            if event == 'start':
+                if container is None and el.get('id') == table_id:
+                    container = el
+                if container is not None and target is None and el.tag == 'table':
+                    target = el
+            elif el is target:
+                return target
+            elif el is container:
+                return None  # 指定 id 的元素中沒有表格
+            elif container is None:
+                el.clear(keep_tail=True)
+    parser.close()
+    return target
+
+
+def _section_rows(table) -> tuple[list, list, list]:
+    """依 <thead>/<tbody>/<tfoot> 分段；沒有 <thead> 時，開頭全為 <th> 的列視為標頭（同 read_html）。"""
+    def visible(rows):
+        return [tr for tr in rows if not _is_hidden(tr)]
+
+    header = visible(table.xpath('./thead/tr'))
+    body = visible(table.xpath('./tbody/tr | ./tr'))
+    footer = visible(table.xpath('./tfoot/tr'))
+    if not header:
+        while body and all(cell.tag == 'th' for cell in _cells(body[0])):
+            header.append(body.pop(0))
+    return header, body, footer
+
+
+def _cells(tr) -> list:
+    return [cell for cell in tr.xpath('./td | ./th') if not _is_hidden(cell)]
+
+
+def _expand_spans(rows, remainder=None, flush=False) -> tuple[list[list[str]], list]:
+    """
+    將 colspan/rowspan 展開成完整的格狀資料：跨欄/跨列的儲存格內容複製到其涵蓋的每一格。
+    remainder 為上一段尚未用完的 rowspan (欄位, 文字, 剩餘列數)。
+    """
+    grid = []
+    remainder = remainder or []
+    for tr in rows:
+        texts, next_remainder, index = [], [], 0
+        for cell in _cells(tr):
+            while remainder and remainder[0][0] <= index:
+                prev_i, prev_text, prev_span = remainder.pop(0)
+                texts.append(prev_text)
+                if prev_span > 1:
+                    next_remainder.append((prev_i, prev_text, prev_span - 1))
+                index += 1
+            text = _cell_text(cell)
+            rowspan = int(cell.get('rowspan') or 1)
+            colspan = int(cell.get('colspan') or 1)
+            for _ in range(colspan):
+                texts.append(text)
+                if rowspan > 1:
+                    next_remainder.append((index, text, rowspan - 1))
+                index += 1
+        for prev_i, prev_text, prev_span in remainder:
+            texts.append(prev_text)
+            if prev_span > 1:
+                next_remainder.append((prev_i, prev_text, prev_span - 1))
+        grid.append(texts)
+        remainder = next_remainder
+
+    while flush and remainder:
+        texts, next_remainder = [], []
+        for prev_i, prev_text, prev_span in remainder:
+            texts.append(prev_text)
+            if prev_span > 1:
+                next_remainder.append((prev_i, prev_text, prev_span - 1))
+        grid.append(texts)
+        remainder = next_remainder
+    return grid, remainder
+
+
+def _convert_column(values: list[str]) -> pd.Series:
+    """
+    整欄皆可轉為數字（允許千分位逗號）時轉為數值，否則保留文字。
+    含有前導零的數字（例如股票代碼 0050、00878）視為代碼，整欄保留文字。
+    與 read_html 相同，保留文字的欄位中形如數字的值也去除千分位逗號（'1,050' → '1050'），
+    下游的 pd.to_numeric 篩選才能照常運作。
+    """
+    values = [np.nan if v in _NA_STRINGS else v for v in values]
+    cleaned = [v.replace(',', '') if isinstance(v, str) and _RE_THOUSANDS.fullmatch(v) else v for v in values]
+    present = [v for v in values if isinstance(v, str)]
+    if present and not any(_RE_LEADING_ZERO.fullmatch(v) for v in present):
+        try:
+            return pd.to_numeric(pd.Series(cleaned, dtype=object))
+        except (ValueError, TypeError):
+            pass
+    return pd.Series(cleaned, dtype=object)
+
+
+def _column_index(header: list[list[str]], width: int) -> pd.Index:
+    """以標頭列建立欄位：單列為一般欄位（重複名稱加 .1、.2），多列為 MultiIndex，空白名稱為 Unnamed: i。"""
+    if not header:
+        return pd.RangeIndex(width)
+    if len(header) == 1:
+        names, seen = [], {}
+        for i, name in enumerate(header[0]):
+            name = name or f"Unnamed: {i}"
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            names.append(name)
+        return pd.Index(names)
+    return pd.MultiIndex.from_arrays([
+        [name or f"Unnamed: {i}_level_{level}" for i, name in enumerate(row)]
+        for level, row in enumerate(header)
+    ])
+
+
+def table_to_dataframe(table) -> pd.DataFrame:
+    """將 <table> 元素轉為 DataFrame，標頭判斷、跨欄跨列與缺值處理與 pandas.read_html 一致。"""
+    header_rows, body_rows, footer_rows = _section_rows(table)
+    header, remainder = _expand_spans(header_rows)
+    body, remainder = _expand_spans(body_rows, remainder, flush=not footer_rows)
+    footer, _ = _expand_spans(footer_rows, remainder, flush=True)
+    rows = body + footer
+
+    width = max((len(r) for r in header + rows), default=0)
+    header = [r + [''] * (width - len(r)) for r in header]
+    rows = [r + [''] * (width - len(r)) for r in rows]
+
+    columns = _column_index(header, width)
+    data = {i: _convert_column([r[i] for r in rows]) for i in range(width)}
+    df = pd.DataFrame(data)
+    df.columns = columns
+    return df
+
+
+@instrumentation.timed_function('parse', parser='html_table')
+def read_table(html: str, table_id: str) -> pd.DataFrame | None:
+    """
+    從 HTML 原始碼中取出 id 為 table_id 的表格（或該元素中的第一個表格）並轉為 DataFrame；找不到表格時回傳 None。
+    取代「BeautifulSoup 解析 → str(table) → pd.read_html 再解析一次」的做法，整頁只解析一次。
+    """
+    table = find_table(html, table_id)
+    if table is None:
+        return None
+    return table_to_dataframe(table)
@@ -0,0 +1,107 @@
+# http_client.py (所有爬蟲與 API 呼叫共用的 HTTP 連線池：keep-alive、每主機連線上限、統一逾時)
+
+import asyncio
+import os
+import threading
+import weakref
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import instrumentation
+from retry import DEFAULT_POLICY, RetryPolicy
+
+# 每個主機最多同時開啟的連線數；超過時 pool_block=True 讓執行緒排隊等待，而不是另開一次性連線
+MAX_CONNECTIONS_PER_HOST = int(os.getenv('HTTP_MAX_CONNECTIONS_PER_HOST', '8'))
+# 連線池最多保留的主機數（FinMind、Yahoo、Goodinfo、籌碼、大戶持股等）
+MAX_POOLED_HOSTS = 16
+# (連線逾時, 讀取逾時) 秒；呼叫端只需覆寫讀取逾時
+CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 20
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=MAX_POOLED_HOSTS,
+        pool_maxsize=MAX_CONNECTIONS_PER_HOST,
+        pool_block=True,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Connection': 'keep-alive'})
+    # 共用 session 不保存任何回應的 Set-Cookie，避免不同來源（例如兩組 Goodinfo Cookie）互相污染；
+    # 需要 Cookie 的請求一律由呼叫端在 headers 中明確帶入
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def get_session() -> requests.Session:
+    """取得行程內共用的 requests.Session（延遲建立），同一主機的請求會重用 TCP/TLS 連線。"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def get(url: str, *, params: dict | None = None, headers: dict | None = None,
+        timeout: float = DEFAULT_READ_TIMEOUT, stream: bool = False) -> requests.Response:
+    """
+    透過共用連線池送出 GET 請求。
+    :param timeout: 讀取逾時秒數；連線逾時固定為 CONNECT_TIMEOUT
+    :param stream: True 時只讀取標頭，內容由呼叫端以 iter_content 逐段讀取；
+                   讀完或呼叫 close()（可用 with response:）後連線才會歸還連線池。
+                   計時（http_fetch）此時只涵蓋到收到標頭為止
+    """
+    with instrumentation.timed('http_fetch', host=urlsplit(url).netloc):
+        return get_session().get(url, params=params, headers=headers, timeout=(CONNECT_TIMEOUT, timeout),
+                                 stream=stream)
+
+
+def get_with_retry(url: str, *, params: dict | None = None, headers: dict | None = None,
+                   timeout: float = DEFAULT_READ_TIMEOUT, policy: RetryPolicy | None = None,
+                   stream: bool = False) -> requests.Response:
+    """
+    get() 加上 raise_for_status()，並對逾時、連線錯誤與 5xx 依重試策略自動重試。
+    重試用盡後拋出最後一次的 requests 例外，呼叫端的錯誤處理不需改變。
+    stream=True 時只重試到收到標頭為止，讀取內容途中的錯誤由呼叫端處理。
+    """
+    def _attempt() -> requests.Response:
+        response = get(url, params=params, headers=headers, timeout=timeout, stream=stream)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        return response
+
+    return (policy or DEFAULT_POLICY).call(_attempt, description=urlsplit(url).netloc)
+
+
+# --- asyncio 版本 ---
+# 以工作執行緒執行同步請求，與同步版本共用同一個連線池；
+# 每個事件迴圈各自維護每主機的 Semaphore，協程數量超過連線上限時在協程層級排隊，不佔用執行緒。
+_async_limits: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]' = weakref.WeakKeyDictionary()
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    limits = _async_limits.setdefault(loop, {})
+    host = urlsplit(url).netloc
+    if host not in limits:
+        limits[host] = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+    return limits[host]
+
+
+async def aget(url: str, *, params: dict | None = None, headers: dict | None = None,
+               timeout: float = DEFAULT_READ_TIMEOUT) -> requests.Response:
+    """get() 的 asyncio 版本，可搭配 asyncio.gather 同時送出多個請求。"""
+    async with _host_semaphore(url):
+        return await asyncio.to_thread(get, url, params=params, headers=headers, timeout=timeout)
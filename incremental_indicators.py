@@ -0,0 +1,267 @@
+# incremental_indicators.py (增量指標狀態：保留滾動計算的中間狀態，每新增一根 K 棒以 O(1) 更新所有指標)
+
+import math
+from collections import deque
+
+from stock_analyzer import deviation_signal_scalar, stair_signal_scalar
+
+# 累加和每更新這麼多次就以視窗內容重新加總一次，避免浮點誤差長期累積
+_RESUM_INTERVAL = 1000
+
+
+def _shallow_copy(obj):
+    # 比 copy.copy 少了 __reduce_ex__ 的開銷；盤中模式每根 K 棒都會複製一次狀態
+    other = object.__new__(type(obj))
+    other.__dict__.update(obj.__dict__)
+    return other
+
+
+class RollingMean:
+    """固定視窗的滾動平均（running sum）；視窗未滿或含 NaN 時為 NaN，與 pandas rolling(window).mean() 一致。"""
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.values: deque = deque(maxlen=window)
+        self.total = 0.0
+        self.nan_count = 0
+        self._updates = 0
+
+    def clone(self) -> 'RollingMean':
+        other = _shallow_copy(self)
+        other.values = self.values.copy()
+        return other
+
+    def update(self, x: float) -> float:
+        if len(self.values) == self.window:
+            old = self.values[0]
+            if math.isnan(old):
+                self.nan_count -= 1
+            else:
+                self.total -= old
+        self.values.append(x)
+        if math.isnan(x):
+            self.nan_count += 1
+        else:
+            self.total += x
+
+        self._updates += 1
+        if self._updates % _RESUM_INTERVAL == 0:
+            self.total = math.fsum(v for v in self.values if not math.isnan(v))
+
+        if len(self.values) < self.window or self.nan_count:
+            return math.nan
+        return self.total / self.window
+
+
+class RollingExtreme:
+    """固定視窗的滾動最小值或最大值（單調佇列，每次更新攤銷 O(1)）；視窗未滿或含 NaN 時為 NaN。"""
+
+    def __init__(self, window: int, mode: str) -> None:
+        self.window = window
+        self._better = (lambda a, b: a <= b) if mode == 'min' else (lambda a, b: a >= b)
+        self._candidates: deque = deque()  # (位置, 值)，值單調
+        self._last_nan = -1
+        self._position = -1
+
+    def clone(self) -> 'RollingExtreme':
+        other = _shallow_copy(self)
+        other._candidates = self._candidates.copy()
+        return other
+
+    def update(self, x: float) -> float:
+        self._position += 1
+        if math.isnan(x):
+            self._last_nan = self._position
+        else:
+            while self._candidates and self._better(x, self._candidates[-1][1]):
+                self._candidates.pop()
+            self._candidates.append((self._position, x))
+        while self._candidates and self._candidates[0][0] <= self._position - self.window:
+            self._candidates.popleft()
+
+        if self._position < self.window - 1 or self._last_nan > self._position - self.window:
+            return math.nan
+        return self._candidates[0][1]
+
+
+class EMA:
+    """等同 pandas ewm(span, adjust=False).mean()：從第一個非 NaN 值開始遞迴，遇到 NaN 時沿用前值。"""
+
+    def __init__(self, span: int) -> None:
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = math.nan
+
+    def clone(self) -> 'EMA':
+        return _shallow_copy(self)
+
+    def update(self, x: float) -> float:
+        if math.isnan(self.value):
+            self.value = x
+        elif not math.isnan(x):
+            self.value = self.alpha * x + (1 - self.alpha) * self.value
+        return self.value
+
+
+class WMA:
+    """
+    加權移動平均（視窗由舊到新權重 1..period）。
+    分子以「新分子 = 舊分子 + period × 新值 − 舊視窗總和」遞推，不需重新加權整個視窗。
+    """
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self.weight_sum = period * (period + 1) / 2
+        self.values: deque = deque(maxlen=period)
+        self.numerator = 0.0
+        self.total = 0.0
+        self._updates = 0
+
+    def clone(self) -> 'WMA':
+        other = _shallow_copy(self)
+        other.values = self.values.copy()
+        return other
+
+    def _recompute(self) -> None:
+        self.numerator = math.fsum(w * v for w, v in enumerate(self.values, start=1))
+        self.total = math.fsum(self.values)
+
+    def update(self, x: float) -> float:
+        if len(self.values) < self.period or math.isnan(self.numerator) or math.isnan(x):
+            self.values.append(x)
+            self._recompute()
+        else:
+            old = self.values[0]
+            self.numerator += self.period * x - self.total
+            self.total += x - old
+            self.values.append(x)
+
+        self._updates += 1
+        if self._updates % _RESUM_INTERVAL == 0:
+            self._recompute()
+
+        if len(self.values) < self.period:
+            return math.nan
+        return self.numerator / self.weight_sum
+
+
+_COMPONENTS = ('sma5', 'sma20', 'sma60', 'min_low', 'max_high', 'k_smooth', 'd_smooth',
+               'ema_fast', 'ema_slow', 'ema_signal', 'wma5', 'wma10')
+
+
+class IndicatorState:
+    """
+    單一股票的增量指標狀態，指標定義與 TaiwanStockAnalyzer.calculate_indicators / calculate_signals 相同。
+    update() 每根 K 棒只做常數次運算；replace_last() 可用最新報價覆寫尚未收盤的最後一根 K 棒（盤中更新）。
+
+    覆寫需要套用該根 K 棒之前的狀態（checkpoint），複製狀態的成本比一次 update 高，因此只在需要時保存：
+    from_bars 一定為最後一根歷史 K 棒保存；之後的 update 只在盤中模式（intraday=True）保存，
+    非盤中模式下新增 K 棒後再呼叫 replace_last 會拋出 ValueError。
+    """
+
+    def __init__(self, intraday: bool = False) -> None:
+        self.intraday = intraday
+        self.sma5, self.sma20, self.sma60 = RollingMean(5), RollingMean(20), RollingMean(60)
+        self.min_low, self.max_high = RollingExtreme(9, 'min'), RollingExtreme(9, 'max')
+        self.k_smooth, self.d_smooth = RollingMean(3), RollingMean(3)
+        self.ema_fast, self.ema_slow, self.ema_signal = EMA(12), EMA(26), EMA(9)
+        self.wma5, self.wma10 = WMA(5), WMA(10)
+        self.recent_volumes: deque = deque(maxlen=6)
+        self.last_valid = {'k': math.nan, 'd': math.nan, 'I_value': math.nan}
+        self.latest: dict = {}
+        self.bars = 0
+        self._checkpoint: 'IndicatorState | None' = None
+
+    @classmethod
+    def from_bars(cls, high, low, close, volume, intraday: bool = False) -> 'IndicatorState':
+        """以既有的歷史 K 棒建立狀態（最後一根一定保留 checkpoint，當日 K 棒可直接以 replace_last 覆寫）。"""
+        state = cls(intraday)
+        bars = list(zip(high, low, close, volume))
+        for h, l, c, v in bars[:-1]:
+            state._apply(float(h), float(l), float(c), float(v))
+        if bars:
+            state._checkpoint = state.clone()
+            state._apply(*map(float, bars[-1]))
+        return state
+
+    def update(self, high: float, low: float, close: float, volume: float) -> dict:
+        """加入一根新的 K 棒，回傳該根 K 棒的所有指標值（鍵值與 TaiwanStockAnalyzer.indicators 相同）。"""
+        self._checkpoint = self.clone() if self.intraday else None
+        return self._apply(float(high), float(low), float(close), float(volume))
+
+    def replace_last(self, high: float, low: float, close: float, volume: float) -> dict:
+        """以新的報價取代最後一根 K 棒（同一交易日盤中多次更新時使用）。"""
+        checkpoint = self._checkpoint
+        if checkpoint is None:
+            raise ValueError("最後一根 K 棒沒有保存 checkpoint（尚未加入 K 棒，或非盤中模式下新增），無法取代；"
+                             "盤中更新請以 intraday=True 建立狀態。")
+        self.__dict__.update(checkpoint.__dict__)
+        self._checkpoint = checkpoint.clone()  # 同一根可能再被覆寫，保留一份未套用的 checkpoint
+        return self._apply(float(high), float(low), float(close), float(volume))
+
+    def clone(self) -> 'IndicatorState':
+        """複製目前狀態（各元件只複製視窗內容，不含上一個 checkpoint），成本與視窗長度成正比而非歷史長度。"""
+        other = _shallow_copy(self)
+        for name in _COMPONENTS:
+            setattr(other, name, getattr(self, name).clone())
+        other.recent_volumes = self.recent_volumes.copy()
+        other.last_valid = dict(self.last_valid)
+        other._checkpoint = None
+        return other
+
+    def _apply(self, high: float, low: float, close: float, volume: float) -> dict:
+        ind = {
+            'sma5': self.sma5.update(close),
+            'sma20': self.sma20.update(close),
+            'sma60': self.sma60.update(close),
+        }
+
+        min_low, max_high = self.min_low.update(low), self.max_high.update(high)
+        denom = max_high - min_low
+        raw_k = 100 * (close - min_low) / denom if denom and not math.isnan(denom) else math.nan  # 無波動時不除以零
+        ind['k'] = self.k_smooth.update(raw_k)
+        ind['d'] = self.d_smooth.update(ind['k'])
+
+        ind['dev_5_20'] = _pct(ind['sma5'], ind['sma20'])
+        ind['dev_20_60'] = _pct(ind['sma20'], ind['sma60'])
+        ind['dev_5_60'] = _pct(ind['sma5'], ind['sma60'])
+        ind['dev_1_20'] = _pct(close, ind['sma20'])
+
+        ind['macd'] = self.ema_fast.update(close) - self.ema_slow.update(close)
+        ind['macd_signal'] = self.ema_signal.update(ind['macd'])
+        ind['macd_hist'] = ind['macd'] - ind['macd_signal']
+        ind['wma5'] = self.wma5.update(close)
+        ind['wma10'] = self.wma10.update(close)
+
+        ind['I_value'] = stair_signal_scalar(ind['dev_5_20'], ind['dev_20_60'], ind['dev_5_60'])
+        ind['J_value'] = deviation_signal_scalar(ind['dev_1_20'])
+        ind['K_value'] = 3 if ind['dev_5_60'] >= 0 else -3
+        ind['L_value'] = 100.0 if ind['k'] >= 80 else 0.0 if ind['k'] <= 20 else math.nan
+
+        self.recent_volumes.append(volume)
+        for key in self.last_valid:
+            if not math.isnan(ind[key]):
+                self.last_valid[key] = ind[key]
+        self.bars += 1
+        self.latest = ind
+        return ind
+
+    def snapshot(self) -> dict:
+        """最新的 K、D、I 值與前 5 日均量，格式同 analyze_stock 回傳的 indicators（無有效值時為 None）。"""
+        previous = [v for v in list(self.recent_volumes)[:-1] if not math.isnan(v)]
+        return {
+            'k': _or_none(self.last_valid['k']),
+            'd': _or_none(self.last_valid['d']),
+            'i_value': _or_none(self.last_valid['I_value']),
+            'avg_vol_5': sum(previous) / len(previous) if previous else math.nan,
+        }
+
+
+def _pct(a: float, b: float) -> float:
+    """(a - b) / b × 100；任一為 NaN 或 b 為 0 時為 NaN。"""
+    if math.isnan(a) or math.isnan(b) or b == 0:
+        return math.nan
+    return (a - b) / b * 100
+
+
+def _or_none(x: float) -> float | None:
+    return None if math.isnan(x) else float(x)
@@ -0,0 +1,168 @@
+# instrumentation.py (輕量效能量測：各階段計時器與計數器，供側邊欄診斷面板顯示並可匯出 Prometheus 文字格式)
+#
+# 用法：
+#     with timed('http_fetch', host='tw.stock.yahoo.com'):
+#         ...
+#     count('cache', result='hit', cache='cached_analyze_stock')
+# 所有數據存在行程內的模組層級登錄表（與 swr_cache 相同，Streamlit 重跑不會清空），多執行緒安全。
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# Prometheus 指標名稱前綴
+METRIC_PREFIX = 'tw_stock'
+
+
+@dataclass
+class _TimerStat:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    errors: int = 0
+
+
+# 鍵為 (名稱, ((標籤, 值), ...))，標籤依名稱排序，相同標籤組合不論傳入順序都對應同一筆
+_timers: dict[tuple, _TimerStat] = {}
+_counters: dict[tuple, float] = {}
+_lock = threading.Lock()
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(stage: str, seconds: float, error: bool = False, **labels) -> None:
+    """記錄一次階段耗時（秒）；無法用 with 包住的程式碼可自行量測後呼叫。"""
+    key = _key(stage, labels)
+    with _lock:
+        stat = _timers.get(key)
+        if stat is None:
+            stat = _timers[key] = _TimerStat()
+        stat.count += 1
+        stat.total += seconds
+        stat.max = max(stat.max, seconds)
+        if error:
+            stat.errors += 1
+
+
+@contextmanager
+def timed(stage: str, **labels):
+    """計時區塊：with timed('parse', source='yahoo'): ...；區塊拋出例外時同樣計時並記為錯誤。"""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start, error, **labels)
+
+
+def timed_function(stage: str, **labels):
+    """裝飾器版本的 timed()。"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    """累加計數器，例如 count('cache', result='miss', cache='cached_plot_revenue')。"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def snapshot() -> tuple[list[dict], list[dict]]:
+    """
+    回傳目前的 (計時器列表, 計數器列表)，可直接轉成 DataFrame。
+    計時器欄位：stage、labels、count、total_s、avg_ms、max_ms、errors；計數器欄位：name、labels、value。
+    """
+    with _lock:
+        timers = [(k, _TimerStat(**vars(s))) for k, s in _timers.items()]
+        counters = list(_counters.items())
+
+    timer_rows = [{
+        'stage': name,
+        'labels': _format_labels(labels),
+        'count': stat.count,
+        'total_s': round(stat.total, 3),
+        'avg_ms': round(stat.total / stat.count * 1000, 2) if stat.count else 0.0,
+        'max_ms': round(stat.max * 1000, 2),
+        'errors': stat.errors,
+    } for (name, labels), stat in timers]
+    timer_rows.sort(key=lambda r: r['total_s'], reverse=True)
+
+    counter_rows = [{'name': name, 'labels': _format_labels(labels), 'value': value}
+                    for (name, labels), value in counters]
+    counter_rows.sort(key=lambda r: (r['name'], r['labels']))
+    return timer_rows, counter_rows
+
+
+def to_prometheus() -> str:
+    """
+    以 Prometheus 文字格式匯出：
+    - 計時器 → <prefix>_<stage>_seconds summary（_count、_sum），另有 _seconds_max 與 _errors_total
+    - 計數器 → <prefix>_<name>_total counter
+    """
+    with _lock:
+        timers = sorted(((k, _TimerStat(**vars(s))) for k, s in _timers.items()), key=lambda item: item[0])
+        counters = sorted(_counters.items())
+
+    lines: list[str] = []
+    by_stage: dict[str, list] = {}
+    for (name, labels), stat in timers:
+        by_stage.setdefault(name, []).append((labels, stat))
+    for stage, entries in by_stage.items():
+        base = f"{METRIC_PREFIX}_{_metric_name(stage)}"
+        lines.append(f"# HELP {base}_seconds Time spent in stage '{stage}'.")
+        lines.append(f"# TYPE {base}_seconds summary")
+        for labels, stat in entries:
+            lines.append(f"{base}_seconds_count{_prom_labels(labels)} {stat.count}")
+            lines.append(f"{base}_seconds_sum{_prom_labels(labels)} {stat.total:.6f}")
+        lines.append(f"# TYPE {base}_seconds_max gauge")
+        for labels, stat in entries:
+            lines.append(f"{base}_seconds_max{_prom_labels(labels)} {stat.max:.6f}")
+        lines.append(f"# TYPE {base}_errors_total counter")
+        for labels, stat in entries:
+            lines.append(f"{base}_errors_total{_prom_labels(labels)} {stat.errors}")
+
+    by_name: dict[str, list] = {}
+    for (name, labels), value in counters:
+        by_name.setdefault(name, []).append((labels, value))
+    for name, entries in by_name.items():
+        base = f"{METRIC_PREFIX}_{_metric_name(name)}_total"
+        lines.append(f"# TYPE {base} counter")
+        for labels, value in entries:
+            lines.append(f"{base}{_prom_labels(labels)} {value:g}")
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def reset() -> None:
+    """清除所有計時器與計數器。"""
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def _format_labels(labels: tuple) -> str:
+    return ', '.join(f"{k}={v}" for k, v in labels)
+
+
+def _metric_name(name: str) -> str:
+    # Prometheus 指標名稱只允許 [a-zA-Z0-9_:]
+    return ''.join(c if c.isascii() and (c.isalnum() or c == '_') else '_' for c in name)
+
+
+def _prom_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{_metric_name(k)}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
@@ -0,0 +1,235 @@
+# kernels.py (滾動運算核心：均線、最小/最大值、WMA 與 KD 的融合計算；有安裝 numba 時 JIT 編譯，否則使用 NumPy 視窗運算)
+#
+# 所有函式都接受 1-D（單檔時間序列）或 2-D（日期×股票，沿 axis 0 滾動）的輸入，回傳相同形狀的 float64 陣列。
+# 視窗未滿或視窗內含 NaN 時結果為 NaN，與 pandas rolling(window) 的預設行為一致。
+
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from numba import njit
+    # 設定 DISABLE_NUMBA_KERNELS=1 可強制使用 NumPy 版本（例如比對結果或排查問題時）
+    HAS_NUMBA = os.getenv('DISABLE_NUMBA_KERNELS') != '1'
+except ImportError:
+    HAS_NUMBA = False
+
+
+def _as_2d(x) -> tuple[np.ndarray, bool]:
+    arr = np.ascontiguousarray(x, dtype=np.float64)
+    if arr.ndim == 1:
+        return arr.reshape(-1, 1), True
+    return arr, False
+
+
+def _restore(out: np.ndarray, was_1d: bool) -> np.ndarray:
+    return out.ravel() if was_1d else out
+
+
+# numba 版 WMA 以遞推計算分子，每隔這麼多筆以完整視窗重新加權一次
+_WMA_REANCHOR = 64
+
+
+# --- NumPy 版本 ---
+def _np_rolling(x: np.ndarray, window: int, reducer) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if len(x) >= window:
+        out[window - 1:] = reducer(sliding_window_view(x, window, axis=0), axis=-1)
+    return out
+
+
+def _np_wma(x: np.ndarray, period: int) -> np.ndarray:
+    # 視窗由舊到新對應權重 1..period，最新的權重最大
+    weights = np.arange(1, period + 1, dtype=float)
+    out = np.full(x.shape, np.nan)
+    if len(x) >= period:
+        out[period - 1:] = sliding_window_view(x, period, axis=0) @ weights / weights.sum()
+    return out
+
+
+def _np_stochastic(high, low, close, k_period, k_slowing, d_period):
+    min_low = _np_rolling(low, k_period, np.min)
+    max_high = _np_rolling(high, k_period, np.max)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        denom = np.where(max_high - min_low == 0, np.nan, max_high - min_low)  # 避免停板/無波動時除以零
+        raw_k = 100 * (close - min_low) / denom
+    k = _np_rolling(raw_k, k_slowing, np.mean)
+    d = _np_rolling(k, d_period, np.mean)
+    return k, d
+
+
+# --- numba 版本：輸入為 (股票, 時間) 的連續陣列，逐檔單次走訪、記憶體連續存取，只配置輸出陣列與固定大小的暫存 ---
+if HAS_NUMBA:
+    @njit(cache=True)
+    def _nb_rolling_mean(x, window):
+        N, T = x.shape
+        out = np.full((N, T), np.nan)
+        for j in range(N):
+            total = 0.0
+            nan_count = 0
+            for t in range(T):
+                v = x[j, t]
+                if np.isnan(v):
+                    nan_count += 1
+                else:
+                    total += v
+                if t >= window:
+                    old = x[j, t - window]
+                    if np.isnan(old):
+                        nan_count -= 1
+                    else:
+                        total -= old
+                if t >= window - 1 and nan_count == 0:
+                    out[j, t] = total / window
+        return out
+
+    @njit(cache=True)
+    def _nb_rolling_extreme(x, window, is_max):
+        # 指標使用的視窗都很短（KD 為 9 日），直接掃描視窗比單調佇列的分支少、實測較快
+        N, T = x.shape
+        out = np.full((N, T), np.nan)
+        for j in range(N):
+            last_nan = -1
+            for t in range(T):
+                if np.isnan(x[j, t]):
+                    last_nan = t
+                if t < window - 1 or last_nan > t - window:
+                    continue
+                best = x[j, t]
+                for i in range(t - window + 1, t):
+                    v = x[j, i]
+                    if (v > best) if is_max else (v < best):
+                        best = v
+                out[j, t] = best
+        return out
+
+    @njit(cache=True)
+    def _nb_wma(x, period):
+        # 分子遞推：新分子 = 舊分子 + period × 新值 − 舊視窗總和；視窗含 NaN 後重新起算
+        N, T = x.shape
+        out = np.full((N, T), np.nan)
+        weight_sum = period * (period + 1) / 2.0
+        for j in range(N):
+            last_nan = -1
+            numerator = 0.0
+            total = 0.0
+            for t in range(T):
+                v = x[j, t]
+                if np.isnan(v):
+                    last_nan = t
+                    continue
+                if last_nan >= t - period or t % _WMA_REANCHOR == 0:
+                    # 視窗剛離開 NaN 或尚未填滿時直接加權；另每隔固定筆數重新加權一次，避免遞推的浮點誤差累積
+                    numerator = 0.0
+                    total = 0.0
+                    start = max(last_nan + 1, t - period + 1)
+                    for i in range(start, t + 1):
+                        numerator += (i - (t - period)) * x[j, i]
+                        total += x[j, i]
+                else:
+                    numerator += period * v - total
+                    total += v - x[j, t - period]
+                if t >= period - 1 and last_nan <= t - period:
+                    out[j, t] = numerator / weight_sum
+        return out
+
+    @njit(cache=True)
+    def _nb_stochastic(high, low, close, k_period, k_slowing, d_period):
+        # 融合計算：視窗最高/最低 → RSV → K（RSV 的 k_slowing 日均）→ D（K 的 d_period 日均），
+        # 每檔只走訪一次時間軸，除了 K、D 輸出外只配置長度 T 的暫存
+        N, T = close.shape
+        k = np.full((N, T), np.nan)
+        d = np.full((N, T), np.nan)
+        raw_k = np.empty(T)
+        for j in range(N):
+            last_nan = -1
+            k_total = 0.0
+            k_nan = 0
+            d_total = 0.0
+            d_nan = 0
+            for t in range(T):
+                if np.isnan(low[j, t]) or np.isnan(high[j, t]):
+                    last_nan = t
+
+                raw_k[t] = np.nan
+                if t >= k_period - 1 and last_nan <= t - k_period:
+                    min_low = low[j, t]
+                    max_high = high[j, t]
+                    for i in range(t - k_period + 1, t):
+                        if low[j, i] < min_low:
+                            min_low = low[j, i]
+                        if high[j, i] > max_high:
+                            max_high = high[j, i]
+                    denom = max_high - min_low
+                    if denom != 0:  # 避免停板/無波動時除以零
+                        raw_k[t] = 100 * (close[j, t] - min_low) / denom
+
+                if np.isnan(raw_k[t]):
+                    k_nan += 1
+                else:
+                    k_total += raw_k[t]
+                if t >= k_slowing:
+                    if np.isnan(raw_k[t - k_slowing]):
+                        k_nan -= 1
+                    else:
+                        k_total -= raw_k[t - k_slowing]
+                if t >= k_slowing - 1 and k_nan == 0:
+                    k[j, t] = k_total / k_slowing
+
+                kv = k[j, t]
+                if np.isnan(kv):
+                    d_nan += 1
+                else:
+                    d_total += kv
+                if t >= d_period:
+                    old = k[j, t - d_period]
+                    if np.isnan(old):
+                        d_nan -= 1
+                    else:
+                        d_total -= old
+                if t >= d_period - 1 and d_nan == 0:
+                    d[j, t] = d_total / d_period
+        return k, d
+
+
+# --- 對外介面 ---
+def _series_major(arr: np.ndarray) -> np.ndarray:
+    # numba 版本逐檔走訪時間軸，轉成 (股票, 時間) 的連續陣列讓每檔資料在記憶體中相鄰
+    return np.ascontiguousarray(arr.T)
+
+
+def rolling_mean(x, window: int) -> np.ndarray:
+    arr, was_1d = _as_2d(x)
+    out = _nb_rolling_mean(_series_major(arr), window).T if HAS_NUMBA else _np_rolling(arr, window, np.mean)
+    return _restore(out, was_1d)
+
+
+def rolling_min(x, window: int) -> np.ndarray:
+    arr, was_1d = _as_2d(x)
+    out = _nb_rolling_extreme(_series_major(arr), window, False).T if HAS_NUMBA else _np_rolling(arr, window, np.min)
+    return _restore(out, was_1d)
+
+
+def rolling_max(x, window: int) -> np.ndarray:
+    arr, was_1d = _as_2d(x)
+    out = _nb_rolling_extreme(_series_major(arr), window, True).T if HAS_NUMBA else _np_rolling(arr, window, np.max)
+    return _restore(out, was_1d)
+
+
+def wma(x, period: int) -> np.ndarray:
+    """加權移動平均，視窗由舊到新權重 1..period。"""
+    arr, was_1d = _as_2d(x)
+    out = _nb_wma(_series_major(arr), period).T if HAS_NUMBA else _np_wma(arr, period)
+    return _restore(out, was_1d)
+
+
+def stochastic(high, low, close, k_period: int = 9, k_slowing: int = 3, d_period: int = 3) -> tuple[np.ndarray, np.ndarray]:
+    """KD 指標：RSV 以 k_period 日高低區間計算，K 為 RSV 的 k_slowing 日均，D 為 K 的 d_period 日均。"""
+    (h, was_1d), (l, _), (c, _) = _as_2d(high), _as_2d(low), _as_2d(close)
+    if HAS_NUMBA:
+        k, d = _nb_stochastic(_series_major(h), _series_major(l), _series_major(c), k_period, k_slowing, d_period)
+        k, d = k.T, d.T
+    else:
+        k, d = _np_stochastic(h, l, c, k_period, k_slowing, d_period)
+    return _restore(k, was_1d), _restore(d, was_1d)
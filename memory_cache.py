@@ -0,0 +1,219 @@
+# memory_cache.py (有記憶體上限的行程內快取：依序列化後大小計算用量，超過上限時以 LRU 逐出，並統計命中/未命中/逐出次數)
+#
+# 取代個股分析與圖表的 st.cache_data：st.cache_data 只有 TTL，瀏覽的股票越多記憶體就越大，
+# 長時間執行後容器可能因記憶體不足被終止。這裡所有使用 @bounded_cache 的函式共用同一個位元組預算。
+
+import functools
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import instrumentation
+from cache_backend import get_shared_cache
+from singleflight import SingleFlight
+
+# 所有 bounded_cache 函式共用的記憶體上限（MB），可用環境變數 ANALYSIS_CACHE_MAX_MB 調整
+DEFAULT_MAX_MB = 256
+# 單筆超過上限的這個比例就不快取，避免一筆大資料把其他項目全部擠掉
+MAX_ENTRY_FRACTION = 0.25
+# 每筆項目的固定開銷估計（鍵、OrderedDict 節點、_Entry 物件），加在序列化大小之外
+ENTRY_OVERHEAD_BYTES = 400
+
+
+@dataclass
+class _Entry:
+    blob: bytes
+    size: int
+    expires_at: float           # time.monotonic()
+
+
+class MemoryCache:
+    """
+    以位元組計算容量的 LRU 快取，多執行緒安全。
+    值以 pickle 保存：用量即序列化後的長度，取出時得到新的副本（與 st.cache_data 相同，呼叫端修改結果不會污染快取）。
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0
+
+    def get(self, key: tuple):
+        """回傳 (是否命中, 值)；過期項目視為未命中並移除。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            blob = entry.blob
+        return True, pickle.loads(blob)
+
+    def set(self, key: tuple, value, ttl: float) -> bool:
+        """寫入一筆資料；超過單筆上限時不快取並回傳 False。"""
+        return self.set_blob(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+
+    def set_blob(self, key: tuple, blob: bytes, ttl: float) -> bool:
+        """寫入已序列化的資料（例如從共用快取取回的內容）。"""
+        size = len(blob) + ENTRY_OVERHEAD_BYTES
+        with self._lock:
+            if size > self.max_bytes * MAX_ENTRY_FRACTION:
+                self.rejected += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(blob, size, time.monotonic() + ttl)
+            self.current_bytes += size
+            self._evict()
+        return True
+
+    def clear(self, name: str | None = None) -> None:
+        """清除全部項目，或只清除某個函式（鍵的第一個元素）的項目。"""
+        with self._lock:
+            for key in [k for k in self._entries if name is None or k[0] == name]:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'rejected': self.rejected,
+            }
+
+    def _remove(self, key: tuple) -> _Entry:
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+        return entry
+
+    def _evict(self) -> None:
+        if self.current_bytes <= self.max_bytes:
+            return
+        # 先清掉已過期的項目，仍超過上限時再從最久未使用的開始逐出
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+            self._remove(key)
+            self.expirations += 1
+        while self.current_bytes > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self.current_bytes -= entry.size
+            self.evictions += 1
+            instrumentation.count('cache', cache=key[0].rsplit('.', 1)[-1], result='evicted')
+
+
+def _max_bytes_from_env() -> int:
+    try:
+        max_mb = float(os.getenv('ANALYSIS_CACHE_MAX_MB', DEFAULT_MAX_MB))
+    except ValueError:
+        print(f"警告: ANALYSIS_CACHE_MAX_MB 不是有效數字，改用預設值 {DEFAULT_MAX_MB} MB。")
+        max_mb = DEFAULT_MAX_MB
+    return int(max_mb * 1024 * 1024)
+
+
+# 同一組參數同時有多個呼叫者未命中時（例如兩個使用者同時打開同一檔股票），只計算一次
+_flights = SingleFlight('bounded_cache')
+
+# 行程內共用的快取：Streamlit 每次重跑都會重新定義被裝飾的函式，資料必須存在模組層級才能延續
+_cache: MemoryCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_memory_cache() -> MemoryCache:
+    """取得共用的 MemoryCache（延遲建立，上限取自 ANALYSIS_CACHE_MAX_MB）。"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = MemoryCache(_max_bytes_from_env())
+    return _cache
+
+
+def bounded_cache(ttl: int):
+    """
+    裝飾器：@bounded_cache(ttl=3600) 以共用的記憶體預算快取函式結果，用法與 st.cache_data 相同。
+    函式拋出例外時不寫入快取（analysis_cache 的 _UncachedResult 依賴此行為），並提供 .clear() 與 .prime()。
+    有設定共用快取後端（cache_backend）時作為第二層：行程內未命中先查共用快取，
+    重新計算的結果也寫回共用快取，讓其他副本與重新啟動後的行程直接取用。
+    每次呼叫記錄一次 cache 計數（hit、shared_hit、miss，或等待並發呼叫結果的 coalesced），供效能診斷顯示。
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_memory_cache()
+            call_args = (args, tuple(sorted(kwargs.items())))
+            key = (name,) + call_args
+            hit, value = cache.get(key)
+            if hit:
+                instrumentation.count('cache', cache=func.__name__, result='hit')
+                return value
+
+            # 查詢結果在實際查詢的地方記錄：只有領頭的呼叫者會執行 load()，其餘並發呼叫者共用其結果（coalesced）
+            outcome = 'coalesced'
+
+            def load() -> bytes:
+                nonlocal outcome
+                shared = get_shared_cache()
+                # 共用快取的鍵不含模組名稱：Streamlit 執行的主程式模組名稱為 __main__，與單獨匯入時不同
+                shared_key = shared.make_key(func.__qualname__, call_args) if shared else None
+                found = shared.get(shared_key) if shared else None
+                if found is not None:
+                    blob, remaining = found
+                    cache.set_blob(key, blob, min(remaining, ttl))
+                    outcome = 'shared_hit'
+                    return blob
+
+                outcome = 'miss'
+                blob = pickle.dumps(func(*args, **kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+                cache.set_blob(key, blob, ttl)
+                if shared:
+                    shared.set(shared_key, blob, ttl)
+                return blob
+
+            try:
+                # 每個呼叫者各自反序列化，拿到互不影響的副本
+                return pickle.loads(_flights.do(key, load))
+            finally:
+                instrumentation.count('cache', cache=func.__name__, result=outcome)
+
+        def prime(value, *args, **kwargs) -> None:
+            """直接寫入一筆結果（例如批次計算得到的值），之後以相同參數呼叫時命中。"""
+            call_args = (args, tuple(sorted(kwargs.items())))
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            get_memory_cache().set_blob((name,) + call_args, blob, ttl)
+            shared = get_shared_cache()
+            if shared:
+                shared.set(shared.make_key(func.__qualname__, call_args), blob, ttl)
+
+        def clear() -> None:
+            get_memory_cache().clear(name)
+            shared = get_shared_cache()
+            if shared:
+                shared.clear(func.__qualname__)
+
+        wrapper.prime = prime
+        wrapper.clear = clear
+        return wrapper
+    return decorator
@@ -2,10 +2,12 @@ import os
 import sys
 import requests
 import pandas as pd
-from io import StringIO
 import time
 import random
 
+import html_table
+import http_client
+
 # Windows CP950 不支援 emoji，強制 stdout 使用 UTF-8
 if hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
@@ -16,15 +18,11 @@ def fetch_stock_data(url: str, headers: dict, table_id: str) -> pd.DataFrame | N
     """
     print(f"🔄 正在嘗試連線到目標網址...")
     
-    session = requests.Session()
-    session.headers.update(headers)
-    
     try:
         # 加入隨機延遲，模擬人類行為
         time.sleep(random.uniform(1, 2))
         
-        response = session.get(url, timeout=20)
-        response.raise_for_status()
+        response = http_client.get_with_retry(url, headers=headers, timeout=20)
         response.encoding = 'utf-8'
         html_content = response.text
         
@@ -36,18 +34,11 @@ def fetch_stock_data(url: str, headers: dict, table_id: str) -> pd.DataFrame | N
         print("✅ 連線成功，正在解析表格...")
 
         # 解析資料
-        tables = pd.read_html(
-            StringIO(html_content), 
-            flavor='lxml', 
-            attrs={'id': table_id} 
-        )
+        df = html_table.read_table(html_content, table_id)
         
-        if not tables:
+        if df is None:
             print(f"❌ 錯誤：找不到 ID 為 '{table_id}' 的表格。")
             return None
-
-        # 取得 DataFrame
-        df = tables[0]
         
         print(f"🎉 成功解析資料！原始列數: {len(df)}。")
         return df
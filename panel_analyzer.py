@@ -0,0 +1,159 @@
+# panel_analyzer.py (多股票向量化指標引擎：以 日期×股票 的二維陣列一次算完所有股票的指標)
+
+import warnings
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+import kernels
+from price_store import get_price_store
+from stock_analyzer import PRICE_COLUMNS, deviation_signal, stair_signal
+
+
+# --- 面板建構 ---
+def build_price_panel(frames: dict[str, pd.DataFrame]) -> dict:
+    """
+    將各股日線資料組成 日期×股票 的二維陣列。
+    指標只依賴 K 棒的先後順序（與 TaiwanStockAnalyzer 逐檔計算相同），
+    因此以「最後一根 K 棒」靠右對齊，資料較短的股票在前方補 NaN。
+    :return: {'stock_ids': [...], 'dates': 各股最後交易日, 'open'/'high'/'low'/'close'/'volume': (T, N) 陣列}
+    """
+    stock_ids = [s for s, df in frames.items() if not df.empty]
+    length = max((len(frames[s]) for s in stock_ids), default=0)
+    panel = {'stock_ids': stock_ids, 'dates': [frames[s].index[-1] for s in stock_ids]}
+
+    for col in PRICE_COLUMNS:
+        arr = np.full((length, len(stock_ids)), np.nan)
+        for j, stock_id in enumerate(stock_ids):
+            values = frames[stock_id][col].to_numpy(dtype=float)
+            arr[length - len(values):, j] = values
+        panel[col.lower()] = arr
+    return panel
+
+
+# --- 沿時間軸 (axis 0) 的指數移動平均；均線、KD、WMA 等滾動運算見 kernels ---
+def _ewm(x: np.ndarray, span: int) -> np.ndarray:
+    """
+    等同 pandas ewm(span, adjust=False).mean()：各欄從第一個非 NaN 值開始遞迴。
+    迴圈只走時間軸，每一步同時更新所有股票。
+    """
+    alpha = 2.0 / (span + 1.0)
+    out = np.empty(x.shape)
+    prev = np.full(x.shape[1:], np.nan)
+    for t in range(len(x)):
+        cur = x[t]
+        prev = np.where(np.isnan(prev), cur, np.where(np.isnan(cur), prev, alpha * cur + (1 - alpha) * prev))
+        out[t] = prev
+    return out
+
+
+# --- 指標計算 ---
+@instrumentation.timed_function('indicators', engine='panel')
+def calculate_panel_indicators(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> dict:
+    """
+    一次計算面板中所有股票的技術指標與 I/J/K/L 訊號。
+    回傳的鍵值與 TaiwanStockAnalyzer.indicators 相同，每個值都是 (T, N) 陣列。
+    """
+    ind = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ind['sma5'] = kernels.rolling_mean(close, 5)
+        ind['sma20'] = kernels.rolling_mean(close, 20)
+        ind['sma60'] = kernels.rolling_mean(close, 60)
+        ind['k'], ind['d'] = kernels.stochastic(high, low, close)
+
+        ind['dev_5_20'] = (ind['sma5'] - ind['sma20']) / ind['sma20'] * 100
+        ind['dev_20_60'] = (ind['sma20'] - ind['sma60']) / ind['sma60'] * 100
+        ind['dev_5_60'] = (ind['sma5'] - ind['sma60']) / ind['sma60'] * 100
+        ind['dev_1_20'] = (close - ind['sma20']) / ind['sma20'] * 100
+
+        ema_fast = _ewm(close, 12)
+        ema_slow = _ewm(close, 26)
+        ind['macd'] = ema_fast - ema_slow
+        ind['macd_signal'] = _ewm(ind['macd'], 9)
+        ind['macd_hist'] = ind['macd'] - ind['macd_signal']
+
+        ind['wma5'] = kernels.wma(close, 5)
+        ind['wma10'] = kernels.wma(close, 10)
+
+        ind['I_value'] = stair_signal(ind['dev_5_20'], ind['dev_20_60'], ind['dev_5_60'])
+        ind['J_value'] = deviation_signal(ind['dev_1_20'])
+        ind['K_value'] = np.where(ind['dev_5_60'] >= 0, 3, -3)
+        ind['L_value'] = np.where(ind['k'] >= 80, 100, np.where(ind['k'] <= 20, 0, np.nan))
+    return ind
+
+
+def _last_valid_columns(arr: np.ndarray) -> np.ndarray:
+    """每一欄最後一個非 NaN 值；整欄皆為 NaN 時為 NaN（對應 stock_analyzer._last_valid）。"""
+    arr = np.asarray(arr, dtype=float)
+    valid = ~np.isnan(arr)
+    if arr.size == 0:
+        return np.full(arr.shape[1:], np.nan)
+    last_idx = len(arr) - 1 - np.argmax(valid[::-1], axis=0)
+    values = arr[last_idx, np.arange(arr.shape[1])]
+    return np.where(valid.any(axis=0), values, np.nan)
+
+
+def panel_snapshot(panel: dict, indicators: dict) -> pd.DataFrame:
+    """
+    取出每檔股票最新的 K、D、I 值與前 5 日均量，欄位名稱與 analyze_stock 回傳的 indicators 相同。
+    bars 為該股票的 K 棒數，chart_bars 為季線暖機後的 K 棒數，
+    chart_ready 表示其是否至少有 20 筆（可繪製技術分析圖，對應 TaiwanStockAnalyzer.check_chart_data）。
+    """
+    volume = panel['volume']
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)  # 全為 NaN 的欄位 nanmean 會警告
+        avg_vol_5 = np.nanmean(volume[-6:-1], axis=0) if len(volume) > 1 else np.full(volume.shape[1], np.nan)
+
+    chart_bars = (~np.isnan(indicators['sma60'])).sum(axis=0)
+    return pd.DataFrame({
+        'k': _last_valid_columns(indicators['k']),
+        'd': _last_valid_columns(indicators['d']),
+        'i_value': _last_valid_columns(indicators['I_value']),
+        'avg_vol_5': avg_vol_5,
+        'bars': (~np.isnan(panel['close'])).sum(axis=0),
+        'chart_bars': chart_bars,
+        'chart_ready': chart_bars >= 20,
+        'last_date': panel['dates'],
+    }, index=pd.Index(panel['stock_ids'], name='stock_id'))
+
+
+def analyze_panel(stock_ids: list[str], days: int = 300) -> pd.DataFrame:
+    """
+    從本地價格資料庫讀出多檔股票，以單次向量化運算取得每檔股票的最新指標快照。
+    只使用已同步的本地資料；需要最新資料時請先呼叫 bulk_price_loader.prefetch_prices。
+    """
+    start_date = date.today() - timedelta(days=days)
+    frames = get_price_store().load_many(list(dict.fromkeys(stock_ids)), start=start_date)
+    frames = {s: df.dropna(subset=['Close']) for s, df in frames.items()}
+    panel = build_price_panel(frames)
+    indicators = calculate_panel_indicators(panel['high'], panel['low'], panel['close'])
+    return panel_snapshot(panel, indicators)
+
+
+def snapshot_results(snapshot: pd.DataFrame) -> dict[str, dict]:
+    """
+    將 panel_snapshot 的每一列轉成 analyze_stock(with_chart=False) 的回傳格式，
+    可與逐檔分析的結果混用（例如寫入 cached_analyze_indicators 的快取）。
+    """
+    results = {}
+    for stock_id, row in snapshot.iterrows():
+        if not row['chart_ready']:
+            results[stock_id] = {
+                'status': 'error',
+                'error_type': 'insufficient_data',
+                'message': f"分析過程發生錯誤 ({stock_id}): 股票 {stock_id} 有效資料不足"
+                           f"（dropna 後僅剩 {int(row['chart_bars'])} 筆），無法繪圖。",
+            }
+            continue
+        results[stock_id] = {
+            'status': 'success',
+            'indicators': {
+                'k': None if pd.isna(row['k']) else float(row['k']),
+                'd': None if pd.isna(row['d']) else float(row['d']),
+                'i_value': None if pd.isna(row['i_value']) else float(row['i_value']),
+                'avg_vol_5': float(row['avg_vol_5']),
+            },
+        }
+    return results
@@ -0,0 +1,234 @@
+# price_store.py (本地 OHLCV 日線資料庫：保存歷史價格，只向 FinMind 補抓缺漏區間；另存盤中累計成交量供量能曲線校準)
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+import pandas as pd
+
+_DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'price_store.sqlite3')
+_PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# 今日 K 棒尚未出現時，同一檔股票在此秒數內不重複向 FinMind 詢問今天的資料
+TODAY_RECHECK_SECONDS = int(os.getenv('PRICE_STORE_RECHECK_SEC', '900'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_price (
+    stock_id TEXT NOT NULL,
+    date     TEXT NOT NULL,
+    open     REAL,
+    high     REAL,
+    low      REAL,
+    close    REAL,
+    volume   REAL,
+    PRIMARY KEY (stock_id, date)
+);
+CREATE TABLE IF NOT EXISTS sync_meta (
+    stock_id       TEXT PRIMARY KEY,
+    covered_from   TEXT NOT NULL,
+    synced_through TEXT NOT NULL,
+    checked_at     TEXT
+);
+CREATE TABLE IF NOT EXISTS intraday_volume (
+    stock_id    TEXT NOT NULL,
+    date        TEXT NOT NULL,
+    seconds     INTEGER NOT NULL,  -- 台北時間當日秒數
+    volume_lots REAL NOT NULL,     -- 截至該時間的累計成交量（張）
+    PRIMARY KEY (stock_id, date, seconds)
+);
+"""
+
+
+class SyncState(NamedTuple):
+    covered_from: date        # 自此日起的歷史資料已完整保存
+    synced_through: date      # 已同步到此日（含）
+    checked_at: datetime | None  # 最近一次向 FinMind 詢問的時間
+
+    def is_up_to_date(self) -> bool:
+        """資料已同步到今天，或只缺今天但剛問過 FinMind，都視為不需再請求。"""
+        today = date.today()
+        if self.synced_through >= today:
+            return True
+        if self.synced_through + timedelta(days=1) >= today and self.checked_at is not None:
+            return (datetime.now() - self.checked_at).total_seconds() < TODAY_RECHECK_SECONDS
+        return False
+
+
+class PriceStore:
+    """
+    以 SQLite 保存每檔股票的日線 OHLCV。
+    sync_meta 記錄每檔股票「已完整涵蓋的起日」與「已同步到哪一天」，
+    呼叫端據此只向 FinMind 請求缺漏的日期區間。
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or os.getenv('PRICE_STORE_PATH') or _DEFAULT_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(sync_meta)')}
+            if 'checked_at' not in columns:  # 舊版資料庫升級
+                conn.execute('ALTER TABLE sync_meta ADD COLUMN checked_at TEXT')
+
+    @contextmanager
+    def _connect(self):
+        # 每次操作各自開連線：SQLite 連線不可跨執行緒共用，WAL 模式允許多讀一寫
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:  # 區塊結束時 commit，發生例外則 rollback
+                yield conn
+        finally:
+            conn.close()
+
+    def get_sync_state(self, stock_id: str) -> SyncState | None:
+        """回傳指定股票的同步狀態；從未同步過則回傳 None。"""
+        return self.get_sync_states([stock_id]).get(stock_id)
+
+    def get_sync_states(self, stock_ids: list[str]) -> dict[str, SyncState]:
+        """一次查詢多檔股票的同步狀態，未同步過的股票不會出現在結果中。"""
+        states = {}
+        with self._connect() as conn:
+            for i in range(0, len(stock_ids), 500):  # SQLite 參數數量上限
+                chunk = stock_ids[i:i + 500]
+                rows = conn.execute(
+                    'SELECT stock_id, covered_from, synced_through, checked_at FROM sync_meta '
+                    f'WHERE stock_id IN ({",".join("?" * len(chunk))})',
+                    chunk
+                ).fetchall()
+                for stock_id, covered_from, synced_through, checked_at in rows:
+                    states[stock_id] = SyncState(
+                        date.fromisoformat(covered_from),
+                        date.fromisoformat(synced_through),
+                        datetime.fromisoformat(checked_at) if checked_at else None,
+                    )
+        return states
+
+    def load(self, stock_id: str, start: date | None = None) -> pd.DataFrame:
+        """讀出指定股票（自 start 起）的日線資料，格式與 TaiwanStockAnalyzer.price_data 相同。"""
+        sql = 'SELECT date, open, high, low, close, volume FROM daily_price WHERE stock_id = ?'
+        params: list = [stock_id]
+        if start is not None:
+            sql += ' AND date >= ?'
+            params.append(start.isoformat())
+        sql += ' ORDER BY date'
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        df = pd.DataFrame(rows, columns=['Date'] + _PRICE_COLUMNS)
+        df['Date'] = pd.to_datetime(df['Date'])
+        return df.set_index('Date')
+
+    def load_many(self, stock_ids: list[str], start: date | None = None) -> dict[str, pd.DataFrame]:
+        """一次讀出多檔股票的日線資料，回傳 {stock_id: DataFrame}；無資料的股票不會出現在結果中。"""
+        frames = {}
+        with self._connect() as conn:
+            for i in range(0, len(stock_ids), 500):  # SQLite 參數數量上限
+                chunk = stock_ids[i:i + 500]
+                sql = ('SELECT stock_id, date, open, high, low, close, volume FROM daily_price '
+                       f'WHERE stock_id IN ({",".join("?" * len(chunk))})')
+                params: list = list(chunk)
+                if start is not None:
+                    sql += ' AND date >= ?'
+                    params.append(start.isoformat())
+                rows = conn.execute(sql + ' ORDER BY stock_id, date', params).fetchall()
+                if not rows:
+                    continue
+                df = pd.DataFrame(rows, columns=['stock_id', 'Date'] + _PRICE_COLUMNS)
+                df['Date'] = pd.to_datetime(df['Date'])
+                for stock_id, group in df.groupby('stock_id', sort=False):
+                    frames[stock_id] = group.drop(columns='stock_id').set_index('Date')
+        return frames
+
+    def save(self, stock_id: str, data: pd.DataFrame, covered_from: date, synced_through: date) -> None:
+        """
+        寫入（覆蓋同日）日線資料並更新同步區間，於同一個交易內完成。
+        :param data: 以 Date 為索引、含 Open/High/Low/Close/Volume 欄位的 DataFrame，可為空
+        """
+        self.save_many({stock_id: data}, covered_from, synced_through)
+
+    def save_many(self, frames: dict[str, pd.DataFrame], covered_from: date | dict[str, date],
+                  synced_through: date) -> None:
+        """
+        批次寫入多檔股票的日線資料並更新同步區間（單一交易）。
+        :param covered_from: 所有股票共用的起日，或以股票代碼為鍵的個別起日
+        """
+        checked_at = datetime.now().isoformat(timespec='seconds')
+        records = []
+        meta = []
+        for stock_id, data in frames.items():
+            records.extend(
+                (stock_id, idx.strftime('%Y-%m-%d'), *(None if pd.isna(v) else float(v) for v in row))
+                for idx, row in zip(data.index, data[_PRICE_COLUMNS].itertuples(index=False))
+            )
+            start = covered_from[stock_id] if isinstance(covered_from, dict) else covered_from
+            meta.append((stock_id, start.isoformat(), synced_through.isoformat(), checked_at))
+
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO daily_price (stock_id, date, open, high, low, close, volume) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                records
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO sync_meta (stock_id, covered_from, synced_through, checked_at) '
+                'VALUES (?, ?, ?, ?)',
+                meta
+            )
+
+    def save_intraday_volumes(self, trade_date: date, seconds: int, volumes: dict[str, float]) -> None:
+        """記錄盤中某一時間點各股的累計成交量（張），供 volume_projection 校準個股量能曲線。"""
+        records = [(stock_id, trade_date.isoformat(), int(seconds), float(v))
+                   for stock_id, v in volumes.items() if v is not None and not pd.isna(v)]
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO intraday_volume (stock_id, date, seconds, volume_lots) VALUES (?, ?, ?, ?)',
+                records
+            )
+
+    def load_intraday_volumes(self, since: date) -> pd.DataFrame:
+        """
+        讀出自 since 起、當日日線已入庫的盤中累計成交量紀錄。
+        :return: 欄位 stock_id、date、seconds、volume_lots、daily_volume（當日總成交股數）
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT i.stock_id, i.date, i.seconds, i.volume_lots, d.volume FROM intraday_volume i '
+                'JOIN daily_price d ON d.stock_id = i.stock_id AND d.date = i.date '
+                'WHERE i.date >= ? AND d.volume > 0 ORDER BY i.stock_id, i.date, i.seconds',
+                (since.isoformat(),)
+            ).fetchall()
+        return pd.DataFrame(rows, columns=['stock_id', 'date', 'seconds', 'volume_lots', 'daily_volume'])
+
+
+def next_synced_through(end_date: date, last_bar: date | None) -> date:
+    """
+    計算本次同步後可記錄的 synced_through。
+    當日 K 棒在收盤後才會出現在 FinMind，若請求區間包含今天但尚未取得今日資料，
+    只記錄到昨天，讓下次呼叫再補抓今天。
+    """
+    today = date.today()
+    if end_date < today:
+        return end_date
+    if last_bar is not None and last_bar >= today:
+        return today
+    return today - timedelta(days=1)
+
+
+_store: PriceStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_price_store() -> PriceStore:
+    """取得行程內共用的 PriceStore（延遲建立）。"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PriceStore()
+                print(f"使用本地價格資料庫：{_store.path}")
+    return _store
@@ -0,0 +1,150 @@
+# rate_limiter.py (FinMind 請求節流：依帳號等級的 Token Bucket + 遇 429 自動退讓的自適應併發數)
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# FinMind 各等級每小時請求上限（https://finmindtrade.com/analysis/#/Sponsor/sponsor）
+FINMIND_HOURLY_LIMITS = {
+    'anonymous': 300,   # 未帶 Token
+    'register': 600,    # 註冊會員
+    'backer': 1600,
+    'sponsor': 6000,
+}
+# 併發數上限；實際併發數會從 INITIAL 開始遞增，遇到 429 時減半
+MAX_CONCURRENCY = int(os.getenv('FINMIND_MAX_CONCURRENCY', '16'))
+INITIAL_CONCURRENCY = 4
+DEFAULT_RETRY_AFTER = 60  # 伺服器未提供 Retry-After 時的退讓秒數
+
+
+class RateLimitError(ValueError):
+    """FinMind 回報請求頻率超限（HTTP 429/402）。訊息含 'rate limit' 以便 analyze_stock 分類錯誤。"""
+
+    def __init__(self, retry_after: float) -> None:
+        self.retry_after = retry_after
+        super().__init__(f"FinMind API 請求頻率超限 (HTTP 429 rate limit)，{retry_after:.0f} 秒後再試。")
+
+
+class TokenBucket:
+    """
+    經典 Token Bucket：每秒補充 rate 個權杖，最多累積 capacity 個。
+    pause() 可讓所有呼叫端暫停到指定時間（用於 Retry-After）。
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """取得一個權杖，不足時阻塞等待。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(min(wait, 5.0))
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 併發控制：每完成「目前上限」次成功請求就把上限加一，遇到節流時上限減半。
+    """
+
+    def __init__(self, initial: int, maximum: int) -> None:
+        self.maximum = maximum
+        self.limit = min(initial, maximum)
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+class FinMindGate:
+    """所有 FinMind 呼叫共用的閘門：同時受 Token Bucket（每小時額度）與自適應併發數限制。"""
+
+    def __init__(self, tier: str) -> None:
+        self.tier = tier
+        hourly = FINMIND_HOURLY_LIMITS[tier]
+        # 允許短時間爆量到每小時額度的 1/4，之後依平均速率補充
+        self.bucket = TokenBucket(rate=hourly / 3600.0, capacity=max(1, hourly // 4))
+        self.concurrency = AdaptiveConcurrency(INITIAL_CONCURRENCY, MAX_CONCURRENCY)
+
+    @contextmanager
+    def slot(self):
+        """
+        取得一次請求的許可。區塊內拋出 RateLimitError 時，
+        併發上限減半並依 retry_after 暫停整個閘門。
+        """
+        self.concurrency.acquire()
+        throttled = False
+        try:
+            self.bucket.acquire()
+            yield
+        except RateLimitError as e:
+            throttled = True
+            self.bucket.pause(e.retry_after)
+            print(f"FinMind 節流：降低併發數並暫停 {e.retry_after:.0f} 秒。")
+            raise
+        finally:
+            self.concurrency.release(throttled=throttled)
+
+
+def current_finmind_tier() -> str:
+    """FINMIND_TIER 環境變數可指定等級；未指定時依是否設定 Token 判斷為 register 或 anonymous。"""
+    tier = os.getenv('FINMIND_TIER', '').strip().lower()
+    if tier in FINMIND_HOURLY_LIMITS:
+        return tier
+    return 'register' if os.getenv('FINMIND_API_TOKEN') else 'anonymous'
+
+
+_gates: dict[str, FinMindGate] = {}
+_gates_lock = threading.Lock()
+
+
+def finmind_gate() -> FinMindGate:
+    """取得目前帳號等級對應的行程內共用閘門。"""
+    tier = current_finmind_tier()
+    with _gates_lock:
+        if tier not in _gates:
+            _gates[tier] = FinMindGate(tier)
+        return _gates[tier]
+
+
+def parse_retry_after(value: str | None) -> float:
+    """解析 Retry-After 標頭（秒數）；缺少或格式不符時使用預設值。"""
+    try:
+        return max(1.0, float(value))
+    except (TypeError, ValueError):
+        return float(DEFAULT_RETRY_AFTER)
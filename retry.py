@@ -0,0 +1,73 @@
+# retry.py (暫時性網路錯誤的重試策略：指數退避 + 隨機抖動 + 依錯誤類型分配重試次數)
+
+import random
+import time
+
+import requests
+
+from rate_limiter import RateLimitError
+
+# 各類錯誤可重試的次數；不在此表中的錯誤（4xx、解析錯誤等）直接拋出，不重試
+DEFAULT_BUDGETS = {
+    'timeout': 2,
+    'connection': 2,
+    'server_error': 2,   # HTTP 5xx
+    'rate_limit': 1,     # 等待時間由 rate_limiter 閘門的 Retry-After 暫停決定
+}
+
+
+def classify_error(exc: BaseException) -> str | None:
+    """將例外分類為可重試的錯誤類型；不可重試時回傳 None。"""
+    if isinstance(exc, RateLimitError):
+        return 'rate_limit'
+    if isinstance(exc, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        return 'connection'
+    if isinstance(exc, requests.exceptions.HTTPError):
+        response = exc.response
+        if response is not None and response.status_code >= 500:
+            return 'server_error'
+    return None
+
+
+class RetryPolicy:
+    """
+    以「完全抖動 (full jitter)」的指數退避重試：第 n 次重試前等待 uniform(0, min(max_delay, base_delay × 2^n)) 秒。
+    每類錯誤各自計算剩餘次數，例如逾時與 5xx 互不佔用額度。
+    """
+
+    def __init__(self, budgets: dict[str, int] | None = None,
+                 base_delay: float = 0.5, max_delay: float = 8.0) -> None:
+        self.budgets = dict(DEFAULT_BUDGETS if budgets is None else budgets)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int, error_class: str) -> float:
+        if error_class == 'rate_limit':
+            return 0.0  # 閘門已暫停到 Retry-After，重試時會在 acquire 時等待
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, func, *args, description: str = '', **kwargs):
+        """
+        執行 func(*args, **kwargs)，遇到可重試的錯誤時依策略重試；
+        額度用盡或不可重試時拋出最後一次的例外。
+        """
+        remaining = dict(self.budgets)
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                error_class = classify_error(e)
+                if error_class is None or remaining.get(error_class, 0) <= 0:
+                    raise
+                remaining[error_class] -= 1
+                delay = self.backoff(attempt, error_class)
+                attempt += 1
+                print(f"暫時性錯誤 ({error_class}){'：' + description if description else ''}，"
+                      f"{delay:.1f} 秒後第 {attempt} 次重試: {e}")
+                time.sleep(delay)
+
+
+DEFAULT_POLICY = RetryPolicy()
@@ -1,17 +1,24 @@
 # scraper.py (修正版：移除 Accept-Encoding 避免解壓縮失敗導致空 body)
 import os
+import re
 import sys
 import time
 import random
 import requests
 import pandas as pd
-from bs4 import BeautifulSoup
-import io
+
+import html_table
+import http_client
 
 # Windows CP950 不支援 emoji，強制 stdout 使用 UTF-8
 if hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
 
+# Goodinfo「我的選股103」資料頁（基準測試會改指向本機的 stub server）
+GOODINFO_MY_STOCK_URL = "https://goodinfo.tw/tw/StockListFilter/StockList.asp?STEP=DATA&MARKET_CAT=%E8%87%AA%E8%A8%82%E7%AF%A9%E9%81%B8&INDUSTRY_CAT=%E6%88%91%E7%9A%84%E6%A2%9D%E4%BB%B6&SHEET=%E4%BA%A4%E6%98%93%E7%8B%80%E6%B3%81&SHEET2=%E6%97%A5&FL_SHEET=%E4%BA%A4%E6%98%93%E7%8B%80%E6%B3%81&FL_SHEET2=%E6%97%A5&FL_MARKET=%E4%B8%8A%E5%B8%82%2F%E4%B8%8A%E6%AB%83&MY_FL_RULE_NM=%E9%81%B8%E8%82%A103&FL_ITEM0=%E7%95%B6%E6%97%A5%EF%BC%9A%E7%B4%85K%E6%A3%92%E6%A3%92%E5%B9%85%28%25%29&FL_VAL_S0=2%2E5&FL_VAL_E0=10&FL_ITEM1=%E6%88%90%E4%BA%A4%E5%BC%B5%E6%95%B8+%28%E5%BC%B5%29&FL_VAL_S1=5000&FL_VAL_E1=900000&FL_ITEM3=%E5%9D%87%E7%B7%9A%E4%B9%96%E9%9B%A2%28%25%29%E2%80%93%E5%AD%A3&FL_VAL_S3=%2D5&FL_VAL_E3=5&FL_ITEM4=K%E5%80%BC+%28%E9%80%B1%29&FL_VAL_S4=0&FL_VAL_E4=50&FL_RULE0=KD%7C%7C%E9%80%B1K%E5%80%BC+%E2%86%97%40%40%E9%80%B1KD%E8%B5%B0%E5%8B%A2%40%40K%E5%80%BC+%E2%86%97&FL_RULE1=%E5%9D%87%E7%B7%9A%E4%BD%8D%E7%BD%AE%7C%7C%E6%9C%88%2F%E5%AD%A3%E7%B7%9A%E7%A9%BA%E9%A0%AD%E6%8E%92%E5%88%97%40%40%E5%9D%87%E5%83%B9%E7%B7%9A%E7%A9%BA%E9%A0%AD%E6%8E%92%E5%88%97%40%40%E6%9C%88%2F%E5%AD%A3&FL_FD0=K%E5%80%BC+%28%E6%97%A5%29%7C%7C1%7C%7C0%7C%7C%3E%7C%7CD%E5%80%BC+%28%E6%97%A5%29%7C%7C1%7C%7C0&FL_FD1=%E6%88%90%E4%BA%A4%E5%BC%B5%E6%95%B8+%28%E5%BC%B5%29%7C%7C1%7C%7C0%7C%7C%3E%7C%7C%E6%98%A8%E6%97%A5%E6%88%90%E4%BA%A4%E5%BC%B5%E6%95%B8+%28%E5%BC%B5%29%7C%7C1%2E3%7C%7C0&FL_FD2=%7C%7C1%7C%7C0%7C%7C%3D%7C%7C%7C%7C1%7C%7C0&FL_FD3=%7C%7C1%7C%7C0%7C%7C%3D%7C%7C%7C%7C1%7C%7C0&FL_FD4=%7C%7C1%7C%7C0%7C%7C%3D%7C%7C%7C%7C1%7C%7C0&FL_FD5=%7C%7C1%7C%7C0%7C%7C%3D%7C%7C%7C%7C1%7C%7C0&IS_RELOAD_REPORT=T"
+# 每次請求前的隨機延遲秒數範圍，模擬人類行為
+REQUEST_DELAY = (1.0, 2.5)
+
 def scrape_goodinfo():
     """
     爬取 Goodinfo 台灣股市資訊網 "我的選股103" 的資料並回傳 DataFrame。
@@ -19,7 +26,7 @@ def scrape_goodinfo():
     """
 
     # --- 1. 設定爬蟲參數 ---
-    url = "https://goodinfo.tw/tw/StockListFilter/StockList.asp?STEP=DATA&MARKET_CAT=%E8%87%AA%E8%A8%82%E7%AF%A9%E9%81%B8&INDUSTRY_CAT=%E6%88%91%E7%9A%84%E6%A2%9D%E4%BB%B6&SHEET=%E4%BA%A4%E6%98%93%E7%8B%80%E6%B3%81&SHEET2=%E6%97%A5&FL_SHEET=%E4%BA%A4%E6%98%93%E7%8B%80%E6%B3%81&FL_SHEET2=%E6%97%A5&FL_MARKET=%E4%B8%8A%E5%B8%82%2F%E4%B8%8A%E6%AB%83&MY_FL_RULE_NM=%E9%81%B8%E8%82%A103&FL_ITEM0=%E7%95%B6%E6%97%A5%EF%BC%9A%E7%B4%85K%E6%A3%92%E6%A3%92%E5%B9%85%28%25%29&FL_VAL_S0=2%2E5&FL_VAL_E0=10&FL_ITEM1=%E6%88%90%E4%BA%A4%E5%BC%B5%E6%95%B8+%28%E5%BC%B5%29&FL_VAL_S1=5000&FL_VAL_E1=900000&FL_ITEM3=%E5%9D%87%E7%B7%9A%E4%B9%96%E9%9B%A2%28%25%29%E2%80%93%E5%AD%A3&FL_VAL_S3=%2D5&FL_VAL_E3=5&FL_ITEM4=K%E5%80%BC+%28%E9%80%B1%29&FL_VAL_S4=0&FL_VAL_E4=50&FL_RULE0=KD%7C%7C%E9%80%B1K%E5%80%BC+%E2%86%97%40%40%E9%80%B1KD%E8%B5%B0%E5%8B%A2%40%40K%E5%80%BC+%E2%86%97&FL_RULE1=%E5%9D%87%E7%B7%9A%E4%BD%8D%E7%BD%AE%7C%7C%E6%9C%88%2F%E5%AD%A3%E7%B7%9A%E7%A9%BA%E9%A0%AD%E6%8E%92%E5%88%97%40%40%E5%9D%87%E5%83%B9%E7%B7%9A%E7%A9%BA%E9%A0%AD%E6%8E%92%E5%88%97%40%40%E6%9C%88%2F%E5%AD%A3&FL_FD0=K%E5%80%BC+%28%E6%97%A5%29%7C%7C1%7C%7C0%7C%7C%3E%7C%7CD%E5%80%BC+%28%E6%97%A5%29%7C%7C1%7C%7C0&FL_FD1=%E6%88%90%E4%BA%A4%E5%BC%B5%E6%95%B8+%28%E5%BC%B5%29%7C%7C1%7C%7C0%7C%7C%3E%7C%7C%E6%98%A8%E6%97%A5%E6%88%90%E4%BA%A4%E5%BC%B5%E6%95%B8+%28%E5%BC%B5%29%7C%7C1%2E3%7C%7C0&FL_FD2=%7C%7C1%7C%7C0%7C%7C%3D%7C%7C%7C%7C1%7C%7C0&FL_FD3=%7C%7C1%7C%7C0%7C%7C%3D%7C%7C%7C%7C1%7C%7C0&FL_FD4=%7C%7C1%7C%7C0%7C%7C%3D%7C%7C%7C%7C1%7C%7C0&FL_FD5=%7C%7C1%7C%7C0%7C%7C%3D%7C%7C%7C%7C1%7C%7C0&IS_RELOAD_REPORT=T"
+    url = GOODINFO_MY_STOCK_URL
 
     # --- 2. 嚴格檢查環境變數 ---
     cookie = os.getenv('GOODINFO_COOKIE_MY_STOCK')
@@ -41,23 +48,19 @@ def scrape_goodinfo():
         # Accept-Encoding 刻意省略，由 requests 預設處理
     }
 
-    container_selector = "#tblStockList"
+    table_id = "tblStockList"
     # 比對用欄位清單：統一使用無空白字串，防止 Goodinfo 微調 HTML 空白字元
     columns_to_keep = ['代號', '名稱', '市場', '股價日期', '成交', '漲跌價', '漲跌幅', '成交張數']
 
     print("🔄 正在從 Goodinfo (我的選股) 爬取資料...")
 
     # --- [修改重點] 加入隨機延遲，模擬人類行為（與 monthly_revenue_scraper 一致）---
-    delay = random.uniform(1.0, 2.5)
+    delay = random.uniform(*REQUEST_DELAY)
     print(f"⏳ 等待 {delay:.1f} 秒後發送請求...")
     time.sleep(delay)
 
-    session = requests.Session()
-    session.headers.update(headers)
-
     try:
-        response = session.get(url, timeout=25)
-        response.raise_for_status()
+        response = http_client.get_with_retry(url, headers=headers, timeout=25)
 
         # ⚠️ 關鍵修正：使用 response.content（bytes）搭配明確 UTF-8 解碼，
         # 避免 response.text 在壓縮內容未正確解壓時回傳空字串。
@@ -93,31 +96,18 @@ def scrape_goodinfo():
 
     # --- 3. 解析資料並轉換為 DataFrame ---
     try:
-        soup = BeautifulSoup(html_content, 'html.parser')
-        data_table = soup.select_one(container_selector)
+        # 單次串流解析：找到 #tblStockList 後直接由儲存格文字建立 DataFrame
+        df = html_table.read_table(html_content, table_id)
 
-        if not data_table:
+        if df is None:
             # [修改重點] 印出頁面 title 幫助診斷實際跑到哪個頁面
-            title_tag = soup.find('title')
-            page_title = title_tag.text.strip() if title_tag else '(無 title)'
-            print(f"❌ 錯誤：在 Goodinfo 頁面中找不到指定的表格 (Selector: {container_selector})")
+            title_match = re.search(r'<title>(.*?)</title>', html_content, re.IGNORECASE | re.DOTALL)
+            page_title = title_match.group(1).strip() if title_match else '(無 title)'
+            print(f"❌ 錯誤：在 Goodinfo 頁面中找不到指定的表格 (id: {table_id})")
             print(f"👉 頁面 <title>：{page_title}")
             print(f"👉 頁面前 500 字元：\n{html_content[:500]}")
             return None
 
-        print(f"✅ 找到目標表格，開始解析...")
-
-        try:
-            dfs = pd.read_html(io.StringIO(str(data_table)), flavor='lxml')
-        except Exception as e:
-            print(f"❌ pandas read_html 自動判斷表頭失敗: {e}")
-            return None
-
-        if not dfs:
-            print(f"❌ 錯誤：在容器 {container_selector} 中找不到任何表格 (<table>)。")
-            return None
-
-        df = dfs[0]
         print(f"ℹ️ 原始 DataFrame：{len(df)} 列 x {len(df.columns)} 欄")
 
         if isinstance(df.columns, pd.MultiIndex):
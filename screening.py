@@ -0,0 +1,45 @@
+# screening.py (選股畫面共用的併發分析執行器：多檔股票同時分析並回報進度)
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+
+from rate_limiter import MAX_CONCURRENCY
+
+
+def normalize_stock_codes(stock_codes) -> list[str]:
+    """去除空白、空值與重複代碼，保留原本的先後順序。"""
+    codes = (str(c).strip() for c in stock_codes)
+    return list(dict.fromkeys(c for c in codes if c and c != 'nan'))
+
+
+def run_screen_analysis(stock_codes, analyze: Callable[[str], dict],
+                        on_progress: Callable[[int, int, str], None] | None = None,
+                        max_workers: int = MAX_CONCURRENCY) -> dict[str, dict]:
+    """
+    以執行緒池同時分析多檔股票。
+    實際送往 FinMind 的請求數由 rate_limiter 的自適應閘門控制，這裡只提供足夠的工作執行緒。
+
+    :param analyze: 單檔分析函式，回傳 analyze_stock 格式的 dict
+    :param on_progress: 每完成一檔時以 (已完成數, 總數, 股票代碼) 呼叫；在呼叫端的執行緒中執行
+    :return: {股票代碼: 分析結果}；分析時拋出的例外會轉成 status 為 'error' 的結果
+    """
+    codes = normalize_stock_codes(stock_codes)
+    results: dict[str, dict] = {}
+    if not codes:
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(codes)))) as executor:
+        future_to_code = {executor.submit(analyze, code): code for code in codes}
+        for done, future in enumerate(as_completed(future_to_code), start=1):
+            code = future_to_code[future]
+            try:
+                results[code] = future.result()
+            except Exception as exc:
+                results[code] = {
+                    'status': 'error',
+                    'message': f"分析時發生例外: {exc}",
+                    'error_type': 'unknown',
+                }
+            if on_progress is not None:
+                on_progress(done, len(codes), code)
+    return results
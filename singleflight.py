@@ -0,0 +1,63 @@
+# singleflight.py (請求合併：同一個鍵同時只執行一次，其餘並發呼叫者等待並共用結果)
+#
+# 兩個使用者同時打開同一檔股票、或多個選股畫面同時補抓同一天的全市場股價時，
+# 只有第一個呼叫者真正送出請求，其他人等它完成後拿到相同的結果（或相同的例外）。
+# 只合併「同時進行中」的呼叫，不快取結果；完成後的下一次呼叫會重新執行。
+
+import threading
+from typing import Callable, Hashable, TypeVar
+
+import instrumentation
+
+T = TypeVar('T')
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """以鍵合併並發呼叫的群組，多執行緒安全；不同鍵之間互不阻擋。"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        """
+        執行 func()；同一個 key 已有進行中的呼叫時，改為等待該呼叫完成並回傳其結果。
+        func 拋出的例外會傳給所有等待者。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            instrumentation.count('singleflight', group=self.name, result='shared')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            instrumentation.count('singleflight', group=self.name, result='executed')
+
+    def in_flight(self) -> int:
+        """目前進行中的鍵數量。"""
+        with self._lock:
+            return len(self._calls)
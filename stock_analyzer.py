@@ -1,3 +1,4 @@
+import math
 import os
 import pandas as pd
 import numpy as np
@@ -5,10 +6,157 @@ import requests
 import twstock
 from datetime import date, timedelta
 
+import http_client
+import instrumentation
+import kernels
+from price_store import get_price_store, next_synced_through
+from rate_limiter import RateLimitError, finmind_gate, parse_retry_after
+from retry import DEFAULT_POLICY
+from singleflight import SingleFlight
+
 # --- 新增 Plotly 相關導入 ---
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+FINMIND_API_URL = "https://api.finmindtrade.com/api/v4/data"
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+# 技術分析圖用到的欄位；chart_data() 依此順序存成 float32 陣列的各列（成交量另存 float64）
+CHART_PRICE_COLUMNS = ('Open', 'High', 'Low', 'Close')
+CHART_INDICATOR_COLUMNS = ('sma5', 'sma20', 'sma60', 'k', 'd', 'L_value', 'dev_5_20', 'dev_20_60', 'dev_5_60',
+                           'I_value', 'J_value', 'K_value', 'macd_hist', 'macd', 'macd_signal', 'wma5', 'wma10')
+CHART_SERIES = CHART_PRICE_COLUMNS + CHART_INDICATOR_COLUMNS
+
+# 並發的相同 FinMind 查詢（同資料集、同股票、同區間）與同一檔股票的本地資料庫同步各只執行一次
+_finmind_flights = SingleFlight('finmind')
+_price_sync_flights = SingleFlight('price_sync')
+
+
+def request_finmind_data(params: dict) -> list:
+    """
+    呼叫 FinMind v4 data API 並回傳 data 陣列（可能為空串列）。
+    所有 FinMind 請求都經過 rate_limiter 的共用閘門，暫時性錯誤依 retry.DEFAULT_POLICY 重試；
+    重試用盡仍節流時拋出 RateLimitError。
+    網路錯誤以 requests 例外拋出，API 回報的錯誤則轉為 ValueError。
+    參數完全相同的請求正在進行時不會重複送出，而是等待並共用同一份回應（例外亦同）。
+    """
+    key = tuple(sorted((k, str(v)) for k, v in params.items()))
+    return list(_finmind_flights.do(key, lambda: _fetch_finmind_data(params)))
+
+
+def _fetch_finmind_data(params: dict) -> list:
+    finmind_api_token = os.getenv('FINMIND_API_TOKEN')
+    headers = {}
+    if finmind_api_token:
+        headers["Authorization"] = f"Bearer {finmind_api_token}"
+    else:
+        print("警告: 未設定 FINMIND_API_TOKEN 環境變數，將嘗試匿名存取 FinMind API。")
+
+    def _attempt() -> dict:
+        with finmind_gate().slot():
+            response = http_client.get(FINMIND_API_URL, params=params, headers=headers, timeout=20)
+            # FinMind 超過額度時回傳 402（部分代理層為 429）
+            if response.status_code in (402, 429):
+                raise RateLimitError(parse_retry_after(response.headers.get('Retry-After')))
+            response.raise_for_status()
+            payload = response.json()
+            if payload.get("status") in (402, 429):
+                raise RateLimitError(parse_retry_after(response.headers.get('Retry-After')))
+            return payload
+
+    raw_data = DEFAULT_POLICY.call(_attempt, description=f"FinMind {params.get('dataset')} {params.get('data_id', '')}")
+
+    if raw_data.get("status") != 200:
+        error_message_from_api = raw_data.get('error_message') or raw_data.get('msg') or 'FinMind API 回傳錯誤'
+        raise ValueError(f"FinMind API 錯誤: {error_message_from_api}")
+
+    return raw_data.get('data') or []
+
+
+def normalize_price_data(data_list: list) -> pd.DataFrame:
+    """
+    將 FinMind TaiwanStockPrice 的原始資料轉為以 Date 為索引的 OHLCV DataFrame。
+    原始資料含 stock_id 時（整體市場查詢）會保留該欄位。
+    """
+    data = pd.DataFrame(data_list)
+    if data.empty:
+        return pd.DataFrame(columns=PRICE_COLUMNS, index=pd.DatetimeIndex([], name='Date'), dtype=float)
+
+    data.rename(columns={
+        'date': 'Date', 'open': 'Open', 'max': 'High',
+        'min': 'Low', 'close': 'Close', 'Trading_Volume': 'Volume'
+    }, inplace=True)
+
+    data['Date'] = pd.to_datetime(data['Date'])
+    data.set_index('Date', inplace=True)
+    keep_columns = PRICE_COLUMNS + (['stock_id'] if 'stock_id' in data.columns else [])
+    data = data[keep_columns]
+
+    for col in PRICE_COLUMNS:
+        data[col] = pd.to_numeric(data[col], errors='coerce')
+
+    return data.dropna(subset=['Close']).sort_index()
+
+
+def stair_signal(a, b, c) -> np.ndarray:
+    """
+    階梯訊號 (I 值)：依 週-月(a)、月-季(b)、週-季(c) 三乖離的排序給出 -3 ~ 3。
+    輸入可為任意形狀的陣列（單檔時間序列或 日期×股票 的面板）。
+    """
+    # 向量化替代 Python 迴圈
+    signals = np.where(
+        (a >= c) & (c >= b), 1,
+        np.where(
+            (c >= a) & (a >= b), 2,
+            np.where(
+                (c >= b) & (b >= a), 3,
+                np.where(
+                    (b >= c) & (c >= a), -1,
+                    np.where(
+                        (b >= a) & (a >= c), -2,
+                        -3
+                    )
+                )
+            )
+        )
+    )
+    # 均線糾結時（三乖離差距皆小於 0.1%）輸出 0（中性），避免盤整期訊號跳動
+    FLAT_THRESHOLD = 0.1
+    is_flat = (np.abs(a - b) < FLAT_THRESHOLD) & (np.abs(b - c) < FLAT_THRESHOLD)
+    signals = np.where(is_flat, 0, signals)
+    return signals
+
+
+def deviation_signal(dev_1_20) -> np.ndarray:
+    """乖離訊號 (J 值)：收盤價與月線乖離 >= 5% 為 4，<= -5% 為 -4，其餘 NaN。"""
+    return np.where(dev_1_20 >= 5, 4, np.where(dev_1_20 <= -5, -4, np.nan))
+
+
+def stair_signal_scalar(a: float, b: float, c: float) -> float:
+    """stair_signal 的單一數值版本（增量更新每根 K 棒呼叫一次，省去建立 numpy 陣列的開銷）；NaN 的處理與陣列版相同。"""
+    if abs(a - b) < 0.1 and abs(b - c) < 0.1:
+        return 0.0
+    if a >= c >= b:
+        return 1.0
+    if c >= a >= b:
+        return 2.0
+    if c >= b >= a:
+        return 3.0
+    if b >= c >= a:
+        return -1.0
+    if b >= a >= c:
+        return -2.0
+    return -3.0
+
+
+def deviation_signal_scalar(dev_1_20: float) -> float:
+    """deviation_signal 的單一數值版本。"""
+    if dev_1_20 >= 5:
+        return 4.0
+    if dev_1_20 <= -5:
+        return -4.0
+    return math.nan
+
+
 class TaiwanStockAnalyzer:
     def __init__(self, stock_id: str, days: int = 300) -> None:
         """
@@ -22,7 +170,8 @@ class TaiwanStockAnalyzer:
         self.stock_name = self._get_stock_name()
         self.price_data: pd.DataFrame = pd.DataFrame()
         self.indicators = {}
-        self.finmind_api_token = os.getenv('FINMIND_API_TOKEN')
+        self._state = None           # 增量模式的 IndicatorState
+        self._pending_bars = []      # 尚未併入 price_data / indicators 的新 K 棒 (日期, OHLCV, 指標)
 
     def _get_stock_name(self) -> str:
         """利用 twstock 取得股票名稱"""
@@ -34,55 +183,20 @@ class TaiwanStockAnalyzer:
             return self.stock_id
 
     def fetch_data(self) -> None:
-        """從 FinMind API 抓取股票資料 (此函式邏輯不變)"""
-        print(f"正在從 FinMind API 抓取股票 {self.stock_id} 的資料...")
-        
-        finmind_url = "https://api.finmindtrade.com/api/v4/data"
-        params = {
-            "dataset": "TaiwanStockPrice",
-            "data_id": self.stock_id,
-            "start_date": self.start_date.strftime('%Y-%m-%d'),
-            "end_date": date.today().strftime('%Y-%m-%d'),
-        }
-        headers = {}
-        if self.finmind_api_token:
-            headers["Authorization"] = f"Bearer {self.finmind_api_token}"
-            print("使用 FinMind API Token 進行驗證。")
-        else:
-            print("警告: 未設定 FINMIND_API_TOKEN 環境變數，將嘗試匿名存取 FinMind API。")
-
+        """
+        取得分析期間的日線資料：先讀本地價格資料庫，只向 FinMind 補抓上次同步後缺漏的區間。
+        本地資料未涵蓋分析起日（首次查詢或 days 加大）時才下載完整區間。
+        """
+        store = get_price_store()
         try:
-            response = requests.get(finmind_url, params=params, headers=headers, timeout=20)
-            response.raise_for_status()
-            raw_data = response.json()
-            
-            if raw_data.get("status") != 200:
-                error_message_from_api = raw_data.get('error_message', 'FinMind API 回傳錯誤')
-                raise ValueError(f"FinMind API 錯誤: {error_message_from_api}")
-
-            data_list = raw_data.get('data')
-            if not data_list:
-                raise ValueError(f"FinMind API 未回傳股票 {self.stock_id} 的資料。")
-
-            data = pd.DataFrame(data_list)
-            data.rename(columns={
-                'date': 'Date', 'open': 'Open', 'max': 'High',
-                'min': 'Low', 'close': 'Close', 'Trading_Volume': 'Volume'
-            }, inplace=True)
-            
-            data['Date'] = pd.to_datetime(data['Date'])
-            data.set_index('Date', inplace=True)
-            data = data[['Open', 'High', 'Low', 'Close', 'Volume']]
-            
-            for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
-                data[col] = pd.to_numeric(data[col], errors='coerce')
-            
-            self.price_data = data.dropna(subset=['Close'])
-            
+            # 同一檔股票、同一分析起日的同步同時只執行一次；並發的其他呼叫者等它寫入資料庫後直接讀取
+            _price_sync_flights.do(('TaiwanStockPrice', self.stock_id, self.start_date), lambda: self._sync_prices(store))
+
+            self.price_data = store.load(self.stock_id, start=self.start_date).dropna(subset=['Close'])
+            self._state, self._pending_bars = None, []  # 重新載入後舊的增量狀態不再適用
+
             if self.price_data.empty:
                 raise ValueError("資料處理後為空。")
-            
-            print(f"成功從 FinMind API 抓取並處理 {self.stock_id} 的資料。共 {len(self.price_data)} 筆。")
 
         except requests.exceptions.RequestException as e:
             raise ValueError(f"連線 FinMind API 時發生錯誤: {e}")
@@ -90,32 +204,57 @@ class TaiwanStockAnalyzer:
             raise ValueError(f"處理 FinMind API 資料時發生錯誤: {e}")
         except Exception as e:
             raise ValueError(f"抓取 FinMind API 資料時發生未預期錯誤: {type(e).__name__} - {e}")
-    
-    # --- 指標計算函式 (邏輯不變) ---
+
+    def _sync_prices(self, store) -> None:
+        """把本地資料庫中這檔股票的資料同步到今天（必要時向 FinMind 補抓缺漏區間）。"""
+        today = date.today()
+        sync_state = store.get_sync_state(self.stock_id)
+
+        is_full_fetch = sync_state is None or sync_state.covered_from > self.start_date
+        if is_full_fetch:
+            covered_from, fetch_start = self.start_date, self.start_date
+        else:
+            covered_from = sync_state.covered_from
+            fetch_start = sync_state.synced_through + timedelta(days=1)
+
+        if is_full_fetch or not sync_state.is_up_to_date():
+            new_data = self._request_prices(fetch_start, today, allow_empty=not is_full_fetch)
+            last_bar = new_data.index[-1].date() if not new_data.empty else None
+            store.save(self.stock_id, new_data, covered_from, next_synced_through(today, last_bar))
+        else:
+            print(f"股票 {self.stock_id} 的本地資料已是最新，略過 FinMind 請求。")
+
+    def _request_prices(self, start: date, end: date, allow_empty: bool = False) -> pd.DataFrame:
+        """
+        從 FinMind API 抓取 [start, end] 區間的日線資料。
+        :param allow_empty: 增量補抓時區間內可能沒有新的交易日，此時回傳空 DataFrame 而非報錯
+        """
+        print(f"正在從 FinMind API 抓取股票 {self.stock_id} 的資料 ({start} ~ {end})...")
+        data_list = request_finmind_data({
+            "dataset": "TaiwanStockPrice",
+            "data_id": self.stock_id,
+            "start_date": start.strftime('%Y-%m-%d'),
+            "end_date": end.strftime('%Y-%m-%d'),
+        })
+        if not data_list:
+            if allow_empty:
+                print(f"股票 {self.stock_id} 在 {start} ~ {end} 間沒有新的交易資料。")
+                return normalize_price_data([])
+            raise ValueError(f"FinMind API 未回傳股票 {self.stock_id} 的資料。")
+
+        data = normalize_price_data(data_list)
+        print(f"成功從 FinMind API 抓取並處理 {self.stock_id} 的資料。共 {len(data)} 筆。")
+        return data
+
+    # --- 指標計算函式 (邏輯不變；滾動運算交由 kernels) ---
     def calculate_weighted_moving_average(self, prices, period):
-        weights = np.arange(1, period + 1, dtype=float)
-        weight_sum = weights.sum()
-        kernel = weights[::-1]  # 最新的權重最大
-        result = np.full(len(prices), np.nan)
-        # 使用 mode='valid'：只保留卷積完整覆蓋 period 筆的結果，避免邊界偏差
-        conv = np.convolve(prices, kernel, mode='valid')
-        result[period - 1:] = conv / weight_sum
-        return result
+        return kernels.wma(prices, period)
 
     def _calculate_sma(self, data, period):
-        return pd.Series(data).rolling(window=period).mean().values
+        return kernels.rolling_mean(data, period)
 
     def _calculate_stochastic(self, high, low, close, k_period=9, k_slowing=3, d_period=3):
-        high_s = pd.Series(high)
-        low_s = pd.Series(low)
-        close_s = pd.Series(close)
-        min_low = low_s.rolling(window=k_period).min()
-        max_high = high_s.rolling(window=k_period).max()
-        denom = (max_high - min_low).replace(0, np.nan)  # 避免停板/無波動時除以零
-        raw_k = 100 * ((close_s - min_low) / denom)
-        k = raw_k.rolling(window=k_slowing).mean().values
-        d = pd.Series(k).rolling(window=d_period).mean().values
-        return k, d
+        return kernels.stochastic(high, low, close, k_period, k_slowing, d_period)
 
     def _calculate_macd(self, prices, fast_period=12, slow_period=26, signal_period=9):
         prices_s = pd.Series(prices)
@@ -151,93 +290,117 @@ class TaiwanStockAnalyzer:
         self.indicators['L_value'] = np.where(k >= 80, 100, np.where(k <= 20, 0, np.nan))
 
     def _calculate_stair_signal(self) -> np.ndarray:
-        a = self.indicators['dev_5_20']
-        b = self.indicators['dev_20_60']
-        c = self.indicators['dev_5_60']
-        # 向量化替代 Python 迴圈
-        signals = np.where(
-            (a >= c) & (c >= b), 1,
-            np.where(
-                (c >= a) & (a >= b), 2,
-                np.where(
-                    (c >= b) & (b >= a), 3,
-                    np.where(
-                        (b >= c) & (c >= a), -1,
-                        np.where(
-                            (b >= a) & (a >= c), -2,
-                            -3
-                        )
-                    )
-                )
-            )
-        )
-        # 均線糾結時（三乖離差距皆小於 0.1%）輸出 0（中性），避免盤整期訊號跳動
-        FLAT_THRESHOLD = 0.1
-        is_flat = (np.abs(a - b) < FLAT_THRESHOLD) & (np.abs(b - c) < FLAT_THRESHOLD)
-        signals = np.where(is_flat, 0, signals)
-        return signals
+        return stair_signal(self.indicators['dev_5_20'], self.indicators['dev_20_60'], self.indicators['dev_5_60'])
 
     def _calculate_deviation_signal(self) -> np.ndarray:
-        dev = self.indicators['dev_1_20']
-        return np.where(dev >= 5, 4, np.where(dev <= -5, -4, np.nan))
+        return deviation_signal(self.indicators['dev_1_20'])
+
+    # --- 增量更新：保留滾動狀態，新 K 棒以 O(1) 更新指標 ---
+    def start_incremental(self, intraday: bool = False) -> None:
+        """
+        以目前的 price_data 建立增量指標狀態（只需執行一次，之後以 append_bar 逐根更新）。
+        :param intraday: 盤中模式。新增的 K 棒尚未收盤、之後會以同日報價覆寫時設為 True，
+                         每根新 K 棒會多保存一份 checkpoint；補入已收盤的 K 棒時保持 False 即可。
+                         不論哪種模式，最後一根歷史 K 棒都可以覆寫。
+        """
+        from incremental_indicators import IndicatorState  # 延遲匯入：incremental_indicators 依賴本模組的訊號函式
+        self.flush_incremental()
+        if not self.indicators:
+            self.calculate_indicators()
+            self.calculate_signals()
+        self._state = IndicatorState.from_bars(
+            self.price_data['High'].values, self.price_data['Low'].values,
+            self.price_data['Close'].values, self.price_data['Volume'].values,
+            intraday=intraday,
+        )
+
+    def append_bar(self, bar_date, open_price: float, high: float, low: float, close: float, volume: float) -> dict:
+        """
+        加入一根 K 棒並增量更新所有指標，回傳最新快照（格式同 analyze_stock 的 indicators）。
+        bar_date 與最後一根 K 棒同日時視為盤中更新，覆寫該根而非新增（覆寫新增的 K 棒需 start_incremental(intraday=True)）。
+        新 K 棒先暫存，於 flush_incremental()（繪圖前會自動呼叫）時才一次併入 price_data 與 indicators。
+        """
+        if self._state is None:
+            self.start_incremental()
+        bar_date = pd.Timestamp(bar_date)
+        last_date = (self._pending_bars[-1][0] if self._pending_bars
+                     else self.price_data.index[-1] if not self.price_data.empty else None)
+
+        if last_date is not None and bar_date < last_date:
+            raise ValueError(f"K 棒日期 {bar_date.date()} 早於最後一根 {last_date.date()}，無法增量更新。")
+        bar = (open_price, high, low, close, volume)
+        if bar_date == last_date:
+            values = self._state.replace_last(high, low, close, volume)
+            if not self._pending_bars:
+                # 已併入的最後一根改回暫存：切片只是 view，不在 DataFrame 上逐格寫入，下次 flush 時再一併併入
+                self.price_data = self.price_data.iloc[:-1]
+                self.indicators = {key: np.asarray(v)[:-1] for key, v in self.indicators.items()}
+                self._pending_bars.append(None)
+            self._pending_bars[-1] = (bar_date, bar, values)
+        else:
+            values = self._state.update(high, low, close, volume)
+            self._pending_bars.append((bar_date, bar, values))
+        return self._state.snapshot()
+
+    def flush_incremental(self) -> None:
+        """將暫存的新 K 棒一次併入 price_data 與 indicators 陣列。"""
+        if not self._pending_bars:
+            return
+        dates, bars, values = zip(*self._pending_bars)
+        new_rows = pd.DataFrame(list(bars), columns=PRICE_COLUMNS, index=pd.DatetimeIndex(dates, name='Date'))
+        self.price_data = pd.concat([self.price_data, new_rows]) if not self.price_data.empty else new_rows
+        for key in values[0]:
+            new_values = np.array([v[key] for v in values], dtype=float)
+            self.indicators[key] = np.concatenate([np.asarray(self.indicators.get(key, []), dtype=float), new_values])
+        self._pending_bars = []
+
+    def check_chart_data(self) -> None:
+        """確認季線暖機期後至少還有 20 筆資料可繪圖，不足時拋出 ValueError（不建立圖表）。"""
+        self.flush_incremental()
+        valid_bars = int(np.count_nonzero(~np.isnan(np.asarray(self.indicators['sma60'], dtype=float))))
+        if valid_bars < 20:
+            raise ValueError(f"股票 {self.stock_id} 有效資料不足（dropna 後僅剩 {valid_bars} 筆），無法繪圖。")
+
+    def chart_data(self) -> dict:
+        """
+        繪圖所需的原始陣列（已去除季線暖機期），以精簡的二進位格式保存，供快取後再由 build_chart() 重建圖表：
+        日期為 int32 的 epoch 日數，價格與指標為 float32 的 (欄位, 日期) 陣列，成交量保留 float64。
+        序列化後約為同一張圖 Plotly JSON 的 1/7。
+        """
+        self.check_chart_data()
+        keep = ~np.isnan(np.asarray(self.indicators['sma60'], dtype=float))
+        columns = {name: self.price_data[name].values for name in CHART_PRICE_COLUMNS}
+        columns.update({name: self.indicators[name] for name in CHART_INDICATOR_COLUMNS})
+        values = np.vstack([np.asarray(columns[name], dtype=np.float32)[keep] for name in CHART_SERIES])
+        return {
+            'stock_id': self.stock_id,
+            'stock_name': self.stock_name,
+            'dates': self.price_data.index.values[keep].astype('datetime64[D]').astype(np.int32),
+            'values': values,
+            'volume': self.price_data['Volume'].values[keep].astype(np.float64),
+        }
 
     def create_chart(self) -> go.Figure:
         """
         【重大修改】使用 Plotly 創建互動式圖表，並返回圖表物件。
         """
-        df = self.price_data.copy()
-        for key, value in self.indicators.items():
-            df[key] = value
+        return build_chart(self.chart_data())
+
+
+# 7 列子圖的版面（座標軸、高度、圖例、週末隔斷、y 軸標題）與股票無關，第一次建構後重複使用
+_chart_layout: dict | None = None
 
-        # 動態裁切：去除均線暖機期的 NaN，同時確保至少保留 20 筆資料
-        df = df.dropna(subset=['sma60']).copy()
-        if df.empty or len(df) < 20:
-            raise ValueError(f"股票 {self.stock_id} 有效資料不足（dropna 後僅剩 {len(df)} 筆），無法繪圖。")
 
+def _base_chart_layout() -> dict:
+    global _chart_layout
+    if _chart_layout is None:
         fig = make_subplots(
             rows=7, cols=1,
             shared_xaxes=True,
             vertical_spacing=0.03,
             row_heights=[0.4, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1]
         )
-
-        # 1. K線圖和均線
-        fig.add_trace(go.Candlestick(x=df.index, open=df['Open'], high=df['High'], low=df['Low'], close=df['Close'], name='K線'), row=1, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['sma5'], mode='lines', name='週線(5)', line=dict(color='blue', width=1)), row=1, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['sma20'], mode='lines', name='月線(20)', line=dict(color='orange', width=1)), row=1, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['sma60'], mode='lines', name='季線(60)', line=dict(color='red', width=1)), row=1, col=1)
-        
-        # 2. 成交量
-        fig.add_trace(go.Bar(x=df.index, y=df['Volume'], name='成交量', marker_color='grey'), row=2, col=1)
-
-        # 3. KD指標
-        fig.add_trace(go.Scatter(x=df.index, y=df['k'], mode='lines', name='K值', line=dict(color='red', width=1)), row=3, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['d'], mode='lines', name='D值', line=dict(color='green', width=1)), row=3, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['L_value'], mode='markers', name='KD訊號', marker=dict(color='blue', size=8)), row=3, col=1)
-
-        # 4. 乖離率
-        fig.add_trace(go.Scatter(x=df.index, y=df['dev_5_20'], mode='lines', name='週-月', line=dict(color='red', width=1)), row=4, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['dev_20_60'], mode='lines', name='月-季', line=dict(color='green', width=1)), row=4, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['dev_5_60'], mode='lines', name='週-季', line=dict(color='orange', width=1)), row=4, col=1)
-
-        # 5. 訊號
-        fig.add_trace(go.Bar(x=df.index, y=df['I_value'], name='階梯訊號', marker_color='red'), row=5, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['J_value'], mode='markers', name='乖離訊號', marker=dict(color='blue', size=8)), row=5, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['K_value'], mode='lines', name='多空訊號', line=dict(color='orange', width=2)), row=5, col=1)
-
-        # 6. MACD
-        colors = ['red' if val >= 0 else 'green' for val in df['macd_hist']]  # 正值紅色(多頭)，負值綠色(空頭)
-        fig.add_trace(go.Bar(x=df.index, y=df['macd_hist'], name='Histogram', marker_color=colors), row=6, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['macd'], mode='lines', name='MACD', line=dict(color='blue', width=1)), row=6, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['macd_signal'], mode='lines', name='Signal', line=dict(color='red', width=1)), row=6, col=1)
-        
-        # 7. WMA
-        fig.add_trace(go.Scatter(x=df.index, y=df['wma5'], mode='lines', name='5WMA', line=dict(color='red', width=1.5)), row=7, col=1)
-        fig.add_trace(go.Scatter(x=df.index, y=df['wma10'], mode='lines', name='10WMA', line=dict(color='green', width=1.5)), row=7, col=1)
-        
-        # 更新整體佈局
         fig.update_layout(
-            title=f'{self.stock_name} ({self.stock_id}) 技術分析圖',
             height=1200,
             xaxis_rangeslider_visible=False,
             showlegend=True,
@@ -248,15 +411,64 @@ class TaiwanStockAnalyzer:
             tickformat='%Y-%m-%d'
         )
         # 更新y軸標題
-        fig.update_yaxes(title_text="股價", row=1, col=1)
-        fig.update_yaxes(title_text="成交量", row=2, col=1)
-        fig.update_yaxes(title_text="KD", row=3, col=1)
-        fig.update_yaxes(title_text="乖離(%)", row=4, col=1)
-        fig.update_yaxes(title_text="訊號", row=5, col=1)
-        fig.update_yaxes(title_text="MACD", row=6, col=1)
-        fig.update_yaxes(title_text="WMA", row=7, col=1)
-        
-        return fig
+        for row, title in enumerate(["股價", "成交量", "KD", "乖離(%)", "訊號", "MACD", "WMA"], start=1):
+            fig.update_yaxes(title_text=title, row=row, col=1)
+        _chart_layout = fig.layout.to_plotly_json()
+        # 展開後的預設樣板很大，每次重新驗證成本高；移除後 go.Figure 會自動套用同一個預設樣板
+        _chart_layout.pop('template', None)
+    return _chart_layout
+
+
+def _trace(trace_type: str, row: int, **props) -> dict:
+    """第 row 列子圖的 trace 設定（純 dict，由 go.Figure 一次驗證，比逐一 add_trace 快數倍）。"""
+    suffix = '' if row == 1 else str(row)
+    return dict(type=trace_type, xaxis=f'x{suffix}', yaxis=f'y{suffix}', **props)
+
+
+def build_chart(chart_data: dict) -> go.Figure:
+    """由 TaiwanStockAnalyzer.chart_data() 的精簡陣列建立 7 列的技術分析圖（K 線、成交量、KD、乖離、訊號、MACD、WMA）。"""
+    x = np.asarray(chart_data['dates']).astype('datetime64[D]')
+    # float32 還原後四捨五入，避免滑鼠提示出現 23.450000762939453 這類尾數
+    values = np.round(np.asarray(chart_data['values'], dtype=np.float64), 4)
+    s = dict(zip(CHART_SERIES, values))
+
+    def line(row, name, key, color, width=1):
+        return _trace('scatter', row, x=x, y=s[key], mode='lines', name=name, line=dict(color=color, width=width))
+
+    def markers(row, name, key, color):
+        return _trace('scatter', row, x=x, y=s[key], mode='markers', name=name, marker=dict(color=color, size=8))
+
+    colors = np.where(s['macd_hist'] >= 0, 'red', 'green')  # 正值紅色(多頭)，負值綠色(空頭)
+    data = [
+        # 1. K線圖和均線
+        _trace('candlestick', 1, x=x, open=s['Open'], high=s['High'], low=s['Low'], close=s['Close'], name='K線'),
+        line(1, '週線(5)', 'sma5', 'blue'),
+        line(1, '月線(20)', 'sma20', 'orange'),
+        line(1, '季線(60)', 'sma60', 'red'),
+        # 2. 成交量
+        _trace('bar', 2, x=x, y=chart_data['volume'], name='成交量', marker_color='grey'),
+        # 3. KD指標
+        line(3, 'K值', 'k', 'red'),
+        line(3, 'D值', 'd', 'green'),
+        markers(3, 'KD訊號', 'L_value', 'blue'),
+        # 4. 乖離率
+        line(4, '週-月', 'dev_5_20', 'red'),
+        line(4, '月-季', 'dev_20_60', 'green'),
+        line(4, '週-季', 'dev_5_60', 'orange'),
+        # 5. 訊號
+        _trace('bar', 5, x=x, y=s['I_value'], name='階梯訊號', marker_color='red'),
+        markers(5, '乖離訊號', 'J_value', 'blue'),
+        line(5, '多空訊號', 'K_value', 'orange', width=2),
+        # 6. MACD
+        _trace('bar', 6, x=x, y=s['macd_hist'], name='Histogram', marker_color=colors),
+        line(6, 'MACD', 'macd', 'blue'),
+        line(6, 'Signal', 'macd_signal', 'red'),
+        # 7. WMA
+        line(7, '5WMA', 'wma5', 'red', width=1.5),
+        line(7, '10WMA', 'wma10', 'green', width=1.5),
+    ]
+    layout = dict(_base_chart_layout(), title=dict(text=f"{chart_data['stock_name']} ({chart_data['stock_id']}) 技術分析圖"))
+    return go.Figure(data=data, layout=layout)
 
 
 def _last_valid(arr) -> float | None:
@@ -266,23 +478,36 @@ def _last_valid(arr) -> float | None:
     return float(valid[-1]) if len(valid) > 0 else None
 
 
-def analyze_stock(stock_id: str, days: int = 300) -> dict:
+def analyze_stock(stock_id: str, days: int = 300, with_chart: bool = True, chart_format: str = 'figure') -> dict:
     """
     主函式：分析指定股票並返回包含圖表物件的字典。
+    :param with_chart: False 時只回傳指標快照（k、d、i_value、avg_vol_5），略過 Plotly 圖表建構；
+                       資料不足以繪圖時仍回傳 insufficient_data 錯誤，與完整模式一致。
+    :param chart_format: 'figure' 回傳 chart_figure（Plotly Figure）；'data' 改回傳 chart_data（精簡陣列，
+                         適合放進快取，顯示時再以 build_chart() 重建）
     """
     try:
         analyzer = TaiwanStockAnalyzer(stock_id, days)
         print(f"正在抓取 {stock_id} ({analyzer.stock_name}) 的資料...")
-        analyzer.fetch_data()
+        with instrumentation.timed('price_fetch'):
+            analyzer.fetch_data()
         
         print("計算技術指標中...")
-        analyzer.calculate_indicators()
+        with instrumentation.timed('indicators', engine='single'):
+            analyzer.calculate_indicators()
         
         print("計算交易訊號中...")
-        analyzer.calculate_signals()
+        with instrumentation.timed('signals', engine='single'):
+            analyzer.calculate_signals()
 
-        print(f"產生圖表物件: {stock_id}")
-        chart_figure = analyzer.create_chart()
+        if with_chart and chart_format == 'data':
+            chart_data = analyzer.chart_data()
+        elif with_chart:
+            print(f"產生圖表物件: {stock_id}")
+            with instrumentation.timed('figure_build', chart='technical'):
+                chart_figure = analyzer.create_chart()
+        else:
+            analyzer.check_chart_data()
 
         # 使用 _last_valid 取最後一個非 NaN 值，避免暖機期 NaN 被誤判為有效數值
         last_k = _last_valid(analyzer.indicators.get('k', []))
@@ -290,9 +515,8 @@ def analyze_stock(stock_id: str, days: int = 300) -> dict:
         last_i = _last_valid(analyzer.indicators.get('I_value', []))
         avg_vol_5 = analyzer.price_data['Volume'].iloc[-6:-1].mean()
 
-        return {
+        result = {
             'status': 'success',
-            'chart_figure': chart_figure, # 返回圖表物件，而不是圖片路徑
             'indicators': {
                 'k': last_k,
                 'd': last_d,
@@ -300,6 +524,11 @@ def analyze_stock(stock_id: str, days: int = 300) -> dict:
                 'avg_vol_5': avg_vol_5
             }
         }
+        if with_chart and chart_format == 'data':
+            result['chart_data'] = chart_data
+        elif with_chart:
+            result['chart_figure'] = chart_figure  # 返回圖表物件，而不是圖片路徑
+        return result
 
     except Exception as e:
         error_message = f"分析過程發生錯誤 ({stock_id}): {str(e)}"
@@ -0,0 +1,150 @@
+# stock_index.py (股票代碼/名稱索引：啟動時建立一次，精確查詢用 dict、部分名稱用 n-gram 反向索引並依相關度排序)
+
+import bisect
+import heapq
+import threading
+from typing import Mapping
+
+import twstock
+
+# 證券類別的排序權重：一般股票優先，權證等衍生商品排在最後
+TYPE_PRIORITY = {
+    '股票': 0,
+    'ETF': 1,
+    '創新板': 1,
+    '特別股': 2,
+    'ETN': 2,
+    '臺灣存託憑證(TDR)': 2,
+}
+OTHER_TYPE_PRIORITY = 3
+WARRANT_PRIORITY = 9
+
+# 比對方式的排序權重（數字越小越相關）
+EXACT_CODE, EXACT_NAME, CODE_PREFIX, NAME_PREFIX, NAME_CONTAINS = range(5)
+
+
+def _type_priority(security_type: str) -> int:
+    if '權證' in security_type:
+        return WARRANT_PRIORITY
+    return TYPE_PRIORITY.get(security_type, OTHER_TYPE_PRIORITY)
+
+
+def _ngrams(text: str) -> set[str]:
+    """單字與雙字 n-gram；一個字的查詢用單字索引，兩個字以上用雙字索引。"""
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class StockIndex:
+    """
+    股票代碼與名稱的查詢索引。
+    - 完整代碼、完整名稱：dict 查詢 O(1)。
+    - 代碼前綴：排序後的代碼清單以二分搜尋。
+    - 部分名稱：n-gram 反向索引取交集後再確認子字串，只檢查少量候選而非掃描全部證券。
+    """
+
+    def __init__(self, codes: Mapping) -> None:
+        entries = sorted(
+            ((code, info.name, _type_priority(info.type)) for code, info in codes.items() if info.name),
+            key=lambda e: (e[2], e[0]),
+        )
+        self._entries = entries
+        self._by_code = {code: i for i, (code, _, _) in enumerate(entries)}
+        self._by_name: dict[str, int] = {}
+        for i, (_, name, _) in enumerate(entries):
+            self._by_name.setdefault(name, i)  # 同名時保留類別權重較高者
+        self._sorted_codes = sorted((code, i) for i, (code, _, _) in enumerate(entries))
+
+        postings: dict[str, list[int]] = {}
+        for i, (_, name, _) in enumerate(entries):
+            for gram in _ngrams(name):
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: frozenset(ids) for gram, ids in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _name_matches(self, query: str) -> set[int]:
+        grams = {query} if len(query) == 1 else {query[i:i + 2] for i in range(len(query) - 1)}
+        lists = [self._postings.get(g) for g in grams]
+        if not all(lists):
+            return set()
+        lists.sort(key=len)
+        candidates = set(lists[0]).intersection(*lists[1:])
+        return {i for i in candidates if query in self._entries[i][1]}
+
+    def _code_prefix_matches(self, query: str, limit: int) -> list[int]:
+        start = bisect.bisect_left(self._sorted_codes, (query,))
+        matches = []
+        for code, i in self._sorted_codes[start:]:
+            if not code.startswith(query):
+                break
+            matches.append(i)
+        # 前綴符合的代碼可能很多（例如權證），依類別權重排序後截斷
+        matches.sort(key=lambda i: (self._entries[i][2], self._entries[i][0]))
+        return matches[:limit]
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[str, str]]:
+        """
+        依相關度排序回傳候選股票 [(代碼, 名稱), ...]。
+        排序：完整代碼 > 完整名稱 > 代碼前綴 > 名稱開頭 > 名稱包含；同級再依證券類別、名稱長度（名稱比對時）、代碼。
+        """
+        return [(self._entries[i][0], self._entries[i][1]) for i in self._ranked(query, limit, code_prefix=True)]
+
+    def lookup(self, identifier: str) -> str | None:
+        """
+        將使用者輸入（代碼或名稱）解析為單一股票代碼；無符合時回傳 None。
+        只接受完整代碼、完整名稱與部分名稱，不接受代碼前綴：打錯或打不完整的代碼（例如 233）
+        不會被解析成另一家公司，代碼前綴只用於 search 的自動完成候選。
+        純數字的輸入視為代碼，也不以部分名稱比對（避免 23 比對到名稱含「23」的權證）。
+        """
+        code_like = str(identifier).strip().isdigit()
+        best = self._ranked(identifier, 1, code_prefix=False, name_substring=not code_like)
+        return self._entries[best[0]][0] if best else None
+
+    def _ranked(self, query: str, limit: int, code_prefix: bool, name_substring: bool = True) -> list[int]:
+        query = str(query).strip()
+        if not query:
+            return []
+
+        ranked: dict[int, int] = {}  # entry id → 比對方式
+
+        def add(i: int, kind: int):
+            if i not in ranked or kind < ranked[i]:
+                ranked[i] = kind
+
+        if query in self._by_code:
+            add(self._by_code[query], EXACT_CODE)
+        if query in self._by_name:
+            add(self._by_name[query], EXACT_NAME)
+        if code_prefix:
+            for i in self._code_prefix_matches(query, limit):
+                add(i, CODE_PREFIX)
+        for i in self._name_matches(query) if name_substring else ():
+            add(i, NAME_PREFIX if self._entries[i][1].startswith(query) else NAME_CONTAINS)
+
+        def sort_key(i):
+            code, name, priority = self._entries[i]
+            kind = ranked[i]
+            # 名稱比對時較短的名稱較接近查詢字串；代碼比對則直接依代碼排序
+            return kind, priority, len(name) if kind >= NAME_PREFIX else 0, code
+
+        return heapq.nsmallest(limit, ranked, key=sort_key)
+
+
+_index: StockIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_stock_index() -> StockIndex:
+    """取得行程內共用的索引（第一次呼叫時由 twstock.codes 建立）。"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = StockIndex(twstock.codes)
+    return _index
+
+
+def search_stocks(query: str, limit: int = 10) -> list[tuple[str, str]]:
+    """依相關度排序的候選股票 [(代碼, 名稱), ...]，供側邊欄自動完成使用。"""
+    return get_stock_index().search(query, limit)
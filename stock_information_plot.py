@@ -1,11 +1,13 @@
 import pandas as pd
 import numpy as np
-import os
 import datetime
 import requests
 import twstock
-from bs4 import BeautifulSoup
-from io import StringIO
+
+import html_table
+import http_client
+from stock_index import get_stock_index
+from stock_analyzer import request_finmind_data
 
 # --- 新增 Plotly 相關導入 ---
 import plotly.graph_objects as go
@@ -14,19 +16,13 @@ from plotly.subplots import make_subplots
 
 def get_stock_code(stock_identifier):
     """
-    根據股票代碼或名稱查找股票代碼。(此函式邏輯不變)
+    根據股票代碼或名稱查找股票代碼。
+    使用 stock_index 預先建立的索引：完整代碼/名稱直接查表，部分名稱回傳相關度最高的股票
+    （一般股票優先於權證，較短的名稱優先），不再逐筆掃描 twstock.codes。
+    與原本相同，不完整的代碼（例如 233）不會被解析成其他股票，回傳 None。
     """
     try:
-        identifier_str = str(stock_identifier).strip()
-        if identifier_str in twstock.codes:
-            return identifier_str
-        for code, stock_info in twstock.codes.items():
-            if stock_info.name == identifier_str:
-                return code
-        for code, stock_info in twstock.codes.items():
-            if identifier_str in stock_info.name:
-                return code
-        return None
+        return get_stock_index().lookup(stock_identifier)
     except Exception as e:
         print(f"在 twstock 中查找 '{stock_identifier}' 時發生錯誤: {e}")
         return None
@@ -48,17 +44,15 @@ def plot_stock_major_shareholders(stock_identifier):
 
     try:
         print(f"正在從網路抓取股票 {stock_code} 的大戶持股資料...")
-        res = requests.get(url, headers=headers, timeout=20)
+        res = http_client.get(url, headers=headers, timeout=20)
         res.raise_for_status()
         res.encoding = 'utf-8'
 
-        soup = BeautifulSoup(res.text, 'lxml')
-        table = soup.select_one('#Details')
-        if not table:
+        df = html_table.read_table(res.text, 'Details')
+        if df is None:
             return None, f"錯誤：在股票 {stock_code} 的資料頁面中找不到持股資料表。"
 
         # 資料清理
-        df = pd.read_html(StringIO(str(table)))[0]
 
         # 處理 MultiIndex：攤平為單層
         if isinstance(df.columns, pd.MultiIndex):
@@ -141,19 +135,11 @@ def plot_stock_revenue_trend(stock_identifier):
         return None, f"錯誤: 在 twstock 資料庫中找不到股票 '{stock_identifier}'"
 
     try:
-        # 獲取資料 (與原版相同)
-        finmind_api_token = os.getenv('FINMIND_API_TOKEN')
-        finmind_url = "https://api.finmindtrade.com/api/v4/data"
+        # 獲取資料（經由共用的 FinMind 節流閘門）
         start_date = f"{datetime.date.today().year - 3}-01-01"
         end_date = datetime.date.today().strftime('%Y-%m-%d')
         params = {"dataset": "TaiwanStockMonthRevenue", "data_id": stock_code, "start_date": start_date, "end_date": end_date}
-        headers = {"Authorization": f"Bearer {finmind_api_token}"} if finmind_api_token else {}
-        response = requests.get(finmind_url, params=params, headers=headers, timeout=20)
-        response.raise_for_status()
-        raw_data = response.json()
-        if raw_data.get("status") != 200:
-             raise ValueError(f"FinMind API 錯誤: {raw_data.get('msg', '未知錯誤')}")
-        revenue_df = pd.DataFrame(raw_data.get('data'))
+        revenue_df = pd.DataFrame(request_finmind_data(params))
         if revenue_df.empty:
             raise ValueError("FinMind API 未回傳營收資料。")
 
@@ -3,23 +3,31 @@
 import streamlit as st
 import pandas as pd
 import os
-import re
 from datetime import datetime, time as dtime
 from zoneinfo import ZoneInfo
 import twstock
 import numpy as np
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import plotly.graph_objects as go
 import plotly.express as px
 import plotly.io as pio
 from plotly.subplots import make_subplots
 
+import instrumentation
+
 try:
     from scraper import scrape_goodinfo
     from monthly_revenue_scraper import scrape_goodinfo as scrape_monthly_revenue
-    from yahoo_scraper import scrape_yahoo_stock_rankings
-    from stock_analyzer import analyze_stock
-    from stock_information_plot import plot_stock_revenue_trend, plot_stock_major_shareholders, get_stock_code
+    from yahoo_scraper import scrape_yahoo_stock_rankings, scrape_yahoo_multi_rankings, ranking_url
+    from stock_analyzer import build_chart
+    from bulk_price_loader import prefetch_prices
+    from screening import normalize_stock_codes
+    from swr_cache import swr_cache
+    from memory_cache import get_memory_cache
+    from analysis_cache import (cached_analyze_stock, cached_plot_revenue, cached_plot_shareholders,
+                                analyze_indicators_many)
+    from stock_index import search_stocks
+    from stock_information_plot import get_stock_code
+    from warmup import start_background_warmup
     from concentration_1day import fetch_stock_concentration_data, filter_stock_data
 
 except ImportError as e:
@@ -43,11 +51,19 @@ try:
         os.environ['GOODINFO_COOKIE_MY_STOCK'] = st.secrets['GOODINFO_COOKIE_MY_STOCK']
     if 'GOODINFO_COOKIE_MONTHLY' in st.secrets:
         os.environ['GOODINFO_COOKIE_MONTHLY'] = st.secrets['GOODINFO_COOKIE_MONTHLY']
+    # 多副本部署時的共用快取設定（見 cache_backend.py）與 App 內預熱開關（見 warmup.py）
+    for _cache_key in ('CACHE_BACKEND', 'CACHE_URL', 'WARMUP_IN_APP'):
+        if _cache_key in st.secrets:
+            os.environ[_cache_key] = str(st.secrets[_cache_key])
 except Exception:
     # 本機執行且無 secrets.toml 時，嘗試從環境變數取得
     if not os.getenv('FINMIND_API_TOKEN'):
         st.warning("未設定 FinMind API token（環境變數或 secrets.toml）。部分圖表可能無法生成。")
 
+# 盤前/盤後預熱（見 warmup.py）：設定 WARMUP_IN_APP=1 時在 App 行程內啟動排程執行緒，每個行程只啟動一次
+if os.getenv('WARMUP_IN_APP') == '1':
+    start_background_warmup()
+
 # --------------------------------------------------------------------------------
 # 改善 2：交易時間感知 TTL
 # --------------------------------------------------------------------------------
@@ -65,58 +81,175 @@ def market_ttl(intraday_sec: int, offhours_sec: int = 3600) -> int:
 
 # --------------------------------------------------------------------------------
 # 改善 4：Figure 快取改用 JSON 序列化，大幅降低記憶體佔用
+# （技術分析圖再進一步只快取精簡陣列，見 cached_analyze_stock；營收、大戶圖仍用 JSON）
 # --------------------------------------------------------------------------------
-def _fig_to_cache(fig) -> str | None:
-    """Plotly Figure → JSON 字串，供 st.cache_data 序列化"""
-    return pio.to_json(fig) if fig is not None else None
-
 def _fig_from_cache(json_str: str | None):
     """JSON 字串 → Plotly Figure"""
-    return pio.from_json(json_str) if json_str else None
+    if not json_str:
+        return None
+    with instrumentation.timed('json_deserialize'):
+        return pio.from_json(json_str)
+
+def show_technical_chart(chart_data: dict) -> None:
+    """由快取的精簡陣列重建技術分析圖並顯示，不經過 JSON 編碼/解碼。"""
+    with instrumentation.timed('figure_build', chart='technical'):
+        fig = build_chart(chart_data)
+    with instrumentation.timed('figure_render'):
+        st.plotly_chart(fig, use_container_width=True)
+
+def show_cached_figure(json_str: str | None) -> None:
+    """還原快取中的圖表並顯示；st.plotly_chart 本身也會序列化整張圖，一併計時。"""
+    fig = _fig_from_cache(json_str)
+    with instrumentation.timed('figure_render'):
+        st.plotly_chart(fig, use_container_width=True)
 
 # --------------------------------------------------------------------------------
 # OPTIMIZATION: Cached Data Fetching Functions（動態 TTL 版）
 # --------------------------------------------------------------------------------
-@st.cache_data(ttl=600)
+# 個股分析與圖表快取（cached_analyze_stock 等）定義在 analysis_cache.py，背景預熱工作（warmup.py）也共用同一組函式。
+# 選股清單爬蟲改用 stale-while-revalidate：過期後先顯示舊清單，背景重新爬取，
+# 使用者不必等待 Goodinfo 爬蟲刻意加入的延遲；爬取失敗 (None) 時保留舊清單。
+@swr_cache(ttl=600)
 def cached_scrape_goodinfo():
     return scrape_goodinfo()
 
-@st.cache_data(ttl=1800)
+@swr_cache(ttl=1800)
 def cached_scrape_monthly_revenue():
     return scrape_monthly_revenue()
 
-@st.cache_data(ttl=600)
+@swr_cache(ttl=600)
 def cached_fetch_concentration_data():
     return fetch_stock_concentration_data()
 
-@st.cache_data(ttl=300)  # Yahoo 排行榜：盤中 5 分鐘，但實際 TTL 由呼叫方決定是否重試
+@swr_cache(ttl=300)  # Yahoo 排行榜：盤中 5 分鐘
 def cached_scrape_yahoo_rankings(url):
     return scrape_yahoo_stock_rankings(url)
 
-@st.cache_data(ttl=3600)
-def cached_analyze_stock(stock_id: str) -> dict:
-    """
-    改善 4：回傳值中的 chart_figure 已序列化為 JSON 字串，
-    避免 Plotly Figure 物件佔用大量快取記憶體。
-    """
-    result = analyze_stock(stock_id)
-    if result.get('status') == 'success' and 'chart_figure' in result:
-        result['chart_json'] = _fig_to_cache(result.pop('chart_figure'))
-    return result
-
-@st.cache_data(ttl=86400)
-def cached_plot_revenue(stock_id: str):
-    fig, err = plot_stock_revenue_trend(stock_id)
-    return _fig_to_cache(fig), err
+@swr_cache(ttl=300)
+def cached_scrape_yahoo_multi_rankings():
+    return scrape_yahoo_multi_rankings()
 
-@st.cache_data(ttl=86400)
-def cached_plot_shareholders(stock_id: str):
-    fig, err = plot_stock_major_shareholders(stock_id)
-    return _fig_to_cache(fig), err
+def show_data_age(cached_func, *args):
+    """在選股結果上方顯示清單資料的時間；背景更新中時一併提示。"""
+    age = cached_func.age(*args)
+    if age is None:
+        return
+    minutes = int(age // 60)
+    age_text = "剛剛更新" if minutes == 0 else f"{minutes} 分鐘前更新"
+    if cached_func.is_refreshing(*args):
+        age_text += "（背景更新中，重新整理後顯示最新資料）"
+    st.caption(f"🕒 清單資料：{age_text}")
 
 # --------------------------------------------------------------------------------
 # 輔助函式
 # --------------------------------------------------------------------------------
+# st.fragment 於 1.37 正式提供（1.33~1.36 為 experimental_fragment）；舊版則退回整頁重跑
+_fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
+
+def render_stock_chart(stock_code: str, stock_name: str, indicator_result: dict | None = None):
+    """
+    顯示單檔股票的技術分析圖，圖表在此時才建立（或從快取取出）。
+    指標階段已失敗的股票直接顯示錯誤，不再重跑完整分析。
+    """
+    if indicator_result is not None and indicator_result.get('status') != 'success':
+        show_analysis_error(stock_name, indicator_result)
+        return
+    analysis_result = cached_analyze_stock(stock_code)
+    if analysis_result['status'] == 'success':
+        show_technical_chart(analysis_result['chart_data'])
+    else:
+        show_analysis_error(stock_name, analysis_result)
+
+@_fragment
+def display_chart_panel(stocks: list, key: str):
+    """
+    單一圖表面板：使用者選擇股票後才建立（或從快取取出）並傳送該檔的技術分析圖，
+    取代每檔股票各一個 expander 的做法，頁面只需負擔實際查看的圖表。
+    以 fragment 執行時，切換股票只重跑此面板，不會重跑整頁的爬蟲與分析。
+    :param stocks: [(代碼, 名稱, 指標階段結果或 None), ...]
+    """
+    labels = [f"{name} ({code})" for code, name, _ in stocks]
+    selected = st.selectbox(
+        "選擇要查看技術分析圖的股票", labels,
+        index=None, placeholder="請選擇股票...", key=key
+    )
+    if selected is None:
+        st.caption(f"共 {len(stocks)} 檔股票，選擇後才載入圖表。")
+        return
+    stock_code, stock_name, indicator_result = stocks[labels.index(selected)]
+    render_stock_chart(stock_code, stock_name, indicator_result)
+
+
+def prefetch_screen_prices(stock_codes) -> None:
+    """
+    逐檔分析前，先以全市場查詢批次補齊本地價格資料庫，
+    讓 N 檔股票的 FinMind 請求數降為 O(日期數)。失敗時靜默退回逐檔抓取。
+    """
+    try:
+        stats = prefetch_prices(normalize_stock_codes(stock_codes))
+        print(f"批次預載股價：{stats}")
+    except Exception as e:
+        print(f"批次預載股價失敗，改由逐檔抓取: {e}")
+
+
+def analyze_screen_stocks(stock_codes) -> dict:
+    """
+    四個選股畫面共用：批次預載股價後計算每檔股票的指標快照並顯示進度條；
+    本地日線已是最新的股票以面板一次向量化計算，其餘逐檔分析（見 analysis_cache.analyze_indicators_many）。
+    :return: {股票代碼: cached_analyze_indicators 格式的結果}，重複與空白代碼只分析一次
+    """
+    prefetch_screen_prices(stock_codes)
+    progress_bar = st.progress(0, text="分析進度")
+
+    def _on_progress(done: int, total: int, stock_code: str):
+        progress_bar.progress(done / total, text=f"已完成 {done}/{total}：{stock_code}")
+
+    results = analyze_indicators_many(stock_codes, on_progress=_on_progress)
+    progress_bar.empty()
+    return results
+
+
+INDICATOR_COLUMNS = ['K', 'D', 'I值', '5日均量(張)', '分析狀態']
+
+# 指標欄位保持數值型態，只在顯示時格式化，st.dataframe 的排序與篩選皆以數值進行
+INDICATOR_COLUMN_CONFIG = {
+    'K': st.column_config.NumberColumn(format="%.2f"),
+    'D': st.column_config.NumberColumn(format="%.2f"),
+    'I值': st.column_config.NumberColumn(format="%d"),
+    '5日均量(張)': st.column_config.NumberColumn(format="%d"),
+    '分析狀態': st.column_config.TextColumn(),
+}
+
+
+def indicator_columns(stock_codes, results: dict) -> pd.DataFrame:
+    """
+    依股票順序產生 K、D、I值、5日均量(張)（float，缺值為 NaN）與分析狀態欄位，
+    回傳的 index 與 stock_codes 相同，可直接指派到選股結果表格。
+    """
+    codes = pd.Series(stock_codes)
+    rows = []
+    for code in codes:
+        result = results.get(str(code).strip())
+        if result is None:
+            rows.append((np.nan, np.nan, np.nan, np.nan, '無代碼'))
+        elif result['status'] == 'success':
+            indicators = result.get('indicators', {})
+            avg_vol_5 = indicators.get('avg_vol_5')
+            rows.append((
+                indicators.get('k'),
+                indicators.get('d'),
+                indicators.get('i_value'),
+                avg_vol_5 / 1000 if avg_vol_5 is not None else None,
+                '正常',
+            ))
+        else:
+            rows.append((np.nan, np.nan, np.nan, np.nan, '錯誤'))
+    columns = pd.DataFrame(rows, columns=INDICATOR_COLUMNS, index=codes.index)
+    numeric = INDICATOR_COLUMNS[:-1]
+    columns[numeric] = columns[numeric].astype(float)
+    return columns
+
 def show_analysis_error(stock_name: str, result: dict):
     """改善 5：根據 error_type 顯示具體的錯誤提示，取代通用錯誤訊息。"""
     error_type = result.get('error_type', 'unknown')
@@ -159,44 +292,30 @@ def process_ranking_analysis(stock_df: pd.DataFrame) -> list:
             return []
 
         st.info(f"初步篩選後有 {len(filtered_df)} 檔股票，開始進行併發分析...")
-        progress_bar = st.progress(0)
-        total_stocks = len(filtered_df)
-        
-        with ThreadPoolExecutor(max_workers=4) as executor:  # 降低併發數，避免觸發 FinMind Rate Limit
-            future_to_stock = {
-                executor.submit(cached_analyze_stock, str(stock_info['Stock Symbol']).strip()): stock_info
-                for stock_info in filtered_df.to_dict('records')
-            }
-            
-            for i, future in enumerate(as_completed(future_to_stock)):
-                stock_info = future_to_stock[future]
-                result_item = {'stock_info': stock_info}
-                try:
-                    analysis_result = future.result()
-                    if analysis_result['status'] == 'success':
-                        indicators = analysis_result.get('indicators', {})
-                        avg_vol_5_lots = indicators.get('avg_vol_5', 0) / 1000 if indicators.get('avg_vol_5') else 0
-                        estimated_volume_lots = stock_info.get('Estimated Volume', 0)
-
-                        if pd.notna(estimated_volume_lots) and pd.notna(avg_vol_5_lots) and avg_vol_5_lots > 0 and estimated_volume_lots > (vol_ratio * avg_vol_5_lots):
-                            result_item.update({
-                                'error': None,
-                                'chart_json': analysis_result.get('chart_json'),
-                                'indicators': indicators,
-                                'estimated_volume_lots': estimated_volume_lots,
-                                'avg_vol_5_lots': avg_vol_5_lots
-                            })
-                            results_list.append(result_item)
-                    else:
-                        result_item['error'] = analysis_result.get('message', '未知錯誤')
-                        results_list.append(result_item)
+        analysis_results = analyze_screen_stocks(filtered_df['Stock Symbol'])
 
-                except Exception as exc:
-                    result_item['error'] = f"分析時發生例外: {exc}"
+        for stock_info in filtered_df.to_dict('records'):
+            result_item = {'stock_info': stock_info}
+            analysis_result = analysis_results.get(str(stock_info['Stock Symbol']).strip())
+            if analysis_result is None:
+                continue
+            if analysis_result['status'] == 'success':
+                indicators = analysis_result.get('indicators', {})
+                avg_vol_5_lots = indicators.get('avg_vol_5', 0) / 1000 if indicators.get('avg_vol_5') else 0
+                estimated_volume_lots = stock_info.get('Estimated Volume', 0)
+
+                if pd.notna(estimated_volume_lots) and pd.notna(avg_vol_5_lots) and avg_vol_5_lots > 0 and estimated_volume_lots > (vol_ratio * avg_vol_5_lots):
+                    result_item.update({
+                        'error': None,
+                        'indicators': indicators,
+                        'estimated_volume_lots': estimated_volume_lots,
+                        'avg_vol_5_lots': avg_vol_5_lots
+                    })
                     results_list.append(result_item)
-                
-                progress_bar.progress((i + 1) / total_stocks)
-        
+            else:
+                result_item['error'] = analysis_result.get('message', '未知錯誤')
+                results_list.append(result_item)
+
         if not any(not r.get('error') for r in results_list):
             st.info("分析完成。沒有任何股票通過最終篩選條件。")
 
@@ -223,32 +342,6 @@ def display_concentration_visualization(df: pd.DataFrame):
 
     viz_df = df.copy()
 
-    # --- 解析輔助欄位 ---
-    def parse_k(kd_str):
-        try:
-            m = re.search(r'K:([\d.]+)', str(kd_str))
-            return float(m.group(1)) if m else None
-        except Exception:
-            return None
-
-    def parse_d(kd_str):
-        try:
-            m = re.search(r'D:([\d.]+)', str(kd_str))
-            return float(m.group(1)) if m else None
-        except Exception:
-            return None
-
-    def parse_i(i_str):
-        try:
-            v = str(i_str).strip()
-            return float(v) if v not in ('N/A', '錯誤', 'nan', '') else None
-        except Exception:
-            return None
-
-    viz_df['_K'] = viz_df['KD'].apply(parse_k)
-    viz_df['_D'] = viz_df['KD'].apply(parse_d)
-    viz_df['_I'] = viz_df['I值'].apply(parse_i)
-
     # 轉型數值欄位
     conc_cols = ['1日集中度', '5日集中度', '10日集中度', '20日集中度', '60日集中度', '120日集中度']
     vol_col = '10日均量'
@@ -280,7 +373,7 @@ def display_concentration_visualization(df: pd.DataFrame):
 
     # --- Tabs ---
     tab_defs = []
-    if viz_df['_K'].notna().any():
+    if viz_df['K'].notna().any():
         tab_defs.append(("📈 K/D 散佈圖", "kd"))
     if '1日集中度' in viz_df.columns:
         tab_defs.append(("🎯 四象限分析", "quad"))
@@ -296,7 +389,7 @@ def display_concentration_visualization(df: pd.DataFrame):
 
             # ── K/D 散佈圖 ───────────────────────────────────
             if tab_type == "kd":
-                sc = viz_df[viz_df['_K'].notna()].copy()
+                sc = viz_df[viz_df['K'].notna()].copy()
 
                 # 泡泡大小依 1日集中度絕對值縮放
                 if '1日集中度' in sc.columns and not sc['1日集中度'].isna().all():
@@ -309,12 +402,12 @@ def display_concentration_visualization(df: pd.DataFrame):
                 fig_kd = go.Figure()
 
                 for i_val, color in i_colors.items():
-                    sub = sc[sc['_I'] == i_val]
+                    sub = sc[sc['I值'] == i_val]
                     if sub.empty:
                         continue
                     y_vals = sub[vol_col] if vol_col in sub.columns else pd.Series([0] * len(sub))
                     fig_kd.add_trace(go.Scatter(
-                        x=sub['_K'],
+                        x=sub['K'],
                         y=y_vals,
                         mode='markers+text',
                         name=f'I={i_val}',
@@ -334,11 +427,11 @@ def display_concentration_visualization(df: pd.DataFrame):
                     ))
 
                 # 未分類
-                others = sc[~sc['_I'].isin([-3, 1, 2, 3])]
+                others = sc[~sc['I值'].isin([-3, 1, 2, 3])]
                 if not others.empty:
                     y_vals = others[vol_col] if vol_col in others.columns else pd.Series([0] * len(others))
                     fig_kd.add_trace(go.Scatter(
-                        x=others['_K'], y=y_vals,
+                        x=others['K'], y=y_vals,
                         mode='markers', name='其他',
                         marker=dict(color='#9ca3af', size=10, opacity=0.5),
                         text=others[name_col],
@@ -370,11 +463,11 @@ def display_concentration_visualization(df: pd.DataFrame):
                     3:  ("多頭上漲 (I=3)",  "#ef4444"),
                 }
 
-                sc2 = viz_df[viz_df['_K'].notna() & viz_df['1日集中度'].notna()].copy()
+                sc2 = viz_df[viz_df['K'].notna() & viz_df['1日集中度'].notna()].copy()
                 max_vol_g = sc2[vol_col].max() if vol_col in sc2.columns and not sc2[vol_col].isna().all() else 1
 
                 titles = [
-                    f"{name} ({len(sc2[sc2['_I']==i_val])}檔)"
+                    f"{name} ({len(sc2[sc2['I值']==i_val])}檔)"
                     for i_val, (name, _) in i_config.items()
                 ]
                 fig_quad = make_subplots(
@@ -387,7 +480,7 @@ def display_concentration_visualization(df: pd.DataFrame):
                 for (i_val, (name, color)), (row, col) in zip(
                     i_config.items(), [(1, 1), (1, 2), (2, 1), (2, 2)]
                 ):
-                    sub = sc2[sc2['_I'] == i_val]
+                    sub = sc2[sc2['I值'] == i_val]
                     if sub.empty:
                         continue
 
@@ -398,7 +491,7 @@ def display_concentration_visualization(df: pd.DataFrame):
 
                     fig_quad.add_trace(
                         go.Scatter(
-                            x=sub['_K'],
+                            x=sub['K'],
                             y=sub['1日集中度'],
                             mode='markers+text',
                             name=name,
@@ -481,6 +574,7 @@ def display_concentration_results():
     with st.spinner("正在獲取並篩選籌碼集中度資料..."):
         stock_data = cached_fetch_concentration_data()
         if stock_data is not None:
+            show_data_age(cached_fetch_concentration_data)
             _conc_params  = st.session_state.get('filter_params', {})
             _min_vol_conc = _conc_params.get('min_vol_conc', 2000)
             filtered_stocks = filter_stock_data(stock_data, min_volume=_min_vol_conc)
@@ -488,39 +582,8 @@ def display_concentration_results():
             if filtered_stocks is not None and not filtered_stocks.empty:
                 st.success(f"找到 {len(filtered_stocks)} 檔符合條件的股票，正在進行技術指標分析...")
                 
-                k_values = []
-                d_values = []
-                i_values = []
-                
-                progress_bar = st.progress(0, text="分析進度")
-                total_stocks = len(filtered_stocks)
-
-                concentration_cache = {}  # 避免 expander 重複呼叫
-                for i, stock_row in enumerate(filtered_stocks.itertuples()):
-                    stock_code = str(stock_row.代碼)
-                    analysis_result = cached_analyze_stock(stock_code)
-                    concentration_cache[stock_code] = analysis_result
-                    
-                    if analysis_result['status'] == 'success':
-                        indicators = analysis_result.get('indicators', {})
-                        k_val = indicators.get('k')
-                        d_val = indicators.get('d')
-                        i_val = indicators.get('i_value')
-                        
-                        k_values.append(f"{k_val:.2f}" if k_val is not None else "N/A")
-                        d_values.append(f"{d_val:.2f}" if d_val is not None else "N/A")
-                        i_values.append(i_val if i_val is not None else "N/A")
-                    else:
-                        k_values.append("錯誤")
-                        d_values.append("錯誤")
-                        i_values.append("錯誤")
-                    
-                    progress_bar.progress((i + 1) / total_stocks, text=f"正在分析: {stock_code}")
-                
-                progress_bar.empty()
-
-                filtered_stocks['KD'] = [f"K:{k} D:{d}" for k, d in zip(k_values, d_values)]
-                filtered_stocks['I值'] = i_values
+                concentration_cache = analyze_screen_stocks(filtered_stocks['代碼'])
+                filtered_stocks[INDICATOR_COLUMNS] = indicator_columns(filtered_stocks['代碼'], concentration_cache)
 
                 st.info(
                     f"**篩選條件：**\n"
@@ -531,26 +594,22 @@ def display_concentration_results():
                 )
 
                 display_columns = [
-                    '編號', '代碼', '股票名稱', 'KD', 'I值', '1日集中度', '5日集中度',
-                    '10日集中度', '20日集中度', '60日集中度', '120日集中度', '10日均量'
+                    '編號', '代碼', '股票名稱', 'K', 'D', 'I值', '1日集中度', '5日集中度',
+                    '10日集中度', '20日集中度', '60日集中度', '120日集中度', '10日均量', '分析狀態'
                 ]
                 final_display_columns = [col for col in display_columns if col in filtered_stocks.columns]
-                st.dataframe(filtered_stocks[final_display_columns])
+                st.dataframe(filtered_stocks[final_display_columns], column_config=INDICATOR_COLUMN_CONFIG)
 
                 # ── 整合遠端視覺化服務：直接在本地產生統計卡片與圖表 ──
                 display_concentration_visualization(filtered_stocks)
 
                 st.markdown("---")
                 st.subheader("🔍 個股技術分析圖")
-                for _, stock in filtered_stocks.iterrows():
-                    stock_code = str(stock['代碼'])
-                    stock_name = stock['股票名稱']
-                    with st.expander(f"查看 {stock_name} ({stock_code}) 的技術分析圖"):
-                        analysis_result = concentration_cache.get(stock_code) or cached_analyze_stock(stock_code)
-                        if analysis_result['status'] == 'success':
-                            st.plotly_chart(_fig_from_cache(analysis_result['chart_json']), use_container_width=True)
-                        else:
-                            show_analysis_error(stock_name, analysis_result)
+                display_chart_panel(
+                    [(str(code), name, concentration_cache.get(str(code)))
+                     for code, name in zip(filtered_stocks['代碼'], filtered_stocks['股票名稱'])],
+                    key="chart_panel_concentration"
+                )
             else:
                 st.warning("沒有找到或篩選出符合條件的股票。")
         else:
@@ -563,47 +622,11 @@ def display_goodinfo_results():
         scraped_df = cached_scrape_goodinfo()
     
     if scraped_df is not None and not scraped_df.empty:
+        show_data_age(cached_scrape_goodinfo)
         st.success(f"成功爬取到 {len(scraped_df)} 筆資料，正在進行技術指標分析...")
 
-        k_values = []
-        d_values = []
-        i_values = []
-        analysis_cache = {}  # 快取本次分析結果，避免 expander 展開時重複呼叫 API
-        
-        progress_bar = st.progress(0, text="分析進度")
-        total_stocks = len(scraped_df)
-
-        for i, stock_row in enumerate(scraped_df.itertuples()):
-            stock_code = str(stock_row.代碼).strip()
-            if not stock_code or stock_code == 'nan':
-                k_values.append("N/A")
-                d_values.append("N/A")
-                i_values.append("N/A")
-                continue
-
-            analysis_result = cached_analyze_stock(stock_code)
-            analysis_cache[stock_code] = analysis_result  # 存入本地快取
-            
-            if analysis_result['status'] == 'success':
-                indicators = analysis_result.get('indicators', {})
-                k_val = indicators.get('k')
-                d_val = indicators.get('d')
-                i_val = indicators.get('i_value')
-                
-                k_values.append(f"{k_val:.2f}" if k_val is not None else "N/A")
-                d_values.append(f"{d_val:.2f}" if d_val is not None else "N/A")
-                i_values.append(i_val if i_val is not None else "N/A")
-            else:
-                k_values.append("錯誤")
-                d_values.append("錯誤")
-                i_values.append("錯誤")
-            
-            progress_bar.progress((i + 1) / total_stocks, text=f"正在分析: {stock_code}")
-
-        progress_bar.empty()
-
-        scraped_df['KD'] = [f"K:{k} D:{d}" for k, d in zip(k_values, d_values)]
-        scraped_df['I值'] = i_values
+        analysis_cache = analyze_screen_stocks(scraped_df['代碼'])
+        scraped_df[INDICATOR_COLUMNS] = indicator_columns(scraped_df['代碼'], analysis_cache)
 
         st.info("""
         **篩選條件 (來自 Goodinfo 自訂篩選):**
@@ -618,24 +641,20 @@ def display_goodinfo_results():
         """)
 
         display_columns = [
-            '代碼', '名稱', 'KD', 'I值', '市場', '股價日期',
-            '成交', '漲跌價', '漲跌幅', '成交張數'
+            '代碼', '名稱', 'K', 'D', 'I值', '市場', '股價日期',
+            '成交', '漲跌價', '漲跌幅', '成交張數', '5日均量(張)', '分析狀態'
         ]
         final_display_columns = [col for col in display_columns if col in scraped_df.columns]
-        st.dataframe(scraped_df[final_display_columns])
-        
-        for _, stock in scraped_df.iterrows():
-            stock_code = str(stock['代碼']).strip()
-            stock_name = str(stock['名稱']).strip()
-            if not stock_code or stock_code == 'nan': continue
-            
-            with st.expander(f"查看 {stock_name} ({stock_code}) 的技術分析圖"):
-                # 直接讀本地快取，不重複呼叫 API
-                analysis_result = analysis_cache.get(stock_code) or cached_analyze_stock(stock_code)
-                if analysis_result['status'] == 'success':
-                    st.plotly_chart(_fig_from_cache(analysis_result['chart_json']), use_container_width=True)
-                else:
-                    show_analysis_error(stock_name, analysis_result)
+        st.dataframe(scraped_df[final_display_columns], column_config=INDICATOR_COLUMN_CONFIG)
+
+        st.markdown("---")
+        st.subheader("🔍 個股技術分析圖")
+        chart_stocks = [
+            (code, name, analysis_cache.get(code))
+            for code, name in zip(scraped_df['代碼'].astype(str).str.strip(), scraped_df['名稱'].astype(str).str.strip())
+            if code and code != 'nan'
+        ]
+        display_chart_panel(chart_stocks, key="chart_panel_goodinfo")
     else:
         st.warning("未爬取到任何資料。請檢查 Cookie 是否有效。")
 
@@ -699,25 +718,6 @@ def display_monthly_revenue_visualization(df: pd.DataFrame):
 
     viz_df = df.copy()
 
-    # --- 解析 K 值 (從 "K:XX.XX D:XX.XX" 格式) ---
-    def parse_k(kd_str):
-        try:
-            m = re.search(r'K:([\d.]+)', str(kd_str))
-            return float(m.group(1)) if m else None
-        except Exception:
-            return None
-
-    # --- 解析 I 值 ---
-    def parse_i(i_str):
-        try:
-            v = str(i_str).strip()
-            return float(v) if v not in ('N/A', '錯誤', 'nan', '') else None
-        except Exception:
-            return None
-
-    viz_df['_K值'] = viz_df['KD'].apply(parse_k)
-    viz_df['_I值'] = viz_df['I值'].apply(parse_i)
-
     # --- 終極精準版：年增與月增都強制要求包含 '%' 符號，並排除干擾欄位 ---
     yoy_col = None
     mom_col = None
@@ -778,7 +778,7 @@ def display_monthly_revenue_visualization(df: pd.DataFrame):
 
     # --- 若未偵測到關鍵欄位，顯示可用欄位清單並返回 ---
     if not yoy_col and not mom_col:
-        skip_cols = {'代碼', '名稱', 'KD', 'I值', '_K值', '_I值'}
+        skip_cols = {'代碼', '名稱', *INDICATOR_COLUMNS}
         available = [c for c in viz_df.columns if c not in skip_cols]
         st.warning(
             f"⚠️ 未偵測到年增率／月增率欄位，無法繪製圖表。\n\n"
@@ -792,7 +792,7 @@ def display_monthly_revenue_visualization(df: pd.DataFrame):
         tab_defs.append(("📊 年增率 Top10", "yoy"))
     if mom_col and n > 0 and not viz_filtered[mom_col].isna().all():
         tab_defs.append(("📊 月增率 Top10", "mom"))
-    if viz_filtered['_K值'].notna().any() and yoy_col:
+    if viz_filtered['K'].notna().any() and yoy_col:
         tab_defs.append(("🎯 四象限分析", "quad"))
 
     if not tab_defs:
@@ -846,13 +846,13 @@ def display_monthly_revenue_visualization(df: pd.DataFrame):
                 }
 
                 scatter_df = viz_filtered[
-                    viz_filtered['_K值'].notna() & viz_filtered[yoy_col].notna()
+                    viz_filtered['K'].notna() & viz_filtered[yoy_col].notna()
                 ].copy()
 
                 fig_q = go.Figure()
 
                 for i_val, (name, color) in i_config.items():
-                    sub = scatter_df[scatter_df['_I值'] == i_val]
+                    sub = scatter_df[scatter_df['I值'] == i_val]
                     if sub.empty:
                         continue
 
@@ -864,7 +864,7 @@ def display_monthly_revenue_visualization(df: pd.DataFrame):
                         sizes = 14
 
                     fig_q.add_trace(go.Scatter(
-                        x=sub['_K值'],
+                        x=sub['K'],
                         y=sub[yoy_col],
                         mode='markers+text',
                         name=name,
@@ -884,10 +884,10 @@ def display_monthly_revenue_visualization(df: pd.DataFrame):
                     ))
 
                 # 未分類股票（I值不在 {-3,1,2,3}）
-                others = scatter_df[~scatter_df['_I值'].isin([-3, 1, 2, 3])]
+                others = scatter_df[~scatter_df['I值'].isin([-3, 1, 2, 3])]
                 if not others.empty:
                     fig_q.add_trace(go.Scatter(
-                        x=others['_K值'],
+                        x=others['K'],
                         y=others[yoy_col],
                         mode='markers',
                         name='其他',
@@ -938,47 +938,11 @@ def display_monthly_revenue_results():
         scraped_df = cached_scrape_monthly_revenue()
 
     if scraped_df is not None and not scraped_df.empty:
+        show_data_age(cached_scrape_monthly_revenue)
         st.success(f"成功爬取到 {len(scraped_df)} 筆資料，正在進行技術指標分析...")
 
-        k_values = []
-        d_values = []
-        i_values = []
-
-        progress_bar = st.progress(0, text="分析進度")
-        total_stocks = len(scraped_df)
-
-        revenue_cache = {}  # 避免 expander 重複呼叫 API
-        for i, stock_row in enumerate(scraped_df.itertuples()):
-            stock_code = str(stock_row.代碼).strip()
-            if not stock_code or stock_code == 'nan':
-                k_values.append("N/A")
-                d_values.append("N/A")
-                i_values.append("N/A")
-                continue
-
-            analysis_result = cached_analyze_stock(stock_code)
-            revenue_cache[stock_code] = analysis_result
-
-            if analysis_result['status'] == 'success':
-                indicators = analysis_result.get('indicators', {})
-                k_val = indicators.get('k')
-                d_val = indicators.get('d')
-                i_val = indicators.get('i_value')
-
-                k_values.append(f"{k_val:.2f}" if k_val is not None else "N/A")
-                d_values.append(f"{d_val:.2f}" if d_val is not None else "N/A")
-                i_values.append(i_val if i_val is not None else "N/A")
-            else:
-                k_values.append("錯誤")
-                d_values.append("錯誤")
-                i_values.append("錯誤")
-
-            progress_bar.progress((i + 1) / total_stocks, text=f"正在分析: {stock_code}")
-
-        progress_bar.empty()
-
-        scraped_df['KD'] = [f"K:{k} D:{d}" for k, d in zip(k_values, d_values)]
-        scraped_df['I值'] = i_values
+        revenue_cache = analyze_screen_stocks(scraped_df['代碼'])
+        scraped_df[INDICATOR_COLUMNS] = indicator_columns(scraped_df['代碼'], revenue_cache)
 
         st.info("""
         **篩選條件 (來自 Goodinfo 月營收自訂篩選):**
@@ -993,29 +957,24 @@ def display_monthly_revenue_results():
         all_cols = scraped_df.columns.tolist()
         try:
             name_idx = all_cols.index('名稱')
-            new_cols = all_cols[:name_idx+1] + ['KD', 'I值'] + [c for c in all_cols[name_idx+1:] if c not in ['KD', 'I值']]
+            new_cols = all_cols[:name_idx+1] + INDICATOR_COLUMNS + [c for c in all_cols[name_idx+1:] if c not in INDICATOR_COLUMNS]
             scraped_df = scraped_df[new_cols]
         except ValueError:
-            scraped_df = scraped_df[['代碼', '名稱', 'KD', 'I值'] + [c for c in all_cols if c not in ['代碼', '名稱', 'KD', 'I值']]]
+            scraped_df = scraped_df[['代碼', '名稱'] + INDICATOR_COLUMNS + [c for c in all_cols if c not in ['代碼', '名稱'] + INDICATOR_COLUMNS]]
         
-        st.dataframe(scraped_df)
+        st.dataframe(scraped_df, column_config=INDICATOR_COLUMN_CONFIG)
 
         # ── 整合遠端視覺化服務：直接在本地產生統計卡片與圖表 ──
         display_monthly_revenue_visualization(scraped_df)
 
         st.markdown("---")
         st.subheader("🔍 個股技術分析圖")
-        for _, stock in scraped_df.iterrows():
-            stock_code = str(stock['代碼']).strip()
-            stock_name = str(stock['名稱']).strip()
-            if not stock_code or stock_code == 'nan': continue
-
-            with st.expander(f"查看 {stock_name} ({stock_code}) 的技術分析圖"):
-                analysis_result = revenue_cache.get(stock_code) or cached_analyze_stock(stock_code)
-                if analysis_result['status'] == 'success':
-                    st.plotly_chart(_fig_from_cache(analysis_result['chart_json']), use_container_width=True)
-                else:
-                    show_analysis_error(stock_name, analysis_result)
+        chart_stocks = [
+            (code, name, revenue_cache.get(code))
+            for code, name in zip(scraped_df['代碼'].astype(str).str.strip(), scraped_df['名稱'].astype(str).str.strip())
+            if code and code != 'nan'
+        ]
+        display_chart_panel(chart_stocks, key="chart_panel_monthly_revenue")
     else:
         st.warning("未爬取到任何月營收資料。請檢查 Cookie 是否有效。")
 
@@ -1034,17 +993,10 @@ def display_ranking_visualization(summary_df: pd.DataFrame):
     viz_df = summary_df.copy()
 
     # --- 數值轉型 ---
-    for col in ['K', 'D', '因子', '漲跌幅(%)', '成交價', '預估量(張)', '5日均量(張)']:
+    for col in ['因子', '漲跌幅(%)', '成交價', '預估量(張)', '5日均量(張)']:
         if col in viz_df.columns:
             viz_df[col] = pd.to_numeric(viz_df[col], errors='coerce')
-
-    def parse_i(v):
-        try:
-            return float(str(v).strip()) if str(v).strip() not in ('N/A', '錯誤', 'nan', '') else None
-        except Exception:
-            return None
-
-    viz_df['_I'] = viz_df['I訊號'].apply(parse_i)
+    viz_df['_I'] = viz_df['I訊號']
 
     # 量比：直接用 預估量÷5日均量 計算，避免「因子」欄位預設值 1.0 導致泡泡等大
     if '預估量(張)' in viz_df.columns and '5日均量(張)' in viz_df.columns:
@@ -1258,12 +1210,25 @@ def display_ranking_visualization(summary_df: pd.DataFrame):
 
 
 def display_ranking_results(market_type: str):
-    st.header(f"🚀 漲幅排行榜 ({market_type})")
+    """market_type 為 "上市"、"上櫃"（漲幅榜），或 "多榜單"（漲幅/成交量/成交值 × 上市/上櫃 合併去重）。"""
+    combined = market_type == "多榜單"
+    if combined:
+        st.header("🚀 盤中多榜單合併 (上市＋上櫃：漲幅、成交量、成交值)")
+    else:
+        st.header(f"🚀 漲幅排行榜 ({market_type})")
     st.info("篩選條件：\n1. 成交價 > 35元\n2. 漲跌幅 > 2%\n3. 預估成交量 > 2 倍前5日均量")
     
-    url = "https://tw.stock.yahoo.com/rank/change-up?exchange=TAI" if market_type == "上市" else "https://tw.stock.yahoo.com/rank/change-up?exchange=TWO"
-    with st.spinner(f"正在爬取 Yahoo Finance ({market_type}) 的資料..."):
-        stock_df = cached_scrape_yahoo_rankings(url)
+    if combined:
+        with st.spinner("正在同時爬取 Yahoo Finance 上市、上櫃的多個排行榜..."):
+            stock_df = cached_scrape_yahoo_multi_rankings()
+        if stock_df is not None:
+            show_data_age(cached_scrape_yahoo_multi_rankings)
+    else:
+        url = ranking_url('change-up', 'TAI' if market_type == "上市" else 'TWO')
+        with st.spinner(f"正在爬取 Yahoo Finance ({market_type}) 的資料..."):
+            stock_df = cached_scrape_yahoo_rankings(url)
+        if stock_df is not None:
+            show_data_age(cached_scrape_yahoo_rankings, url)
     
     yahoo_results = process_ranking_analysis(stock_df)
 
@@ -1276,13 +1241,6 @@ def display_ranking_results(market_type: str):
                 stock_info = result['stock_info']
                 indicators = result.get('indicators', {})
                 
-                k_val = f"{indicators.get('k'):.2f}" if indicators.get('k') is not None else "N/A"
-                d_val = f"{indicators.get('d'):.2f}" if indicators.get('d') is not None else "N/A"
-                
-                i_val = indicators.get('i_value')
-                # 這裡只儲存純文字值，不加入HTML標籤，以便 CSV 下載正確資料
-                i_text = str(i_val) if i_val is not None else "N/A"
-
                 display_data.append({
                     "排名": stock_info.get('Rank', ''),
                     "代碼": stock_info.get('Stock Symbol', ''),
@@ -1292,29 +1250,30 @@ def display_ranking_results(market_type: str):
                     "預估量(張)": int(result.get('estimated_volume_lots', 0)),
                     "5日均量(張)": int(result.get('avg_vol_5_lots', 0)),
                     "因子": round(stock_info.get('Factor', 1.0), 2),
-                    "K": k_val,
-                    "D": d_val,
-                    "I訊號": i_text
+                    # 指標維持數值（缺值為 NaN），顯示格式交給 column_config
+                    "K": indicators.get('k'),
+                    "D": indicators.get('d'),
+                    "I訊號": indicators.get('i_value'),
                 })
+                if combined:
+                    display_data[-1]["市場"] = stock_info.get('Exchange', '')
+                    display_data[-1]["來源榜單"] = stock_info.get('Sources', '')
         
         if not display_data:
              st.warning("所有符合條件的股票在後續分析中被過濾，無最終結果可顯示。")
         else:
             summary_df = pd.DataFrame(display_data)
+            summary_df[['K', 'D', 'I訊號']] = summary_df[['K', 'D', 'I訊號']].astype(float)
 
             # 定義樣式函式：僅用於顯示顏色
             def highlight_signal(val):
-                if val == "N/A":
-                    return ''
-                try:
-                    v = float(val)
-                    if v > 0:
-                        return 'color: red; font-weight: bold;'
-                    elif v < 0:
-                        return 'color: green; font-weight: bold;'
-                    return ''
-                except ValueError:
+                if pd.isna(val):
                     return ''
+                if val > 0:
+                    return 'color: red; font-weight: bold;'
+                elif val < 0:
+                    return 'color: green; font-weight: bold;'
+                return ''
 
             # 套用樣式
             styled_df = summary_df.style.map(highlight_signal, subset=['I訊號'])
@@ -1331,6 +1290,9 @@ def display_ranking_results(market_type: str):
                     "漲跌幅(%)": st.column_config.NumberColumn(format="%.2f"),
                     "預估量(張)": st.column_config.NumberColumn(format="%d"),
                     "5日均量(張)": st.column_config.NumberColumn(format="%d"),
+                    "K": st.column_config.NumberColumn(format="%.2f"),
+                    "D": st.column_config.NumberColumn(format="%.2f"),
+                    "I訊號": st.column_config.NumberColumn(format="%d"),
                 }
             )
 
@@ -1339,13 +1301,13 @@ def display_ranking_results(market_type: str):
 
         st.markdown("---")
         st.subheader("🔍 個股技術分析圖")
+        display_chart_panel(
+            [(str(r['stock_info']['Stock Symbol']), r['stock_info']['Stock Name'], None)
+             for r in yahoo_results if not r.get('error')],
+            key="chart_panel_ranking"
+        )
         for result in yahoo_results:
-            if not result.get('error'):
-                stock_name = result['stock_info']['Stock Name']
-                stock_symbol = result['stock_info']['Stock Symbol']
-                with st.expander(f"查看 {stock_name} ({stock_symbol}) 的技術分析圖"):
-                    st.plotly_chart(_fig_from_cache(result['chart_json']), use_container_width=True)
-            else:
+            if result.get('error'):
                 stock_name = result['stock_info'].get('Stock Name', '未知股票')
                 show_analysis_error(stock_name, {'error_type': result.get('error_type', 'unknown'), 'message': result.get('error', '')})
 
@@ -1367,25 +1329,56 @@ def display_single_stock_analysis(stock_identifier: str):
             with st.spinner("正在生成技術分析圖..."):
                 tech_analysis_result = cached_analyze_stock(stock_code)
                 if tech_analysis_result['status'] == 'success':
-                    st.plotly_chart(_fig_from_cache(tech_analysis_result['chart_json']), use_container_width=True)
+                    show_technical_chart(tech_analysis_result['chart_data'])
                 else:
                     show_analysis_error(stock_name, tech_analysis_result)
         with tab2:
             with st.spinner("正在生成月營收趨勢圖..."):
                 revenue_json, revenue_error = cached_plot_revenue(stock_code)
                 if not revenue_error:
-                    st.plotly_chart(_fig_from_cache(revenue_json), use_container_width=True)
+                    show_cached_figure(revenue_json)
                 else:
                     st.error(f"無法生成營收圖: {revenue_error}")
         with tab3:
             with st.spinner("正在生成大戶股權變化圖..."):
                 shareholder_json, shareholder_error = cached_plot_shareholders(stock_code)
                 if not shareholder_error:
-                    st.plotly_chart(_fig_from_cache(shareholder_json), use_container_width=True)
+                    show_cached_figure(shareholder_json)
                 else:
                     st.error(f"無法生成大戶股權圖: {shareholder_error}")
 
 # --- 主程式進入點 ---
+def render_diagnostics_panel():
+    """側邊欄效能診斷：各階段耗時、快取命中與 Prometheus 文字格式匯出（數據為行程啟動或重設以來的累計值）。"""
+    st.sidebar.header("🩺 效能診斷")
+    if not st.sidebar.checkbox("顯示各階段耗時與快取命中", key="show_diagnostics"):
+        return
+    stats = get_memory_cache().stats()
+    st.sidebar.caption(
+        f"個股分析快取：{stats['bytes'] / 1024 / 1024:.1f} / {stats['max_bytes'] / 1024 / 1024:.0f} MB，"
+        f"{stats['entries']} 筆，命中率 {stats['hit_rate']:.0%}，逐出 {stats['evictions']} 次"
+    )
+    timer_rows, counter_rows = instrumentation.snapshot()
+    if not timer_rows and not counter_rows:
+        st.sidebar.caption("尚無量測資料，執行任一選股或個股分析後即會顯示。")
+        return
+    if timer_rows:
+        st.sidebar.caption("各階段耗時（依累計時間排序）")
+        st.sidebar.dataframe(pd.DataFrame(timer_rows), hide_index=True, use_container_width=True)
+    if counter_rows:
+        st.sidebar.caption("計數器（快取 hit / shared_hit / coalesced / stale / miss）")
+        st.sidebar.dataframe(pd.DataFrame(counter_rows), hide_index=True, use_container_width=True)
+    st.sidebar.download_button(
+        label="📥 匯出 Prometheus 指標",
+        data=instrumentation.to_prometheus().encode('utf-8'),
+        file_name="metrics.prom",
+        mime="text/plain",
+    )
+    if st.sidebar.button("重設量測數據"):
+        instrumentation.reset()
+        st.rerun()
+
+
 def main():
     st.title("📈 台股互動分析儀")
 
@@ -1451,13 +1444,24 @@ def main():
         st.session_state.action = "rank_listed"
     if st.sidebar.button("漲幅排行榜 (上櫃)"):
         st.session_state.action = "rank_otc"
+    if st.sidebar.button("多榜單合併 (上市＋上櫃)"):
+        st.session_state.action = "rank_combined"
 
     st.sidebar.header("個股查詢")
     stock_identifier_input = st.sidebar.text_input("輸入股票代碼或名稱", placeholder="例如: 2330 或 台積電")
+    # 自動完成：依索引相關度列出候選股票，預設選取最相關的一檔
+    candidates = search_stocks(stock_identifier_input, limit=10) if stock_identifier_input.strip() else []
+    selected_code = None
+    if candidates:
+        labels = [f"{code} {name}" for code, name in candidates]
+        choice = st.sidebar.selectbox("符合的股票", labels, key="stock_candidate")
+        selected_code = candidates[labels.index(choice)][0]
+    elif stock_identifier_input.strip():
+        st.sidebar.caption("找不到符合的股票代碼或名稱。")
     if st.sidebar.button("生成個股分析圖"):
         if stock_identifier_input:
             st.session_state.action = "single_stock_analysis"
-            st.session_state.stock_id = stock_identifier_input
+            st.session_state.stock_id = selected_code or stock_identifier_input
         else:
             st.sidebar.warning("請輸入股票代碼或名稱")
 
@@ -1474,8 +1478,13 @@ def main():
             display_ranking_results("上市")
         elif action == "rank_otc":
             display_ranking_results("上櫃")
+        elif action == "rank_combined":
+            display_ranking_results("多榜單")
         elif action == "single_stock_analysis":
             display_single_stock_analysis(st.session_state.stock_id)
 
+    # 放在內容之後顯示，才包含本次重跑的量測結果
+    render_diagnostics_panel()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
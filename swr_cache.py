@@ -0,0 +1,169 @@
+# swr_cache.py (stale-while-revalidate 快取：過期資料先回傳給使用者，再於背景執行緒重新抓取)
+
+import copy
+import functools
+import pickle
+import threading
+import time
+from dataclasses import dataclass
+
+import instrumentation
+from cache_backend import get_shared_cache
+from singleflight import SingleFlight
+
+# 背景更新失敗後，至少間隔多久才再次嘗試（秒），避免每次重跑都重新爬取
+FAILED_REFRESH_BACKOFF = 60
+# 共用快取（cache_backend）中保留清單的秒數；過期的舊清單仍可先顯示，因此保留得比 TTL 久
+SHARED_RETENTION = 86400
+
+
+@dataclass
+class _Entry:
+    value: object
+    fetched_at: float           # time.time()，供畫面顯示資料時間
+    refreshing: bool = False
+    failed_at: float = 0.0
+
+
+# 以「模組.函式名稱」為鍵的行程內共用儲存區。
+# Streamlit 每次重跑都會重新定義 streamlit_app 中的函式，快取內容必須存在這個模組裡才能延續。
+_stores: dict[str, dict[tuple, _Entry]] = {}
+_lock = threading.Lock()
+# 無快取時多個使用者同時開啟同一個畫面，只爬取一次
+_flights = SingleFlight('swr_cache')
+
+
+class SWRCachedFunction:
+    """
+    包裝一個抓取函式：
+    - 無快取時同步抓取（第一次仍需等待）。
+    - 快取未過期時直接回傳。
+    - 快取已過期時立即回傳舊資料，並啟動背景執行緒重新抓取；同一鍵同時只會有一個背景更新。
+    抓取結果為 None 或拋出例外時視為失敗，不寫入快取，保留原本的舊資料。
+    回傳值皆為深拷貝，呼叫端新增欄位不會污染快取。
+    有設定共用快取後端時，行程內無資料或需要更新前先看其他副本是否已抓好較新的清單，抓到的新清單也會寫回共用快取。
+    """
+
+    def __init__(self, func, ttl: int) -> None:
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.ttl = ttl
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        with _lock:
+            self._store = _stores.setdefault(self.name, {})
+
+    def __call__(self, *args):
+        key = args
+        with _lock:
+            entry = self._store.get(key)
+            if entry is not None:
+                return self._serve(key, entry)
+
+        if self._adopt_shared(key):
+            with _lock:
+                entry = self._store.get(key)
+                if entry is not None:
+                    return self._serve(key, entry, counted=True)
+
+        return copy.deepcopy(_flights.do((self.name, key), lambda: self._fetch(key)))
+
+    def _fetch(self, key: tuple):
+        instrumentation.count('cache', cache=self.func.__name__, result='miss')
+        value = self.func(*key)
+        if value is not None:
+            entry = _Entry(value, time.time())
+            with _lock:
+                self._store[key] = entry
+            self._publish(key, entry)
+        return value
+
+    def _serve(self, key: tuple, entry: _Entry, counted: bool = False):
+        # 呼叫端需持有 _lock；counted 表示這次查詢已記錄過（例如剛從共用快取取回）
+        stale = self._should_refresh(entry)
+        if stale:
+            entry.refreshing = True
+            threading.Thread(target=self._refresh, args=key, daemon=True,
+                             name=f"swr-refresh-{self.func.__name__}").start()
+        if not counted:
+            instrumentation.count('cache', cache=self.func.__name__, result='stale' if stale else 'hit')
+        return copy.deepcopy(entry.value)
+
+    def _shared_key(self, key: tuple) -> str:
+        # 不含模組名稱：Streamlit 執行的主程式模組名稱為 __main__
+        return get_shared_cache().make_key(self.func.__qualname__, key)
+
+    def _adopt_shared(self, key: tuple, fresh_only: bool = False) -> bool:
+        """共用快取中有比行程內更新的清單時採用它；fresh_only 時只採用未過 TTL 的清單。"""
+        shared = get_shared_cache()
+        found = shared.get(self._shared_key(key)) if shared else None
+        if found is None:
+            return False
+        fetched_at, value = pickle.loads(found[0])
+        if fresh_only and time.time() - fetched_at >= self.ttl:
+            return False
+        with _lock:
+            current = self._store.get(key)
+            if current is not None and current.fetched_at >= fetched_at:
+                return False
+            self._store[key] = _Entry(value, fetched_at)
+        instrumentation.count('cache', cache=self.func.__name__, result='shared_hit')
+        return True
+
+    def _publish(self, key: tuple, entry: _Entry) -> None:
+        shared = get_shared_cache()
+        if shared:
+            blob = pickle.dumps((entry.fetched_at, entry.value), protocol=pickle.HIGHEST_PROTOCOL)
+            shared.set(self._shared_key(key), blob, SHARED_RETENTION)
+
+    def _should_refresh(self, entry: _Entry) -> bool:
+        now = time.time()
+        return (not entry.refreshing
+                and now - entry.fetched_at >= self.ttl
+                and now - entry.failed_at >= FAILED_REFRESH_BACKOFF)
+
+    def _refresh(self, *args) -> None:
+        value = new_entry = None
+        try:
+            # 其他副本剛抓好的清單可直接採用，不必再爬一次（採用時 _store 已換成新的項目）
+            if self._adopt_shared(args, fresh_only=True):
+                return
+            value = self.func(*args)
+        except Exception as e:
+            print(f"背景更新 {self.func.__name__} 失敗，繼續使用舊資料: {type(e).__name__} - {e}")
+        finally:
+            # 不論成功、失敗或共用快取出錯都要清除 refreshing，否則這組參數之後不會再背景更新
+            with _lock:
+                entry = self._store.get(args)
+                if value is not None:
+                    new_entry = self._store[args] = _Entry(value, time.time())
+                elif entry is not None and entry.refreshing:
+                    entry.refreshing = False
+                    entry.failed_at = time.time()
+        if new_entry is not None:
+            self._publish(args, new_entry)
+
+    def age(self, *args) -> float | None:
+        """該組參數的資料已存在幾秒；尚無快取時回傳 None。"""
+        with _lock:
+            entry = self._store.get(args)
+        return None if entry is None else time.time() - entry.fetched_at
+
+    def is_refreshing(self, *args) -> bool:
+        with _lock:
+            entry = self._store.get(args)
+        return entry is not None and entry.refreshing
+
+    def clear(self) -> None:
+        """清除此函式的所有快取（與 st.cache_data 的 .clear() 相同用法），包含共用快取中的資料。"""
+        with _lock:
+            self._store.clear()
+        shared = get_shared_cache()
+        if shared:
+            shared.clear(self.func.__qualname__)
+
+
+def swr_cache(ttl: int):
+    """裝飾器：@swr_cache(ttl=600) 以 stale-while-revalidate 方式快取函式結果。"""
+    def decorator(func):
+        return SWRCachedFunction(func, ttl)
+    return decorator
@@ -0,0 +1,159 @@
+# volume_projection.py (盤中預估成交量：以當日秒數陣列 + np.interp 查表，並可依個股歷史盤中量能校準曲線)
+
+import threading
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from price_store import get_price_store
+
+TAIPEI = ZoneInfo("Asia/Taipei")
+SESSION_OPEN = 9 * 3600             # 09:00
+SESSION_CLOSE = 13 * 3600 + 30 * 60  # 13:30
+SHARES_PER_LOT = 1000
+
+# 全市場平均的預估成交量因子（全日量 ÷ 截至該時間的累計量），每 5 分鐘一點
+_DEFAULT_CURVE = [
+    ('9:00', 20.00), ('9:05', 14.99), ('9:10', 9.48), ('9:15', 7.12), ('9:20', 5.83), ('9:25', 4.99),
+    ('9:30', 4.42), ('9:35', 3.99), ('9:40', 3.66), ('9:45', 3.39), ('9:50', 3.18), ('9:55', 2.99),
+    ('10:00', 2.83), ('10:05', 2.70), ('10:10', 2.58), ('10:15', 2.48), ('10:20', 2.39), ('10:25', 2.30),
+    ('10:30', 2.23), ('10:35', 2.15), ('10:40', 2.09), ('10:45', 2.03), ('10:50', 1.97), ('10:55', 1.92),
+    ('11:00', 1.87), ('11:05', 1.83), ('11:10', 1.79), ('11:15', 1.74), ('11:20', 1.71), ('11:25', 1.67),
+    ('11:30', 1.63), ('11:35', 1.60), ('11:40', 1.57), ('11:45', 1.54), ('11:50', 1.51), ('11:55', 1.48),
+    ('12:00', 1.46), ('12:05', 1.43), ('12:10', 1.41), ('12:15', 1.38), ('12:20', 1.36), ('12:25', 1.34),
+    ('12:30', 1.32), ('12:35', 1.30), ('12:40', 1.28), ('12:45', 1.25), ('12:50', 1.23), ('12:55', 1.21),
+    ('13:00', 1.19), ('13:05', 1.17), ('13:10', 1.14), ('13:15', 1.12), ('13:20', 1.09), ('13:25', 1.06),
+    ('13:30', 1.00),
+]
+# 模組載入時轉成陣列一次：曲線格點的當日秒數與對應因子
+CURVE_SECONDS = np.array([int(h) * 3600 + int(m) * 60 for h, m in (t.split(':') for t, _ in _DEFAULT_CURVE)],
+                         dtype=float)
+DEFAULT_FACTORS = np.array([f for _, f in _DEFAULT_CURVE])
+
+# 個股曲線校準：至少需要幾個交易日的盤中紀錄，以及只採用最近多少天
+MIN_CALIBRATION_DAYS = 3
+CALIBRATION_LOOKBACK_DAYS = 60
+
+
+def seconds_of_day(at: datetime | None = None) -> float:
+    """台北時間的當日秒數。"""
+    at = at.astimezone(TAIPEI) if at is not None and at.tzinfo else at or datetime.now(TAIPEI)
+    return at.hour * 3600 + at.minute * 60 + at.second + at.microsecond / 1e6
+
+
+def _interp_weights(sec: float) -> tuple[int, int, float]:
+    """sec 在曲線格點中的左右位置與線性內插權重（所有曲線共用格點，只需計算一次）。"""
+    hi = int(np.clip(np.searchsorted(CURVE_SECONDS, sec), 1, len(CURVE_SECONDS) - 1))
+    lo = hi - 1
+    w = (sec - CURVE_SECONDS[lo]) / (CURVE_SECONDS[hi] - CURVE_SECONDS[lo])
+    return lo, hi, float(np.clip(w, 0.0, 1.0))
+
+
+class VolumeProjector:
+    """
+    預估全日成交量 = 目前累計量 × 因子(時間)。
+    沒有校準資料的股票使用全市場曲線；有校準曲線的股票使用自己的曲線。
+    所有曲線共用相同的時間格點，整批股票只需一次矩陣內插。
+    """
+
+    def __init__(self, curves: dict[str, np.ndarray] | None = None) -> None:
+        curves = curves or {}
+        self._index = pd.Index(list(curves), dtype=object)
+        self._curves = np.vstack([curves[s] for s in self._index]) if curves else np.empty((0, len(CURVE_SECONDS)))
+
+    @property
+    def calibrated_count(self) -> int:
+        return len(self._index)
+
+    def factors(self, stock_ids, at: datetime | None = None) -> np.ndarray:
+        """每檔股票在指定時間（預設為現在）的因子；盤前、盤後皆為 1.0。"""
+        stock_ids = [str(s) for s in stock_ids]
+        sec = seconds_of_day(at)
+        if sec <= SESSION_OPEN or sec >= SESSION_CLOSE:
+            return np.ones(len(stock_ids))
+
+        lo, hi, w = _interp_weights(sec)
+        out = np.full(len(stock_ids), DEFAULT_FACTORS[lo] * (1 - w) + DEFAULT_FACTORS[hi] * w)
+        if len(self._index):
+            rows = self._index.get_indexer(stock_ids)
+            has_curve = rows >= 0
+            picked = self._curves[rows[has_curve]]
+            out[has_curve] = picked[:, lo] * (1 - w) + picked[:, hi] * w
+        return out
+
+    def estimate(self, stock_ids, volumes, at: datetime | None = None) -> np.ndarray:
+        """整批預估全日成交量（單位與 volumes 相同）。"""
+        return np.asarray(volumes, dtype=float) * self.factors(stock_ids, at)
+
+
+def volume_factor(at: datetime | None = None) -> float:
+    """全市場曲線在指定時間的因子（np.interp 查表）；盤前、盤後為 1.0。"""
+    sec = seconds_of_day(at)
+    if sec <= SESSION_OPEN or sec >= SESSION_CLOSE:
+        return 1.0
+    return float(np.interp(sec, CURVE_SECONDS, DEFAULT_FACTORS))
+
+
+def calibrate_curves(records: pd.DataFrame, min_days: int = MIN_CALIBRATION_DAYS) -> dict[str, np.ndarray]:
+    """
+    由盤中累計量紀錄（PriceStore.load_intraday_volumes 格式）校準個股曲線。
+    每筆紀錄的實際因子 = 當日總量 ÷ 截至該時間的累計量；以「實際因子 ÷ 全市場因子」的比值
+    在各 5 分鐘格點取中位數，內插補齊沒有紀錄的格點後乘回全市場曲線。
+    結果強制為隨時間遞減、不小於 1，且收盤時為 1。
+    """
+    if records.empty:
+        return {}
+    df = records[(records['seconds'] > SESSION_OPEN) & (records['seconds'] < SESSION_CLOSE)].copy()
+    df['actual'] = df['daily_volume'] / (df['volume_lots'] * SHARES_PER_LOT)
+    df = df[np.isfinite(df['actual']) & (df['actual'] >= 1.0)]
+    if df.empty:
+        return {}
+    df['ratio'] = df['actual'] / np.interp(df['seconds'], CURVE_SECONDS, DEFAULT_FACTORS)
+    df['bucket'] = np.abs(df['seconds'].to_numpy()[:, None] - CURVE_SECONDS[None, :]).argmin(axis=1)
+
+    curves = {}
+    for stock_id, group in df.groupby('stock_id'):
+        if group['date'].nunique() < min_days:
+            continue
+        medians = group.groupby('bucket')['ratio'].median()
+        scale = np.interp(np.arange(len(CURVE_SECONDS)), medians.index.to_numpy(), medians.to_numpy())
+        curve = np.maximum(DEFAULT_FACTORS * scale, 1.0)
+        curve = np.minimum.accumulate(curve)  # 越接近收盤，因子不應變大
+        curve[-1] = 1.0
+        curves[stock_id] = curve
+    return curves
+
+
+def record_intraday_volumes(stock_ids, volume_lots, at: datetime | None = None) -> None:
+    """盤中時段把各股目前的累計成交量（張）寫入本地資料庫，累積校準用的歷史紀錄。盤外不記錄。"""
+    at = at or datetime.now(TAIPEI)
+    sec = seconds_of_day(at)
+    if sec <= SESSION_OPEN or sec >= SESSION_CLOSE or at.weekday() >= 5:
+        return
+    get_price_store().save_intraday_volumes(at.date(), int(sec), dict(zip(map(str, stock_ids), volume_lots)))
+
+
+_projector: VolumeProjector | None = None
+_projector_date: date | None = None
+_projector_lock = threading.Lock()
+
+
+def get_volume_projector() -> VolumeProjector:
+    """取得共用的 VolumeProjector；每天第一次使用時由本地盤中紀錄重新校準個股曲線。"""
+    global _projector, _projector_date
+    today = datetime.now(TAIPEI).date()
+    with _projector_lock:
+        if _projector is None or _projector_date != today:
+            try:
+                records = get_price_store().load_intraday_volumes(today - timedelta(days=CALIBRATION_LOOKBACK_DAYS))
+                curves = calibrate_curves(records)
+            except Exception as e:
+                print(f"量能曲線校準失敗，使用全市場曲線: {e}")
+                curves = {}
+            _projector = VolumeProjector(curves)
+            _projector_date = today
+            if curves:
+                print(f"已載入 {len(curves)} 檔股票的個股量能曲線。")
+        return _projector
@@ -0,0 +1,218 @@
+# warmup.py (盤前/盤後預熱：在使用者開啟頁面前，先為整個觀察名單補齊日線並計算技術指標，填滿持久快取)
+#
+# 用法：
+#     python -m warmup                 依排程常駐執行（平日 WARMUP_TIMES，預設 08:50 與 14:45 台北時間）
+#     python -m warmup --once          立即執行一次後結束（可交給 cron / systemd timer 排程）
+#     python -m warmup --once --codes 2330,2317 --no-charts
+# 或在 App 行程內以背景執行緒執行：設定環境變數 WARMUP_IN_APP=1（見 streamlit_app.py）。
+#
+# 預熱的內容：
+# - price_store 的本地日線（SQLite，跨行程、重新啟動後仍有效），以 bulk_price_loader 整體市場批次下載
+# - analysis_cache 的指標快照與技術分析圖資料；獨立行程執行時需設定共用快取（CACHE_BACKEND，見 cache_backend.py），
+#   App 才能直接取用，否則只有本地日線會被預熱
+#
+# 預熱與 App 共用同一個 FinMind 節流閘門（rate_limiter）：批次下載未涵蓋的股票才逐檔向 FinMind 補抓，
+# 且最多 WARMUP_MAX_FETCHES 檔（預設 50），全市場查詢失敗時不會逐檔抓完整個觀察名單而耗盡使用者需要的額度。
+
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta, time as dtime
+from zoneinfo import ZoneInfo
+
+import twstock
+
+import instrumentation
+from analysis_cache import analyze_indicators_many, cached_analyze_stock
+from bulk_price_loader import prefetch_prices, stocks_needing_fetch
+from cache_backend import get_shared_cache
+from screening import normalize_stock_codes, run_screen_analysis
+
+TAIPEI = ZoneInfo("Asia/Taipei")
+# 預設排程：開盤前一次，收盤後一次（補上當日日線）。
+# 分析快取的 TTL 為 1 小時（analysis_cache），盤前這次排在開盤前幾分鐘，預熱結果才能涵蓋開盤後約 50 分鐘的查詢
+DEFAULT_WARMUP_TIMES = '08:50,14:45'
+# 分析期間天數，與 analyze_stock 的預設值相同
+ANALYSIS_DAYS = 300
+# 批次下載未涵蓋、需逐檔向 FinMind 補抓的股票數上限（WARMUP_MAX_FETCHES 可調整）
+DEFAULT_MAX_FETCHES = 50
+# 預熱的工作執行緒數，少於選股畫面，App 內執行時不與使用者搶 FinMind 閘門
+WARMUP_WORKERS = 4
+# 預設觀察名單：上市、上櫃的普通股（不含權證、ETF）
+UNIVERSE_TYPES = {'股票'}
+UNIVERSE_MARKETS = {'上市', '上櫃'}
+
+
+def default_universe() -> list[str]:
+    """
+    預熱的股票清單。環境變數 WARMUP_UNIVERSE 可指定以逗號分隔的代碼，或每行一個代碼的檔案路徑；
+    未設定時使用 twstock.codes 中所有上市櫃普通股。
+    """
+    configured = os.getenv('WARMUP_UNIVERSE', '').strip()
+    if configured:
+        if os.path.isfile(configured):
+            with open(configured, encoding='utf-8') as f:
+                configured = f.read().replace('\n', ',')
+        return normalize_stock_codes(configured.split(','))
+    return sorted(code for code, info in twstock.codes.items()
+                  if info.type in UNIVERSE_TYPES and info.market in UNIVERSE_MARKETS)
+
+
+def _max_fetches() -> int:
+    try:
+        return int(os.getenv('WARMUP_MAX_FETCHES', DEFAULT_MAX_FETCHES))
+    except ValueError:
+        print(f"警告: WARMUP_MAX_FETCHES 不是有效整數，改用預設值 {DEFAULT_MAX_FETCHES}。")
+        return DEFAULT_MAX_FETCHES
+
+
+def run_warmup(stock_ids: list[str] | None = None, with_charts: bool = True, max_fetches: int | None = None) -> dict:
+    """
+    執行一次預熱：先批次補齊本地日線，再計算每檔的指標（本地日線已是最新的股票以面板一次向量化計算，
+    見 analysis_cache.analyze_indicators_many），最後逐檔產生技術分析圖資料。
+    批次下載後仍需逐檔補抓的股票最多處理 max_fetches 檔，其餘略過，留待使用者實際查詢時再抓。
+    單檔失敗不影響其他股票；失敗結果不會寫入快取（見 analysis_cache._UncachedResult）。
+
+    :param stock_ids: 股票代碼清單，None 時使用 default_universe()
+    :param with_charts: 是否一併預先計算個股頁的技術分析圖資料
+    :param max_fetches: 逐檔補抓的股票數上限，None 時使用 WARMUP_MAX_FETCHES（預設 50）
+    :return: 統計資訊 {'stocks', 'succeeded', 'failed', 'skipped', 'prefetch', 'seconds'}
+    """
+    codes = normalize_stock_codes(stock_ids if stock_ids is not None else default_universe())
+    max_fetches = _max_fetches() if max_fetches is None else max_fetches
+    start = time.perf_counter()
+    print(f"預熱開始：{len(codes)} 檔股票" + ("（含技術分析圖）" if with_charts else ""))
+    # App 內的背景執行緒直接填入該行程的記憶體快取；獨立行程則需共用快取才能把結果交給 App
+    if get_shared_cache() is None and threading.current_thread() is threading.main_thread():
+        print("提示: 未設定共用快取 (CACHE_BACKEND)，獨立執行時只會預熱本地日線資料庫。")
+
+    with instrumentation.timed('warmup', step='prefetch'):
+        prefetch_stats = prefetch_prices(codes, days=ANALYSIS_DAYS)
+    print(f"日線批次補齊：{prefetch_stats}")
+
+    need_fetch = stocks_needing_fetch(codes, ANALYSIS_DAYS)
+    skipped = set(need_fetch[max_fetches:])
+    if skipped:
+        print(f"提示: {len(need_fetch)} 檔股票的本地日線需逐檔向 FinMind 補抓，只處理前 {max_fetches} 檔，"
+              f"略過 {len(skipped)} 檔（全市場批次下載失敗或未涵蓋，避免耗盡 FinMind 額度）。")
+        codes = [c for c in codes if c not in skipped]
+
+    def on_progress(done: int, total: int, code: str) -> None:
+        if done % 100 == 0 or done == total:
+            print(f"預熱進度：{done}/{total}")
+
+    with instrumentation.timed('warmup', step='indicators'):
+        results = analyze_indicators_many(codes, on_progress=on_progress, max_workers=WARMUP_WORKERS)
+    if with_charts:
+        chart_codes = [c for c, r in results.items() if r.get('status') == 'success']
+        print(f"產生技術分析圖資料：{len(chart_codes)} 檔")
+        with instrumentation.timed('warmup', step='charts'):
+            results.update(run_screen_analysis(chart_codes, cached_analyze_stock,
+                                               on_progress=on_progress, max_workers=WARMUP_WORKERS))
+
+    succeeded = sum(1 for r in results.values() if r.get('status') == 'success')
+    stats = {
+        'stocks': len(codes) + len(skipped),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'skipped': len(skipped),
+        'prefetch': prefetch_stats,
+        'seconds': round(time.perf_counter() - start, 1),
+    }
+    instrumentation.count('warmup_stocks', succeeded, result='success')
+    instrumentation.count('warmup_stocks', stats['failed'], result='failed')
+    instrumentation.count('warmup_stocks', stats['skipped'], result='skipped')
+    print(f"預熱完成：成功 {succeeded} 檔，失敗 {stats['failed']} 檔，略過 {stats['skipped']} 檔，"
+          f"耗時 {stats['seconds']} 秒")
+    return stats
+
+
+def _schedule_times() -> list[dtime]:
+    """由 WARMUP_TIMES（例如 '08:15,14:45'，台北時間）解析每日執行時刻。"""
+    raw = os.getenv('WARMUP_TIMES', DEFAULT_WARMUP_TIMES)
+    times = []
+    for part in raw.split(','):
+        try:
+            hour, minute = part.strip().split(':')
+            times.append(dtime(int(hour), int(minute)))
+        except ValueError:
+            print(f"警告: 無法解析 WARMUP_TIMES 中的 '{part.strip()}'，已略過。")
+    if not times:
+        print(f"警告: WARMUP_TIMES 沒有有效時刻，改用預設值 {DEFAULT_WARMUP_TIMES}。")
+        times = [dtime(8, 50), dtime(14, 45)]
+    return sorted(times)
+
+
+def next_run_after(now: datetime, times: list[dtime] | None = None) -> datetime:
+    """now 之後（台北時間）的下一個排程時刻；只排平日，國定假日照常執行（當天沒有新日線，很快完成）。"""
+    times = times or _schedule_times()
+    now = now.astimezone(TAIPEI)
+    for days_ahead in range(8):
+        day = now.date() + timedelta(days=days_ahead)
+        if day.weekday() >= 5:
+            continue
+        for t in times:
+            candidate = datetime.combine(day, t, tzinfo=TAIPEI)
+            if candidate > now:
+                return candidate
+    raise RuntimeError("找不到下一個預熱時刻")
+
+
+def run_scheduler(stop_event: threading.Event | None = None, with_charts: bool = True) -> None:
+    """依排程重複執行 run_warmup，直到 stop_event 被設定；單次預熱失敗只印出錯誤，等待下一個時刻。"""
+    stop_event = stop_event or threading.Event()
+    times = _schedule_times()
+    while not stop_event.is_set():
+        next_run = next_run_after(datetime.now(TAIPEI), times)
+        print(f"下一次預熱：{next_run:%Y-%m-%d %H:%M} (台北時間)")
+        if stop_event.wait(max(0.0, (next_run - datetime.now(TAIPEI)).total_seconds())):
+            break
+        try:
+            run_warmup(with_charts=with_charts)
+        except Exception as e:
+            print(f"錯誤: 預熱失敗: {type(e).__name__} - {e}")
+
+
+_background: threading.Thread | None = None
+_background_lock = threading.Lock()
+
+
+def start_background_warmup() -> bool:
+    """
+    在目前行程啟動排程背景執行緒（daemon，隨行程結束）；Streamlit 每次重跑都會呼叫，
+    但每個行程只會啟動一次。回傳本次是否新啟動。
+    """
+    global _background
+    with _background_lock:
+        if _background is not None and _background.is_alive():
+            return False
+        _background = threading.Thread(target=run_scheduler, name='warmup-scheduler', daemon=True)
+        _background.start()
+    return True
+
+
+def main():
+    ap = argparse.ArgumentParser(description='台股分析儀快取預熱')
+    ap.add_argument('--once', action='store_true', help='立即執行一次後結束（預設依 WARMUP_TIMES 排程常駐）')
+    ap.add_argument('--codes', help='以逗號分隔的股票代碼（預設為 WARMUP_UNIVERSE 或所有上市櫃普通股）')
+    ap.add_argument('--no-charts', action='store_true', help='只計算指標，不預先產生技術分析圖資料')
+    ap.add_argument('--max-fetches', type=int, help='逐檔向 FinMind 補抓的股票數上限（預設 WARMUP_MAX_FETCHES 或 50）')
+    args = ap.parse_args()
+
+    if args.once:
+        run_warmup(args.codes.split(',') if args.codes else None, with_charts=not args.no_charts,
+                   max_fetches=args.max_fetches)
+        return
+    if args.max_fetches is not None:
+        os.environ['WARMUP_MAX_FETCHES'] = str(args.max_fetches)
+    if args.codes:
+        os.environ['WARMUP_UNIVERSE'] = args.codes
+    try:
+        run_scheduler(with_charts=not args.no_charts)
+    except KeyboardInterrupt:
+        print("預熱排程已停止。")
+
+
+if __name__ == '__main__':
+    main()
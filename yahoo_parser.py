@@ -0,0 +1,106 @@
+# yahoo_parser.py (Yahoo 股市排行榜解析：lxml 串流解析 + 預先編譯的 XPath，逐列處理不建立完整文件樹)
+
+import math
+from typing import Iterable, Iterator
+
+from lxml import etree
+
+import instrumentation
+
+# 每次送進解析器的大小（串流回應為位元組數，整頁字串為字元數）
+FEED_CHUNK_SIZE = 64 * 1024
+
+# 模組載入時編譯一次，逐列套用；class 比對方式與原本 BeautifulSoup 的 class_ 參數相同
+_ROW_CLASS = 'List(n)'
+_STICKY_CELL = etree.XPath(".//div[@style='position:sticky;min-width:184px']")
+_RANK_SPAN = etree.XPath(".//span[contains(@class, 'Fz(24px)')]")
+_NAME_DIV = etree.XPath(".//div[@class='Lh(20px) Fw(600) Fz(16px) Ell']")
+_SYMBOL_SPAN = etree.XPath(".//span[@class='Fz(14px) C(#979ba7) Ell']")
+_DATA_CELLS = etree.XPath(".//div[contains(@class, 'Fxg(1)') and contains(@class, 'Ta(end)')]")
+_TEXT = etree.XPath("string()")
+
+# 資料欄位在列中的位置：成交價、漲跌幅、成交量(股)
+PRICE_CELL, CHANGE_PERCENT_CELL, VOLUME_CELL = 0, 2, 6
+MIN_DATA_CELLS = 8
+
+
+def _is_ranking_row(el) -> bool:
+    return el.tag == 'li' and _ROW_CLASS in el.get('class', '').split()
+
+
+def _to_number(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+def parse_row(row, position: int) -> dict | None:
+    """
+    解析單一 <li class="List(n)"> 排行列；結構不符時回傳 None。
+    :param position: 該列在頁面中的順序（從 1 起算），找不到排名欄位時作為名次
+    """
+    sticky = _STICKY_CELL(row)
+    if not sticky:
+        return None
+    sticky = sticky[0]
+    names, symbols = _NAME_DIV(sticky), _SYMBOL_SPAN(sticky)
+    if not names or not symbols:
+        print(f"處理第 {position} 行資料時發生錯誤：找不到名稱或代號欄位")
+        return None
+
+    cells = _DATA_CELLS(row)
+    if len(cells) < MIN_DATA_CELLS:
+        return None
+
+    rank_span = _RANK_SPAN(sticky)
+    rank = _to_number(_TEXT(rank_span[0]).strip()) if rank_span else position
+    if math.isnan(rank):
+        print(f"處理第 {position} 行資料時發生錯誤：名次欄位無法轉為數字")
+        return None
+
+    return {
+        'Rank': int(rank),
+        'Stock Symbol': _TEXT(symbols[0]).strip(),
+        'Stock Name': _TEXT(names[0]).strip(),
+        'Price': _to_number(_TEXT(cells[PRICE_CELL]).strip()),
+        'Change Percent': _to_number(_TEXT(cells[CHANGE_PERCENT_CELL]).strip().replace('%', '')),
+        'Volume (Shares)': _to_number(_TEXT(cells[VOLUME_CELL]).strip().replace(',', '')),
+    }
+
+
+def iter_ranking_rows(chunks: Iterable[bytes | str], encoding: str | None = None) -> Iterator[dict]:
+    """
+    逐段餵入 HTML，每當一個排行列的結束標籤出現就立即解析並產出該列，
+    解析完的列隨即清空，記憶體用量與列數無關。
+    chunks 可直接傳入串流回應的 response.iter_content(FEED_CHUNK_SIZE)（位元組），
+    由 lxml 依 encoding 解碼，切在多位元組字元中間的片段也能正確處理；也可傳入已解碼的字串片段。
+
+    :param encoding: 位元組內容的編碼，None 時由 lxml 依頁面 <meta charset> 判斷
+    """
+    parser = etree.HTMLPullParser(events=('end',), tag='li', encoding=encoding)
+    position = 0
+
+    def drain():
+        nonlocal position
+        for _, el in parser.read_events():
+            if not _is_ranking_row(el):
+                continue
+            position += 1
+            row = parse_row(el, position)
+            el.clear(keep_tail=True)
+            if row is not None:
+                yield row
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from drain()
+    parser.close()
+    yield from drain()
+
+
+@instrumentation.timed_function('parse', parser='yahoo_ranking')
+def parse_ranking_html(html: str) -> list[dict]:
+    """解析整頁排行榜 HTML，回傳各列的 dict（Rank、Stock Symbol、Stock Name、Price、Change Percent、Volume (Shares)）。"""
+    chunks = (html[i:i + FEED_CHUNK_SIZE] for i in range(0, len(html), FEED_CHUNK_SIZE))
+    return list(iter_ranking_rows(chunks))
@@ -2,118 +2,26 @@
 
 import requests
 import pandas as pd
-from bs4 import BeautifulSoup
-from io import StringIO
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from zoneinfo import ZoneInfo # 修正：導入 ZoneInfo 模組
 
-# 預估成交量因子表：模組載入時建立一次，後續查表不重複解析
-_CSV_DATA = """Time,Factor
-9:00,20.00
-9:05,14.99
-9:10,9.48
-9:15,7.12
-9:20,5.83
-9:25,4.99
-9:30,4.42
-9:35,3.99
-9:40,3.66
-9:45,3.39
-9:50,3.18
-9:55,2.99
-10:00,2.83
-10:05,2.70
-10:10,2.58
-10:15,2.48
-10:20,2.39
-10:25,2.30
-10:30,2.23
-10:35,2.15
-10:40,2.09
-10:45,2.03
-10:50,1.97
-10:55,1.92
-11:00,1.87
-11:05,1.83
-11:10,1.79
-11:15,1.74
-11:20,1.71
-11:25,1.67
-11:30,1.63
-11:35,1.60
-11:40,1.57
-11:45,1.54
-11:50,1.51
-11:55,1.48
-12:00,1.46
-12:05,1.43
-12:10,1.41
-12:15,1.38
-12:20,1.36
-12:25,1.34
-12:30,1.32
-12:35,1.30
-12:40,1.28
-12:45,1.25
-12:50,1.23
-12:55,1.21
-13:00,1.19
-13:05,1.17
-13:10,1.14
-13:15,1.12
-13:20,1.09
-13:25,1.06
-13:30,1.00
-"""
-_FACTOR_TABLE = pd.read_csv(StringIO(_CSV_DATA), skipinitialspace=True)
-_FACTOR_TABLE['Time'] = pd.to_datetime(_FACTOR_TABLE['Time'], format='%H:%M').dt.time
-
-
-def _get_volume_factor() -> float:
-    """
-    根據當前時間從模組層級的因子表查表並內插計算成交量預估因子。
-    """
-    now_time = datetime.now(ZoneInfo("Asia/Taipei")).time()
-
-    nine_am = datetime.strptime("09:00", "%H:%M").time()
-    one_thirty_pm = datetime.strptime("13:30", "%H:%M").time()
-
-    if now_time <= nine_am or now_time >= one_thirty_pm:
-        return 1.0
-
-    df_factor = _FACTOR_TABLE
-
-    exact_match = df_factor[df_factor['Time'] == now_time]
-    if not exact_match.empty:
-        return exact_match['Factor'].iloc[0]
-
-    upper_bound_df = df_factor[df_factor['Time'] > now_time]
-    if upper_bound_df.empty:
-        return df_factor.iloc[-1]['Factor']
-
-    upper_bound = upper_bound_df.iloc[0]
-
-    lower_bound_df = df_factor[df_factor['Time'] < now_time]
-    if lower_bound_df.empty:
-        # 時間介於 09:00~09:05 之間，直接回傳上界因子（最保守估計）
-        return upper_bound['Factor']
-    lower_bound = lower_bound_df.iloc[-1]
-
-    def time_to_seconds(t):
-        return t.hour * 3600 + t.minute * 60 + t.second
-
-    t1_sec = time_to_seconds(lower_bound['Time'])
-    f1 = lower_bound['Factor']
-    t2_sec = time_to_seconds(upper_bound['Time'])
-    f2 = upper_bound['Factor']
-    now_sec = time_to_seconds(now_time)
-
-    if t2_sec == t1_sec:
-        return f1
-
-    return f1 + (now_sec - t1_sec) * (f2 - f1) / (t2_sec - t1_sec)
-
+import http_client
+from volume_projection import get_volume_projector, record_intraday_volumes, volume_factor
+from yahoo_parser import FEED_CHUNK_SIZE, iter_ranking_rows
+
+# Yahoo 股市排行榜網址與可用的榜單、市場
+YAHOO_RANK_URL = "https://tw.stock.yahoo.com/rank/{ranking}?exchange={exchange}"
+RANKINGS = {
+    'change-up': '漲幅',
+    'volume': '成交量',
+    'turnover': '成交值',
+}
+EXCHANGES = {
+    'TAI': '上市',
+    'TWO': '上櫃',
+}
 
 def scrape_yahoo_stock_rankings(url: str) -> pd.DataFrame | None:
     """
@@ -126,61 +34,13 @@ def scrape_yahoo_stock_rankings(url: str) -> pd.DataFrame | None:
     }
 
     try:
-        res = requests.get(url, headers=headers, timeout=10)
-        res.raise_for_status()
-        res.encoding = 'utf-8'
-
-        soup = BeautifulSoup(res.text, 'html.parser')
-        rows = soup.find_all('li', class_='List(n)')
-
-        if not rows:
-            print("錯誤：找不到股票排名列表的行元素。Yahoo Finance 的網頁結構可能已變更。")
-            return None
-        
-        all_stocks = []
-        for i, row in enumerate(rows):
-            try:
-                sticky_cell = row.find('div', style='position:sticky;min-width:184px')
-                if not sticky_cell: continue
-
-                rank_span = sticky_cell.find('span', class_=re.compile(r'Fz\(24px\)'))
-                name = sticky_cell.find('div', class_='Lh(20px) Fw(600) Fz(16px) Ell').text.strip()
-                symbol = sticky_cell.find('span', class_='Fz(14px) C(#979ba7) Ell').text.strip()
-                
-                data_containers = row.find_all('div', class_=lambda x: x and 'Fxg(1)' in x and 'Ta(end)' in x)
-                if len(data_containers) < 8: continue
-
-                rank = pd.to_numeric(rank_span.text.strip(), errors='coerce') if rank_span else i + 1
-                price = pd.to_numeric(data_containers[0].text.strip(), errors='coerce')
-                change_percent_str = data_containers[2].text.strip().replace('%', '')
-                change_percent = pd.to_numeric(change_percent_str, errors='coerce')
-                volume_str = data_containers[6].text.strip().replace(',', '')
-                volume = pd.to_numeric(volume_str, errors='coerce')
-                
-                all_stocks.append({
-                    'Rank': int(rank),
-                    'Stock Symbol': symbol,
-                    'Stock Name': name,
-                    'Price': price,
-                    'Change Percent': change_percent,
-                    'Volume (Shares)': volume,
-                })
-            except Exception as e:
-                print(f"處理第 {i+1} 行資料時發生錯誤：{e}")
-                continue
-
-        df = pd.DataFrame(all_stocks)
+        # 串流讀取：邊下載邊解析，不在記憶體中組出整頁 HTML 字串；頁面固定以 UTF-8 解碼
+        with http_client.get_with_retry(url, headers=headers, timeout=10, stream=True) as res:
+            df = pd.DataFrame(iter_ranking_rows(res.iter_content(FEED_CHUNK_SIZE), encoding='utf-8'))
         if df.empty:
-            print("未能成功解析任何股票資料。")
+            print("未能成功解析任何股票資料。Yahoo Finance 的網頁結構可能已變更。")
             return None
             
-        factor = _get_volume_factor()
-        print(f"當前時間 {datetime.now(ZoneInfo('Asia/Taipei')).strftime('%H:%M:%S')}，預估成交量因子: {factor:.2f}")
-        
-        df['Factor'] = factor
-        df['Volume (Shares)'] = pd.to_numeric(df['Volume (Shares)'], errors='coerce')
-        df['Estimated Volume'] = (df['Volume (Shares)'] * factor).round(0).astype('Int64')
-
         def _extract_digits(x):
             # 用 search 取第一段連續數字並保留字串格式，避免 int('0056') → 56 截斷前導零
             m = re.search(r'\d+', str(x))
@@ -189,6 +49,17 @@ def scrape_yahoo_stock_rankings(url: str) -> pd.DataFrame | None:
         # 保持字串，顯示與查詢都不需要整數；只在必要時（如 twstock 查詢）外部再轉型
         df['Stock Symbol'] = df['Stock Symbol'].fillna('')
 
+        # 整批查出各股的預估成交量因子（有個股曲線者用個股曲線），並記錄本次盤中量供日後校準
+        now = datetime.now(ZoneInfo('Asia/Taipei'))
+        df['Volume (Shares)'] = pd.to_numeric(df['Volume (Shares)'], errors='coerce')
+        df['Factor'] = get_volume_projector().factors(df['Stock Symbol'], now)
+        df['Estimated Volume'] = (df['Volume (Shares)'] * df['Factor']).round(0).astype('Int64')
+        print(f"當前時間 {now.strftime('%H:%M:%S')}，全市場預估成交量因子: {volume_factor(now):.2f}")
+        try:
+            record_intraday_volumes(df['Stock Symbol'], df['Volume (Shares)'], now)
+        except Exception as e:
+            print(f"盤中成交量紀錄寫入失敗（不影響本次結果）：{e}")
+
         return df
 
     except requests.exceptions.RequestException as e:
@@ -196,4 +67,46 @@ def scrape_yahoo_stock_rankings(url: str) -> pd.DataFrame | None:
         return None
     except Exception as e:
         print(f"發生未預期的錯誤：{e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def ranking_url(ranking: str = 'change-up', exchange: str = 'TAI') -> str:
+    """組出指定榜單與市場的 Yahoo 排行榜網址。"""
+    return YAHOO_RANK_URL.format(ranking=ranking, exchange=exchange)
+
+
+def scrape_yahoo_multi_rankings(rankings=tuple(RANKINGS), exchanges=tuple(EXCHANGES)) -> pd.DataFrame | None:
+    """
+    同時抓取多個榜單與市場（預設為 漲幅/成交量/成交值 × 上市/上櫃），合併為單一 DataFrame。
+    - 各頁面以執行緒同時抓取，共用 http_client 的連線池。
+    - 同一股票出現在多個榜單時只保留一列（以 rankings 的先後順序為準），
+      Sources 欄位列出其所在榜單與名次，例如「上市漲幅#3、上市成交量#12」。
+    - 合併後依漲跌幅由高到低重新編排 Rank。
+    部分頁面失敗時仍回傳其餘頁面的結果；全部失敗時回傳 None。
+    """
+    tasks = [(ranking, exchange) for ranking in rankings for exchange in exchanges]
+    with ThreadPoolExecutor(max_workers=len(tasks) or 1) as executor:
+        frames = list(executor.map(lambda t: scrape_yahoo_stock_rankings(ranking_url(*t)), tasks))
+
+    parts = []
+    for (ranking, exchange), df in zip(tasks, frames):
+        if df is None or df.empty:
+            print(f"警告：{EXCHANGES.get(exchange, exchange)}{RANKINGS.get(ranking, ranking)}榜抓取失敗，略過。")
+            continue
+        df = df.copy()
+        df['Exchange'] = EXCHANGES.get(exchange, exchange)
+        df['Sources'] = f"{df['Exchange'].iloc[0]}{RANKINGS.get(ranking, ranking)}#" + df['Rank'].astype(str)
+        parts.append(df)
+
+    if not parts:
+        return None
+
+    combined = pd.concat(parts, ignore_index=True)
+    combined = combined[combined['Stock Symbol'] != '']
+    sources = combined.groupby('Stock Symbol', sort=False)['Sources'].agg('、'.join)
+    merged = combined.drop_duplicates('Stock Symbol', keep='first').copy()
+    merged['Sources'] = merged['Stock Symbol'].map(sources)
+    merged = merged.sort_values('Change Percent', ascending=False, na_position='last').reset_index(drop=True)
+    merged['Rank'] = range(1, len(merged) + 1)
+    print(f"多榜單合併完成：{len(parts)}/{len(tasks)} 個頁面，{len(combined)} 列去重後剩 {len(merged)} 檔。")
+    return merged